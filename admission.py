@@ -0,0 +1,155 @@
+import collections
+import os
+import threading
+import time
+
+
+class Attempt:
+    # One booking attempt. status is QUEUED until the queue works it off, then
+    # BOOKED, WAITLISTED or FAILED (ticket is None, error set if it raised);
+    # SOLD_OUT and BUSY attempts were refused on arrival and never queued.
+    # position and eta (seconds) are as of arrival; arrived and answered are
+    # time.monotonic() readings.
+
+    def __init__(self, key, size, request):
+        self.key, self.size, self.request = key, size, request
+        self.status, self.ticket, self.error = 'QUEUED', None, None
+        self.position, self.eta = 0, 0.0
+        self.arrived, self.answered = time.monotonic(), None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        # The ticket once worked off (None if it failed); raises TimeoutError
+        # if still queued after timeout seconds.
+        if not self._done.wait(timeout): raise TimeoutError(f"attempt still queued after {timeout}s")
+        if self.error: raise self.error
+        return self.ticket
+
+    def _finish(self, status, ticket=None, error=None):
+        self.status, self.ticket, self.error = status, ticket, error
+        self.answered = time.monotonic()
+        self._done.set()
+
+
+class _Lane:
+    # The queue of one train, class and date. capacity is how many more
+    # passengers the class could take when last looked at.
+
+    def __init__(self):
+        self.queue = collections.deque()
+        self.queued_passengers = 0
+        self.capacity = None
+        self.capacity_at = 0.0
+
+
+class AdmissionQueue:
+    # Admits booking attempts per (train, class, date) key for surges like the
+    # Tatkal opening. Each key has a FIFO lane; one worker thread takes up to
+    # batch_size attempts at a time from the lanes in turn and books them with
+    # book_many(key, requests), one transaction per micro-batch, so attempts
+    # are served in arrival order and no lane starves another.
+    #
+    # Attempts are refused on arrival, without queueing, as SOLD_OUT when the
+    # passengers queued ahead already use up what the class can still take
+    # (capacity(key): free berths plus waitlist room), and as BUSY when their
+    # ETA is over max_wait or the lane holds max_queue attempts. capacity is
+    # re-read after every batch and, for an idle lane, once it is capacity_ttl
+    # seconds old; invalidate(key) forgets it at once, e.g. on a cancellation.
+
+    def __init__(self, book_many, capacity, batch_size=64, max_wait=30.0, max_queue=10000, capacity_ttl=5.0):
+        self.book_many, self.capacity = book_many, capacity
+        self.batch_size, self.max_wait, self.max_queue, self.capacity_ttl = batch_size, max_wait, max_queue, capacity_ttl
+        self.admitted = self.sold_out = self.busy = self.batches = 0
+        # Seconds per attempt worked off, a moving average over batches.
+        self.seconds_per_attempt = 0.002
+        self._lanes = {}
+        self._ready = collections.deque()
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._thread = None
+        self._pid = None
+
+    def submit(self, key, size, request):
+        # Queues request (size passengers) on key's lane; returns its Attempt.
+        with self._lock:
+            lane = self._lanes.get(key)
+            stale = lane is None or lane.capacity is None or time.monotonic() - lane.capacity_at > self.capacity_ttl
+        if stale:
+            # Read outside the lock, so arrivals on other lanes are not held up.
+            self._set_capacity(key, self.capacity(key))
+        attempt = Attempt(key, size, request)
+        with self._lock:
+            lane = self._lanes[key]
+            attempt.position = len(lane.queue)
+            attempt.eta = self._eta(attempt.position)
+            if lane.capacity is not None and lane.queued_passengers + size > lane.capacity:
+                self.sold_out += 1; attempt._finish('SOLD_OUT'); return attempt
+            if attempt.position >= self.max_queue or attempt.eta > self.max_wait:
+                self.busy += 1; attempt._finish('BUSY'); return attempt
+            if not lane.queue: self._ready.append(key)
+            lane.queue.append(attempt); lane.queued_passengers += size
+            self.admitted += 1
+            self._start()
+            self._work.notify()
+        return attempt
+
+    def invalidate(self, key=None):
+        # Forgets key's capacity, or every lane's with no key.
+        with self._lock:
+            for lane in self._lanes.values() if key is None else filter(None, [self._lanes.get(key)]):
+                lane.capacity = None
+
+    def status(self, key):
+        # {'queued', 'eta', 'sold_out'} for a lane, as a new arrival would see it.
+        with self._lock:
+            lane = self._lanes.get(key) or _Lane()
+            queued = len(lane.queue)
+            return {'queued': queued, 'eta': round(self._eta(queued), 1),
+                    'sold_out': lane.capacity is not None and lane.queued_passengers >= lane.capacity}
+
+    def queued(self):
+        with self._lock: return sum(len(lane.queue) for lane in self._lanes.values())
+
+    def _eta(self, position):
+        # Lanes are served in turn, so each busy lane gets its share of the worker.
+        return (position + 1) * self.seconds_per_attempt * max(len(self._ready), 1)
+
+    def _set_capacity(self, key, capacity):
+        with self._lock:
+            lane = self._lanes.setdefault(key, _Lane())
+            lane.capacity, lane.capacity_at = capacity, time.monotonic()
+
+    def _start(self):
+        # One worker per process, restarted after a fork (called with the lock held).
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='admission', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._ready: self._work.wait()
+                key = self._ready.popleft()
+                lane = self._lanes[key]
+                batch = [lane.queue.popleft() for _ in range(min(self.batch_size, len(lane.queue)))]
+                if lane.queue: self._ready.append(key)
+            start = time.perf_counter()
+            try:
+                results, error = self.book_many(key, [attempt.request for attempt in batch]), None
+            except Exception as e:
+                results, error = [None] * len(batch), e
+            try: capacity = self.capacity(key)
+            except Exception: capacity = None
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                lane.queued_passengers -= sum(attempt.size for attempt in batch)
+                lane.capacity, lane.capacity_at = capacity, time.monotonic()
+                self.seconds_per_attempt = 0.8 * self.seconds_per_attempt + 0.2 * elapsed / len(batch)
+                self.batches += 1
+            for attempt, ticket in zip(batch, results):
+                attempt._finish(ticket['status'] if ticket else 'FAILED', ticket, error)
@@ -0,0 +1,207 @@
+import sqlite3
+import sys
+
+import numpy as np
+
+from seat_inventory import BERTH_TYPES, coach_layout
+
+DEFAULT_EXPORT_PATH = 'analytics.npz'
+STATUSES = ['BOOKED', 'WAITLISTED', 'CANCELLED']
+SENIOR_AGE = 60
+CHUNK_ROWS = 500000
+
+TICKETS_QUERY = '''
+    SELECT rowid, COALESCE(json_extract(data, '$.train_no'), ''),
+           COALESCE(json_extract(data, '$.travel_class_code'), substr(json_extract(data, '$.travel_class'), 1, instr(json_extract(data, '$.travel_class'), ' - ') - 1), ''),
+           COALESCE(status, ''), COALESCE(json_array_length(data, '$.passengers'), 0)
+    FROM reserved_tickets ORDER BY rowid
+'''
+# Passengers with their ticket's rowid, and berth type ('23LB' -> 'LB').
+PASSENGERS_QUERY = '''
+    SELECT t.rowid, COALESCE(CAST(json_extract(p.value, '$.age') AS INTEGER), 0), COALESCE(ltrim(json_extract(p.value, '$.berth'), '0123456789'), '')
+    FROM reserved_tickets t, json_each(t.data, '$.passengers') p
+'''
+ALLOCATIONS_QUERY = "SELECT train_no, travel_class, journey_date, coach, berth_number FROM berth_allocations"
+
+
+class Categories:
+    # Small integer codes for the distinct values of a string column, assigned
+    # a chunk at a time: only each chunk's unique values go through Python.
+
+    def __init__(self, values=()):
+        self.codes = {value: code for code, value in enumerate(values)}
+
+    def encode(self, values):
+        uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        return np.array([self.codes.setdefault(value, len(self.codes)) for value in uniques.tolist()], dtype=np.int32)[inverse]
+
+    def values(self):
+        return np.array(list(self.codes), dtype=str)
+
+
+def _columns(conn, query, kinds):
+    # Runs query a chunk of rows at a time into one array per column. kinds
+    # holds a Categories for string columns and a dtype for numeric ones.
+    parts = [[] for _ in kinds]
+    cursor = conn.execute(query)
+    while rows := cursor.fetchmany(CHUNK_ROWS):
+        for part, kind, column in zip(parts, kinds, zip(*rows)):
+            part.append(kind.encode(column) if isinstance(kind, Categories) else np.array(column, dtype=kind))
+    return [np.concatenate(part) if part else np.array([], dtype=np.int32 if isinstance(kind, Categories) else kind) for part, kind in zip(parts, kinds)]
+
+
+def export(db_path, path=DEFAULT_EXPORT_PATH):
+    # Writes every reserved ticket, its passengers and the berths allocated
+    # now to path as columnar arrays, with strings as codes into small lookup
+    # arrays. Reads a read-only connection, so it can run next to the app.
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+    trains, classes, statuses, coaches, dates = Categories(), Categories(), Categories(STATUSES), Categories(), Categories()
+    berth_types = Categories([''] + BERTH_TYPES)
+    try:
+        conn.execute("BEGIN")
+        ticket_rowid, ticket_train, ticket_class, ticket_status, ticket_passengers = _columns(conn, TICKETS_QUERY, [np.int64, trains, classes, statuses, np.int16])
+        passenger_rowid, passenger_age, passenger_berth = _columns(conn, PASSENGERS_QUERY, [np.int64, np.int16, berth_types])
+        alloc_train, alloc_class, alloc_date, alloc_coach, alloc_berth = _columns(conn, ALLOCATIONS_QUERY, [trains, classes, dates, coaches, np.int16])
+    finally:
+        conn.close()
+    # Every query reads the same snapshot, tickets and passengers in rowid order.
+    passenger_ticket = np.searchsorted(ticket_rowid, passenger_rowid).astype(np.int32)
+    np.savez(path, trains=trains.values(), classes=classes.values(), statuses=statuses.values(), coaches=coaches.values(), dates=dates.values(), berth_types=berth_types.values(),
+             ticket_train=ticket_train, ticket_class=ticket_class.astype(np.int16), ticket_status=ticket_status.astype(np.int8), ticket_passengers=ticket_passengers,
+             passenger_ticket=passenger_ticket, passenger_age=passenger_age, passenger_berth=passenger_berth.astype(np.int8),
+             alloc_train=alloc_train, alloc_class=alloc_class.astype(np.int16), alloc_date=alloc_date.astype(np.int16), alloc_coach=alloc_coach.astype(np.int16), alloc_berth=alloc_berth)
+    return len(ticket_train)
+
+
+def load(path=DEFAULT_EXPORT_PATH):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _group(keys, *weights, size):
+    # Per-key sums (a count when no weights) over flat int64 keys, for the keys that occur.
+    present = np.flatnonzero(np.bincount(keys, minlength=size))
+    return present, [np.bincount(keys, weights=weight, minlength=size)[present] for weight in weights or (None,)]
+
+
+def _top(rows, sort_key, limit):
+    rows.sort(key=sort_key, reverse=True)
+    return rows[:limit]
+
+
+def report(data, system, limit=20):
+    # Occupancy by train, class, coach and berth type, revenue by route at
+    # system's fares, cancellation rates and seniors seated off a lower berth,
+    # each a table sorted worst or biggest first and cut to limit rows.
+    trains, classes, coaches, berth_types = data['trains'].tolist(), data['classes'].tolist(), data['coaches'].tolist(), data['berth_types'].tolist()
+    n_trains, n_classes, n_coaches, n_types = len(trains), len(classes), len(coaches), len(BERTH_TYPES)
+    timetable = system.trains
+
+    # Seats of each (train, class) in the timetable now; 0 for ones it has dropped.
+    seats = np.zeros((n_trains, n_classes), dtype=np.int64)
+    for t, train_no in enumerate(trains):
+        for c, class_code in enumerate(classes):
+            seats[t, c] = timetable.get(train_no, {}).get('classes', {}).get(class_code, {}).get('seats', 0)
+    # Per class: seats per coach, berth type of each berth number, and how
+    # many berths of each type the first m berths of a coach hold.
+    per_coach = np.array([system._seats_per_coach(class_code) for class_code in classes] or [1], dtype=np.int64)
+    width = int(per_coach.max()) + 1
+    berth_type = np.zeros((max(n_classes, 1), width), dtype=np.int64)
+    prefix = np.zeros((max(n_classes, 1), width, n_types), dtype=np.int64)
+    for c, class_code in enumerate(classes):
+        codes = np.frombuffer(coach_layout(class_code, int(per_coach[c]))[0], dtype=np.uint8)
+        berth_type[c, 1:len(codes) + 1] = codes
+        prefix[c, 1:len(codes) + 1] = np.cumsum(np.eye(n_types, dtype=np.int64)[codes], axis=0)
+    # Coach number of each coach label within each class ('B3' -> 3 for 3A coaches).
+    coach_number = np.zeros((max(n_classes, 1), max(n_coaches, 1)), dtype=np.int64)
+    for c, class_code in enumerate(classes):
+        prefix_label = class_code.replace('A', '')
+        for k, coach in enumerate(coaches):
+            if coach.startswith(prefix_label) and coach[len(prefix_label):].isdigit(): coach_number[c, k] = int(coach[len(prefix_label):])
+
+    a_train, a_class, a_coach = data['alloc_train'].astype(np.int64), data['alloc_class'].astype(np.int64), data['alloc_coach'].astype(np.int64)
+    a_type = berth_type[a_class, np.minimum(data['alloc_berth'], width - 1)]
+    pair = a_train * n_classes + a_class
+    # Journey dates each (train, class) has allocations on.
+    dated, _ = _group(pair * len(data['dates']) + data['alloc_date'], size=n_trains * n_classes * max(len(data['dates']), 1))
+    dates = np.bincount(dated // max(len(data['dates']), 1), minlength=n_trains * n_classes)
+
+    keys, (allocated,) = _group((pair * n_coaches + a_coach) * n_types + a_type, size=n_trains * n_classes * n_coaches * n_types)
+    g_type, g_coach, g_pair = keys % n_types, keys // n_types % n_coaches, keys // n_types // n_coaches
+    g_train, g_class = g_pair // n_classes, g_pair % n_classes
+    # Berths of the type in that coach: the coach's share of the class's seats, through the layout.
+    in_coach = np.clip(seats[g_train, g_class] - per_coach[g_class] * (coach_number[g_class, g_coach] - 1), 0, per_coach[g_class])
+    capacity = prefix[g_class, in_coach, g_type] * dates[g_pair]
+    occupancy = _top([[trains[t], classes[c], coaches[k], BERTH_TYPES[b], int(n), int(cap), round(n / cap, 4) if cap else None]
+                      for t, c, k, b, n, cap in zip(g_train.tolist(), g_class.tolist(), g_coach.tolist(), g_type.tolist(), allocated.tolist(), capacity.tolist())],
+                     lambda row: (row[6] or 0, row[4]), limit)
+
+    class_keys, (class_allocated,) = _group(pair, size=n_trains * n_classes)
+    class_capacity = seats.ravel()[class_keys] * dates[class_keys]
+    class_occupancy = _top([[trains[key // n_classes], classes[key % n_classes], int(n), int(cap), round(n / cap, 4) if cap else None]
+                            for key, n, cap in zip(class_keys.tolist(), class_allocated.tolist(), class_capacity.tolist())],
+                           lambda row: (row[4] or 0, row[2]), limit)
+
+    # Revenue of tickets not cancelled, at the fare of one passenger of each (train, class) pair present.
+    t_train, t_class, t_status, t_passengers = data['ticket_train'].astype(np.int64), data['ticket_class'].astype(np.int64), data['ticket_status'], data['ticket_passengers']
+    t_pair = t_train * n_classes + t_class
+    fares = np.zeros(n_trains * n_classes)
+    for key in np.unique(t_pair).tolist():
+        fares[key] = system.calculate_reserved_fare(trains[key // n_classes], classes[key % n_classes], 1)
+    cancelled = t_status == STATUSES.index('CANCELLED')
+    revenue = np.where(cancelled, 0.0, np.round(fares[t_pair] * t_passengers, 2))
+    routes = {}
+    train_route = np.array([routes.setdefault(tuple(timetable[train_no]['details'][1:3]) if train_no in timetable else ('?', '?'), len(routes)) for train_no in trains] or [0], dtype=np.int64)
+    route_names = list(routes)
+    route_keys, (route_tickets, route_passengers, route_revenue) = _group(train_route[t_train[~cancelled]], None, t_passengers[~cancelled], revenue[~cancelled], size=max(len(routes), 1))
+    revenue_by_route = _top([[*route_names[r], int(n), int(p), round(float(v), 2)] for r, n, p, v in zip(route_keys.tolist(), route_tickets.tolist(), route_passengers.tolist(), route_revenue.tolist())],
+                            lambda row: row[4], limit)
+
+    cancel_keys, (cancel_total, cancel_count) = _group(t_pair, None, cancelled, size=n_trains * n_classes)
+    cancellations = _top([[trains[key // n_classes], classes[key % n_classes], int(n), int(x), round(x / n, 4)]
+                          for key, n, x in zip(cancel_keys.tolist(), cancel_total.tolist(), cancel_count.tolist())],
+                         lambda row: (row[4], row[3]), limit)
+
+    # Seniors on a berth in a ticket not cancelled, and how many of them are not on a lower berth.
+    p_ticket, p_berth = data['passenger_ticket'], data['passenger_berth']
+    seated = (data['passenger_age'] >= SENIOR_AGE) & (p_berth > 0) & ~cancelled[p_ticket]
+    lower = berth_types.index('LB')
+    senior_keys, (senior_count, senior_upper) = _group(t_pair[p_ticket[seated]], None, p_berth[seated] != lower, size=n_trains * n_classes)
+    seniors = _top([[trains[key // n_classes], classes[key % n_classes], int(n), int(u), round(u / n, 4)]
+                    for key, n, u in zip(senior_keys.tolist(), senior_count.tolist(), senior_upper.tolist())],
+                   lambda row: (row[3], row[4]), limit)
+
+    return {
+        'totals': {'tickets': int(len(t_train)), 'cancelled': int(cancelled.sum()), 'passengers': int(t_passengers[~cancelled].sum()),
+                   'revenue': round(float(revenue.sum()), 2), 'berths_allocated': int(len(a_train))},
+        'occupancy': {'columns': ['train_no', 'class', 'coach', 'berth_type', 'allocated', 'capacity', 'occupancy'], 'rows': occupancy},
+        'occupancy_by_class': {'columns': ['train_no', 'class', 'allocated', 'capacity', 'occupancy'], 'rows': class_occupancy},
+        'revenue_by_route': {'columns': ['source', 'destination', 'tickets', 'passengers', 'revenue'], 'rows': revenue_by_route},
+        'cancellations': {'columns': ['train_no', 'class', 'tickets', 'cancelled', 'rate'], 'rows': cancellations},
+        'seniors_off_lower_berths': {'columns': ['train_no', 'class', 'seniors', 'not_on_lower', 'share'], 'rows': seniors},
+    }
+
+
+def main(argv):
+    # python analytics.py export [railone.db] [analytics.npz]
+    # python analytics.py report [analytics.npz] [limit]  (timetable and fares from RAILONE_TRAINS / RAILONE_STATIONS)
+    import json
+    import os
+    import time
+    command, args = (argv or ['report'])[0], argv[1:]
+    if command == 'export':
+        db_path, path = (args + [os.getenv('RAILONE_DB', 'railone.db'), DEFAULT_EXPORT_PATH][len(args):])[:2]
+        start = time.perf_counter()
+        tickets = export(db_path, path)
+        print(f"exported {tickets} tickets from {db_path} to {path} in {time.perf_counter() - start:.1f}s")
+    elif command == 'report':
+        from reservation_system import RailwayReservationSystem
+        path, limit = (args + [DEFAULT_EXPORT_PATH, '20'][len(args):])[:2]
+        system = RailwayReservationSystem(db_path=os.getenv('RAILONE_DB', 'railone.db'), trains_path=os.getenv('RAILONE_TRAINS', 'trains.csv'), stations_path=os.getenv('RAILONE_STATIONS', 'station_coordinates.csv'))
+        print(json.dumps(report(load(path), system, int(limit)), indent=2))
+    else:
+        sys.exit(f"unknown command {command!r}; use export or report")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
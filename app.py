@@ -1,15 +1,23 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, Response
-from reservation_system import RailwayReservationSystem, User
+from functools import wraps
+from itertools import tee
+from flask import Flask, render_template, request, redirect, url_for, flash, session, Response, jsonify, stream_template, get_template_attribute, get_flashed_messages, stream_with_context
+from markupsafe import Markup
+from reservation_system import RailwayReservationSystem, User, valid_passengers
 from datetime import datetime, time, timedelta
+import hmac
 import random
-import io
 import uuid
 import os
+import shutil
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from google_auth_oauthlib.flow import Flow
 from google.oauth2 import id_token
 from google.auth.transport.requests import Request as GoogleRequest
-import qrcode
+from qr_cache import QRCodeCache
+from train_rows import TrainRowCache
+from zip_stream import stream_zip
+from cpu_pool import CPUPool, Overloaded
+from metrics import REGISTRY, instrument_app, start_profiler_from_env
 from dotenv import load_dotenv
 
 app = Flask(__name__)
@@ -33,6 +41,22 @@ CLIENT_SECRETS = {
         "redirect_uris": ["http://127.0.0.1:5000/google-callback"], "javascript_origins": ["http://127.0.0.1:5000"]
     }
 }
+BOOKINGS_PAGE_SIZE = 20
+MAX_BATCH_BOOKINGS = 500
+TRAINS_PAGE_SIZE = 50
+MAX_TRAINS_PAGE_SIZE = 500
+# Trains whose availability is looked up at once while a listing streams.
+TRAINS_CHUNK = 200
+# Seconds a payment waits for the admission queue to book its ticket.
+ADMISSION_WAIT = 30
+# Tickets one ZIP export may name by id.
+MAX_EXPORT_TICKETS = 10000
+# Seconds between checks for changed timetable CSVs (0 turns the watch off),
+# and the X-Admin-Token the /admin endpoints require (unset turns them off).
+TIMETABLE_POLL = float(os.getenv('RAILONE_TIMETABLE_POLL', 5))
+ADMIN_TOKEN = os.getenv('RAILONE_ADMIN_TOKEN')
+# The export `python analytics.py export` writes for /admin/analytics to report on.
+ANALYTICS_EXPORT = os.getenv('RAILONE_ANALYTICS_EXPORT', 'analytics.npz')
 GOOGLE_SCOPES = ['https://www.googleapis.com/auth/userinfo.profile', 'https://www.googleapis.com/auth/userinfo.email', 'openid']
 
 login_manager = LoginManager()
@@ -44,41 +68,62 @@ login_manager.login_message_category = 'error'
 def load_user(user_id):
     return system.get_user_by_id(int(user_id))
 
-system = RailwayReservationSystem(db_path='railway.db')
+def seed_database(path, seed='railway.db'):
+    # railway.db is tracked in git, so the app never migrates or writes it:
+    # it works on path, created on first start as a copy of the seed. The copy
+    # is linked into place, so concurrent workers never open a half-copied file.
+    if not os.path.exists(path) and os.path.exists(seed):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(seed, temp_path)
+        try: os.link(temp_path, path)
+        except FileExistsError: pass
+        finally: os.remove(temp_path)
+    return path
+
+# Started before anything else is loaded, so the forked workers stay small.
+cpu_pool = CPUPool.from_env().start()
+system = RailwayReservationSystem(db_path=seed_database(os.getenv('RAILONE_DB', 'railone.db')), trains_path=os.getenv('RAILONE_TRAINS', 'trains.csv'), stations_path=os.getenv('RAILONE_STATIONS', 'station_coordinates.csv'), cpu_pool=cpu_pool, synchronous=os.getenv('RAILONE_DB_SYNC', 'NORMAL'))
+qr_cache = QRCodeCache(max_entries=int(os.getenv('RAILONE_QR_CACHE_SIZE', 2048)), spill_dir=os.getenv('RAILONE_QR_CACHE_DIR'), cpu_pool=cpu_pool)
+# A ticket's QR payload never changes, so browsers may keep the image for a year.
+QR_MAX_AGE = 365 * 24 * 3600
+# Ticket table and printable page of each ticket type.
+PRINTABLE_TICKETS = {'reserved': (system.booked_tickets, 'printable_ticket.html'), 'unreserved': (system.unreserved_tickets, 'printable_unreserved_ticket.html'),
+                     'platform': (system.platform_tickets, 'printable_platform_ticket.html'), 'mst': (system.mst_tickets, 'printable_mst_ticket.html')}
+
+instrument_app(app)
+profiler = start_profiler_from_env()
+REGISTRY.gauges(lambda: {f"pending_{name}": value for name, value in system.pending_tickets.stats().items()})
+REGISTRY.gauges(lambda: {'seat_inventories': len(system.seat_calendar), 'qr_cache_images': len(qr_cache), 'qr_cache_hits': qr_cache.hits, 'qr_cache_misses': qr_cache.misses})
+train_rows = TrainRowCache(lambda no, train_data, availability: get_template_attribute('train_row.html', 'train_row')(no, train_data, availability))
+REGISTRY.gauges(lambda: {'train_rows_cached': len(train_rows), 'train_rows_hits': train_rows.hits, 'train_rows_misses': train_rows.misses})
+REGISTRY.gauges(lambda: {'admission_queued': system.admission.queued(), 'admission_admitted': system.admission.admitted, 'admission_sold_out': system.admission.sold_out, 'admission_busy': system.admission.busy, 'admission_batches': system.admission.batches})
+REGISTRY.gauges(lambda: {'cpu_pool_pending': cpu_pool.pending, 'cpu_pool_rejected': cpu_pool.rejected, 'cpu_pool_timed_out': cpu_pool.timed_out})
+
+@app.before_request
+def watch_timetable():
+    if TIMETABLE_POLL: system.watch_timetable(TIMETABLE_POLL)
+
+def admin_required(view):
+    @wraps(view)
+    def check_token(*args, **kwargs):
+        if not ADMIN_TOKEN: return jsonify({'error': 'Not found.'}), 404
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN): return jsonify({'error': 'Invalid admin token.'}), 403
+        return view(*args, **kwargs)
+    return check_token
+
+@app.errorhandler(Overloaded)
+def cpu_pool_overloaded(error): return Response("Rail One is busy, please try again in a moment.", status=503, mimetype='text/plain', headers={'Retry-After': '1'})
 
 @app.route('/')
 @login_required
 def landing_page():
     upcoming_ticket = None
-    candidate_tickets = []
     now = datetime.now()
+    # Next BOOKED trip straight from the (user_id, status, journey_at) index.
+    upcoming_ticket_details = system.booked_tickets.next_journey(current_user.id, now.strftime("%Y-%m-%d %H:%M"))
 
-    for pnr, ticket in system.booked_tickets.items():
-        if ticket.get('user_id') == current_user.id and ticket.get('status') == 'BOOKED':
-            try:
-                departure_full_str = ticket['departure']
-                journey_date_str = ticket['journey_date']
-
-                # --- THIS IS THE KEY FIX ---
-                # 1. Extract ONLY the time part from the departure string.
-                #    If '2025-10-01 10:52', it takes '10:52'.
-                #    If '17:00', it takes '17:00'.
-                time_part = departure_full_str.split(' ')[-1]
-
-                # 2. Reliably combine the saved future journey_date with the extracted time.
-                full_journey_dt_str = f"{journey_date_str} {time_part}"
-                journey_dt = datetime.strptime(full_journey_dt_str, "%Y-%m-%d %H:%M")
-
-                if journey_dt > now:
-                    candidate_tickets.append((journey_dt, ticket))
-
-            except (ValueError, KeyError):
-                continue
-
-    if candidate_tickets:
-        candidate_tickets.sort(key=lambda x: x[0])
-        upcoming_ticket_details = candidate_tickets[0][1]
-        journey_datetime_obj = candidate_tickets[0][0]
+    if upcoming_ticket_details:
+        journey_datetime_obj = datetime.strptime(f"{upcoming_ticket_details['journey_date']} {upcoming_ticket_details['departure'].split(' ')[-1]}", "%Y-%m-%d %H:%M")
         
         upcoming_ticket = {
             'pnr': upcoming_ticket_details['pnr'],
@@ -158,27 +203,39 @@ def payment(ticket_type, temp_id):
         amount = system.calculate_reserved_fare(pending_ticket['train_no'], pending_ticket['travel_class_code'], len(pending_ticket.get('passengers', [])))
     else: amount = pending_ticket.get('total_fare') or pending_ticket.get('total_price')
     if request.method == 'POST':
-        if temp_id not in system.pending_tickets: flash("Session expired.", "error"); return redirect(url_for('landing_page'))
-        del system.pending_tickets[temp_id]
+        pending_ticket = system.pending_tickets.pop(temp_id)
+        if not pending_ticket: flash("Session expired.", "error"); return redirect(url_for('landing_page'))
         if ticket_type == 'reserved':
             pnr = system._generate_pnr()
-            ticket_details = system.book_ticket_logic(pnr, pending_ticket['train_no'], pending_ticket['travel_class_code'], pending_ticket['passengers'], current_user.id)
+            attempt = system.request_booking(pnr, pending_ticket['train_no'], pending_ticket['travel_class_code'], pending_ticket['passengers'], current_user.id, pending_ticket.get('journey_date') or system.default_journey_date())
+            if attempt and attempt.status == 'SOLD_OUT': flash("Sold out: this class has no berths or waitlist places left.", "error"); return redirect(url_for('reserved_booking'))
+            if attempt and attempt.status == 'BUSY':
+                system.pending_tickets[temp_id] = pending_ticket
+                flash(f"{attempt.position} bookings are queued ahead of yours for this class (about {attempt.eta:.0f}s). Please try again shortly.", "error"); return redirect(url_for('payment', ticket_type=ticket_type, temp_id=temp_id))
+            try: ticket_details = attempt and attempt.wait(ADMISSION_WAIT)
+            except TimeoutError: flash("Your booking is still being processed and will show up in My Bookings.", "info"); return redirect(url_for('my_bookings'))
+            if ticket_details and ticket_details['status'] == 'WAITLISTED': flash(f"Payment successful! Ticket is {system.get_waitlist_status(ticket_details)}.", "info"); return redirect(url_for('view_ticket', pnr=pnr))
             if ticket_details: flash("Payment successful! Ticket booked.", "success"); return redirect(url_for('view_ticket', pnr=pnr))
             else: flash("Booking failed.", "error"); return redirect(url_for('reserved_booking'))
         else:
-            ticket_id = pending_ticket['ticket_id']
+            ticket_id = pending_ticket['ticket_id']; pending_ticket['user_id'] = current_user.id
             if ticket_type == 'unreserved':
                 system.unreserved_tickets[ticket_id] = pending_ticket; flash("Payment successful! Ticket booked.", "success"); return redirect(url_for('view_unreserved_ticket', ticket_id=ticket_id))
             elif ticket_type == 'platform':
                 system.platform_tickets[ticket_id] = pending_ticket; flash("Payment successful! Ticket booked.", "success"); return redirect(url_for('view_platform_ticket', ticket_id=ticket_id))
             elif ticket_type == 'mst':
                 system.mst_tickets[ticket_id] = pending_ticket; flash("Payment successful! MST booked.", "success"); return redirect(url_for('view_mst_ticket', ticket_id=ticket_id))
-    return render_template('payment.html', amount=round(amount, 2))
+    queue = system.admission.status((pending_ticket['train_no'], pending_ticket['travel_class_code'], pending_ticket.get('journey_date') or system.default_journey_date())) if ticket_type == 'reserved' else None
+    return render_template('payment.html', amount=round(amount, 2), queue=queue)
 
 @app.route('/my_bookings')
 @login_required
 def my_bookings():
-    return render_template('my_bookings.html', reserved_tickets=system.booked_tickets, unreserved_tickets=system.unreserved_tickets, platform_tickets=system.platform_tickets, mst_tickets=system.mst_tickets)
+    page = max(request.args.get('page', type=int, default=1), 1); offset = (page - 1) * BOOKINGS_PAGE_SIZE
+    tables = {'reserved_tickets': system.booked_tickets, 'unreserved_tickets': system.unreserved_tickets, 'platform_tickets': system.platform_tickets, 'mst_tickets': system.mst_tickets}
+    tickets = {name: table.for_user(current_user.id, BOOKINGS_PAGE_SIZE, offset) for name, table in tables.items()}
+    has_next = any(table.count_for_user(current_user.id) > offset + BOOKINGS_PAGE_SIZE for table in tables.values())
+    return render_template('my_bookings.html', page=page, has_next=has_next, **tickets)
 
 @app.route('/reserved_booking', methods=['GET', 'POST'])
 @login_required
@@ -186,26 +243,43 @@ def reserved_booking():
     if request.method == 'POST':
         source, destination = request.form.get('source', '').strip(), request.form.get('destination', '').strip()
         found_trains = system.find_trains(source, destination)
-        if not found_trains: flash(f"No trains found.", "info")
-        return render_template('trains.html', trains=found_trains, search_query=(source, destination))
-    return render_template('reserved_booking_flow.html', stations=system.get_station_list_for_autocomplete())
+        journeys = [] if found_trains else system.plan_journeys(source, destination)
+        if not found_trains and journeys: flash("No direct trains found. Showing connecting journeys.", "info")
+        elif not found_trains: flash(f"No trains found.", "info")
+        return render_template('trains.html', trains=found_trains, journeys=journeys, rows=listing_rows(list(found_trains)), search_query=(source, destination))
+    return render_template('reserved_booking_flow.html')
+
+@app.route('/api/stations')
+@login_required
+def stations_api(): return jsonify(system.station_search.search(request.args.get('q', ''), request.args.get('limit', type=int, default=8)))
+
+@app.route('/api/journeys')
+@login_required
+def journeys_api():
+    source, destination = request.args.get('source', '').strip(), request.args.get('destination', '').strip()
+    return jsonify(system.plan_journeys(source, destination))
 
 @app.route('/book/details/<train_no>', methods=['GET', 'POST'])
 @login_required
 def enter_passenger_details(train_no):
     train = system.trains.get(train_no)
     if not train: flash("Invalid train.", "error"); return redirect(url_for('reserved_booking'))
+    journey_date = system.seat_calendar.normalize(request.values.get('journey_date') or system.default_journey_date())
+    first_date, last_date = system.seat_calendar.window()
+    details_page = lambda: render_template('passenger_details.html', train_no=train_no, train=train, journey_date=journey_date, first_date=first_date, last_date=last_date, availability=system.get_availability([train_no], journey_date)[train_no])
+    if journey_date is None: flash(f"Journey date must be between {first_date} and {last_date}.", "error"); journey_date = system.default_journey_date(); return details_page()
     if request.method == 'POST':
         travel_class = request.form.get('travel_class'); passengers = []
         i = 0
         while f'name_{i}' in request.form:
             name, age, gender, preference = request.form.get(f'name_{i}'), request.form.get(f'age_{i}'), request.form.get(f'gender_{i}'), request.form.get(f'preference_{i}', 'ANY')
-            if not all([name, age, gender]): flash("All fields required.", "error"); return render_template('passenger_details.html', train_no=train_no, train=train)
+            if not all([name, age, gender]): flash("All fields required.", "error"); return details_page()
+            if not age.isdigit(): flash("Age must be a whole number.", "error"); return details_page()
             passengers.append({'name': name, 'age': age, 'gender': gender, 'preference': preference}); i += 1
-        if not passengers: flash("Add at least one passenger.", "error"); return render_template('passenger_details.html', train_no=train_no, train=train)
-        temp_id = str(uuid.uuid4()); system.pending_tickets[temp_id] = {'train_no': train_no, 'travel_class_code': travel_class, 'passengers': passengers}
+        if not passengers: flash("Add at least one passenger.", "error"); return details_page()
+        temp_id = str(uuid.uuid4()); system.pending_tickets[temp_id] = {'train_no': train_no, 'travel_class_code': travel_class, 'journey_date': journey_date, 'passengers': passengers}
         return redirect(url_for('payment', ticket_type='reserved', temp_id=temp_id))
-    return render_template('passenger_details.html', train_no=train_no, train=train)
+    return details_page()
 
 @app.route('/unreserved_ticket', methods=['GET', 'POST'])
 @login_required
@@ -215,7 +289,7 @@ def unreserved_ticket_search():
         distance = system.get_distance(source, destination)
         if distance: return redirect(url_for('unreserved_ticket_booking', source=source, destination=destination, dist=distance))
         else: flash(f"Could not calculate distance.", "error")
-    return render_template('unreserved_search.html', stations=system.get_station_list_for_autocomplete())
+    return render_template('unreserved_search.html')
 
 @app.route('/unreserved_ticket/book', methods=['GET', 'POST'])
 @login_required
@@ -254,17 +328,139 @@ def mst_booking():
         ticket_id = f"MST-{datetime.now().strftime('%Y%m%d%H%M%S')}-{random.randint(100, 999)}"
         system.pending_tickets[temp_id] = { 'ticket_id': ticket_id, 'source': source, 'destination': destination, 'passenger_name': passenger_name, 'passenger_age': passenger_age, 'phone_number': phone_number, 'total_fare': fare, 'valid_from': valid_from.strftime("%Y-%m-%d"), 'valid_until': valid_until.strftime("%Y-%m-%d"), 'status': 'BOOKED' }
         return redirect(url_for('payment', ticket_type='mst', temp_id=temp_id))
-    return render_template('mst_booking.html', stations=system.get_station_list_for_autocomplete())
+    return render_template('mst_booking.html')
+
+def listing_rows(train_nos):
+    # Cached rows for train_nos, with availability looked up a chunk at a time.
+    for start in range(0, len(train_nos), TRAINS_CHUNK):
+        chunk = train_nos[start:start + TRAINS_CHUNK]
+        availability = system.get_availability(chunk)
+        for no in chunk: yield Markup(train_rows.row(system.trains, no, availability[no]))
+
+def buffered(chunks, size=16384):
+    # Joins a template stream's many small pieces into writes of about size characters.
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk); length += len(chunk)
+        if length >= size: yield ''.join(buffer); buffer, length = [], 0
+    if buffer: yield ''.join(buffer)
+
+def departure_time(name):
+    # ?name=HH:MM as 'HH:MM', None when absent or malformed.
+    try: return datetime.strptime(request.args.get(name, ''), '%H:%M').strftime('%H:%M')
+    except ValueError: return None
+
+def listed_trains():
+    # Train numbers matching ?station=, ?class= and ?depart_after= / ?depart_before= (HH:MM).
+    return system.list_trains(request.args.get('station', '').strip() or None, request.args.get('class', '').strip().upper() or None, departure_time('depart_after'), departure_time('depart_before'))
 
 @app.route('/trains')
 @login_required
-def show_trains(): return render_template('trains.html', trains=system.trains)
+def show_trains():
+    # Streamed, so the page starts arriving before the last row is rendered. Flashes are
+    # popped now, while the session can still be saved, and shown from the request's copy.
+    get_flashed_messages(with_categories=True)
+    train_nos = listed_trains()
+    return Response(buffered(stream_template('trains.html', trains=train_nos, rows=listing_rows(train_nos))), mimetype='text/html')
+
+@app.route('/api/trains')
+@login_required
+def trains_api():
+    # The /trains filters, a page at a time (?page=, ?per_page=), with availability on ?date= (default tomorrow).
+    train_nos = listed_trains()
+    page = max(request.args.get('page', type=int, default=1), 1); per_page = min(max(request.args.get('per_page', type=int, default=TRAINS_PAGE_SIZE), 1), MAX_TRAINS_PAGE_SIZE)
+    journey_date = system.seat_calendar.normalize(request.args.get('date') or system.default_journey_date())
+    if journey_date is None: return jsonify({'error': 'Date outside the booking window.'}), 400
+    page_nos = train_nos[(page - 1) * per_page:page * per_page]
+    availability = system.get_availability(page_nos, journey_date)
+    trains = [{'train_no': no, 'name': system.trains[no]['details'][0], 'source': system.trains[no]['details'][1], 'destination': system.trains[no]['details'][2],
+               'departure': system.trains[no]['details'][3], 'arrival': system.trains[no]['details'][4],
+               'classes': {code: {'name': info['name'], 'seats': info['seats'], 'available': availability[no].get(code)} for code, info in system.trains[no]['classes'].items()}}
+              for no in page_nos]
+    return jsonify({'trains': trains, 'page': page, 'per_page': per_page, 'total': len(train_nos), 'has_next': page * per_page < len(train_nos)})
+
+@app.route('/api/availability/<train_no>')
+@login_required
+def availability_api(train_no):
+    if train_no not in system.trains: return jsonify({'error': 'Invalid train.'}), 404
+    journey_date = system.seat_calendar.normalize(request.args.get('date') or system.default_journey_date())
+    if journey_date is None: return jsonify({'error': 'Date outside the booking window.'}), 400
+    return jsonify(system.get_availability_by_type(train_no, journey_date))
+
+def parse_batch_booking(booking):
+    # (booking as book_batch takes it, None) or (None, what is wrong with it).
+    if not isinstance(booking, dict): return None, "not an object."
+    train_no = str(booking.get('train_no')); train = system.trains.get(train_no)
+    if not train: return None, "invalid train."
+    if booking.get('travel_class') not in train['classes']: return None, "invalid class."
+    journey_date = system.seat_calendar.normalize(booking.get('journey_date') or system.default_journey_date())
+    if journey_date is None: return None, "journey date must be between %s and %s." % system.seat_calendar.window()
+    passengers = booking.get('passengers')
+    if not isinstance(passengers, list) or not passengers: return None, "add at least one passenger."
+    if not valid_passengers(passengers): return None, "every passenger needs a name, gender and age."
+    passengers = [{'name': str(p['name']), 'age': str(p['age']), 'gender': str(p['gender']), 'preference': str(p.get('preference', 'ANY'))} for p in passengers]
+    return {'train_no': train_no, 'travel_class': booking['travel_class'], 'journey_date': journey_date, 'passengers': passengers}, None
+
+@app.route('/api/bookings/batch', methods=['POST'])
+@login_required
+def batch_booking_api():
+    # {"bookings": [{"train_no", "travel_class", "journey_date", "passengers": [{"name", "age", "gender", "preference"}]}]};
+    # confirms all of them or none.
+    bookings = (request.get_json(silent=True) or {}).get('bookings')
+    if not isinstance(bookings, list) or not 0 < len(bookings) <= MAX_BATCH_BOOKINGS: return jsonify({'error': f'Send between 1 and {MAX_BATCH_BOOKINGS} bookings.'}), 400
+    parsed = []
+    for i, booking in enumerate(bookings):
+        booking, error = parse_batch_booking(booking)
+        if error: return jsonify({'error': f'Booking {i}: {error}'}), 400
+        parsed.append(booking)
+    tickets = system.book_batch(parsed, current_user.id)
+    if tickets is None: return jsonify({'error': 'Not every booking could be confirmed, so none were booked.'}), 409
+    fares = [system.calculate_reserved_fare(ticket['train_no'], ticket['travel_class_code'], len(ticket['passengers'])) for ticket in tickets]
+    return jsonify({'tickets': [dict(ticket, fare=fare) for ticket, fare in zip(tickets, fares)], 'total_fare': round(sum(fares), 2)}), 201
+
+@app.route('/api/admission/<train_no>/<travel_class>')
+@login_required
+def admission_api(train_no, travel_class):
+    # Queue length, ETA in seconds and whether the class is sold out, for the journey date given.
+    journey_date = system.seat_calendar.normalize(request.args.get('date') or system.default_journey_date())
+    if travel_class not in system.trains.get(train_no, {}).get('classes', {}): return jsonify({'error': 'Unknown train or class.'}), 404
+    if journey_date is None: return jsonify({'error': 'Date outside the booking window.'}), 400
+    return jsonify(system.admission.status((train_no, travel_class, journey_date)))
+
+@app.route('/admin/timetable/reload', methods=['POST'])
+@admin_required
+def reload_timetable_api():
+    # Reloads this worker's timetable now; other workers follow within TIMETABLE_POLL seconds.
+    changes = system.reload_timetable()
+    return jsonify({'reloaded': changes is not None, **(changes or {})})
+
+analytics_reports = {}
+
+@app.route('/admin/analytics')
+@admin_required
+def analytics_api():
+    # Reports on the latest export, computed once per export file and limit.
+    try: exported_at = os.path.getmtime(ANALYTICS_EXPORT)
+    except OSError: return jsonify({'error': 'No analytics export yet; run python analytics.py export.'}), 404
+    limit = min(max(request.args.get('limit', type=int, default=20), 1), 1000); key = (exported_at, limit)
+    if key not in analytics_reports:
+        import analytics
+        analytics_reports.clear(); analytics_reports[key] = analytics.report(analytics.load(ANALYTICS_EXPORT), system, limit)
+    return jsonify({'exported_at': datetime.fromtimestamp(exported_at).isoformat(timespec='seconds'), **analytics_reports[key]})
+
+@app.route('/metrics')
+def prometheus_metrics(): return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics/pending')
+@login_required
+def pending_metrics_api(): return jsonify(system.pending_tickets.stats())
 
 @app.route('/ticket/<pnr>')
 @login_required
 def view_ticket(pnr):
     ticket = system.booked_tickets.get(pnr)
     if not ticket: flash("Invalid PNR.", "error"); return redirect(url_for('my_bookings'))
+    ticket['status'] = system.get_waitlist_status(ticket)
     return render_template('ticket.html', ticket=ticket)
 
 @app.route('/unreserved_ticket/view/<ticket_id>')
@@ -302,9 +498,9 @@ def check_pnr():
 def cancel():
     if request.method == 'POST':
         pnr = request.form.get('pnr', '').strip()
-        ticket = system.booked_tickets.get(pnr)
-        if ticket and ticket['status'] != 'CANCELLED':
-            ticket['status'] = 'CANCELLED'; flash(f"Ticket {pnr} cancelled.", "success")
+        if system.cancel_ticket(pnr):
+            qr_cache.drop('reserved', pnr)
+            flash(f"Ticket {pnr} cancelled.", "success")
             return redirect(url_for('view_ticket', pnr=pnr))
         else: flash("Invalid PNR or already cancelled.", "error")
     return render_template('cancel_form.html')
@@ -314,6 +510,7 @@ def cancel():
 def print_ticket_page(pnr):
     ticket = system.booked_tickets.get(pnr)
     if not ticket: flash("Invalid PNR.", "error"); return redirect(url_for('landing_page'))
+    ticket['status'] = system.get_waitlist_status(ticket)
     return render_template('printable_ticket.html', ticket=ticket)
 
 @app.route('/unreserved_ticket/print/<ticket_id>')
@@ -337,22 +534,47 @@ def print_mst_ticket(ticket_id):
     if not ticket: flash("Invalid MST ID.", "error"); return redirect(url_for('my_bookings'))
     return render_template('printable_mst_ticket.html', ticket=ticket)
 
+@app.route('/tickets/export/<ticket_type>.zip', methods=['GET', 'POST'])
+@login_required
+def export_tickets(ticket_type):
+    # The user's tickets of ticket_type (all of them, or those named by id
+    # fields) as a ZIP of printable pages, each with its QR code as a PNG
+    # beside it. Streamed a ticket at a time while the QR codes encode ahead
+    # on the CPU pool, so memory stays flat however many tickets there are.
+    if ticket_type not in PRINTABLE_TICKETS: return "Unknown ticket type.", 404
+    table, template = PRINTABLE_TICKETS[ticket_type]
+    ids = list(dict.fromkeys(request.values.getlist('id'))) or None
+    if ids and len(ids) > MAX_EXPORT_TICKETS: return f"At most {MAX_EXPORT_TICKETS} tickets per export.", 400
+    tickets, qr_tickets = tee(table.iter_for_user(current_user.id, ids))
+    qr_codes = qr_cache.get_many((ticket_type, ticket[table.key], qr_payload(ticket_type, ticket)) for ticket in qr_tickets)
+
+    def entries():
+        for ticket, png in zip(tickets, qr_codes):
+            ticket_id = ticket[table.key]
+            if ticket_type == 'reserved': ticket['status'] = system.get_waitlist_status(ticket)
+            yield f"{ticket_id}.html", render_template(template, ticket=ticket, qr_src=f"{ticket_id}.png").encode('utf-8'), True
+            yield f"{ticket_id}.png", png, False
+    return Response(stream_with_context(stream_zip(entries())), mimetype='application/zip', headers={'Content-Disposition': f'attachment; filename="{ticket_type}-tickets.zip"'})
+
+def qr_payload(ticket_type, ticket):
+    if ticket_type == 'reserved': return f"PNR: {ticket['pnr']}, Train: {ticket['train_no']}, From: {ticket['source']}, To: {ticket['destination']}"
+    elif ticket_type == 'unreserved': return f"ID: {ticket['ticket_id']}, From: {ticket['source']}, To: {ticket['destination']}"
+    elif ticket_type == 'platform': return f"ID: {ticket['ticket_id']}, Station: {ticket['station_name']}"
+    elif ticket_type == 'mst': return f"ID: {ticket['ticket_id']}, Passenger: {ticket['passenger_name']}, Route: {ticket['source']}-{ticket['destination']}"
+
 @app.route('/qr_code/<ticket_type>/<ticket_id>')
 @login_required
 def generate_qr_code(ticket_type, ticket_id):
-    qr_data = "No ticket data available."
-    ticket = None
-    if ticket_type == 'reserved': ticket = system.booked_tickets.get(ticket_id)
-    elif ticket_type == 'unreserved': ticket = system.unreserved_tickets.get(ticket_id)
-    elif ticket_type == 'platform': ticket = system.platform_tickets.get(ticket_id)
-    elif ticket_type == 'mst': ticket = system.mst_tickets.get(ticket_id)
-    if ticket:
-        if ticket_type == 'reserved': qr_data = f"PNR: {ticket['pnr']}, Train: {ticket['train_no']}, From: {ticket['source']}, To: {ticket['destination']}"
-        elif ticket_type == 'unreserved': qr_data = f"ID: {ticket['ticket_id']}, From: {ticket['source']}, To: {ticket['destination']}"
-        elif ticket_type == 'platform': qr_data = f"ID: {ticket['ticket_id']}, Station: {ticket['station_name']}"
-        elif ticket_type == 'mst': qr_data = f"ID: {ticket['ticket_id']}, Passenger: {ticket['passenger_name']}, Route: {ticket['source']}-{ticket['destination']}"
-    img = qrcode.make(qr_data); buf = io.BytesIO(); img.save(buf); buf.seek(0)
-    return Response(buf, mimetype='image/png')
+    ticket = PRINTABLE_TICKETS[ticket_type][0].get(ticket_id) if ticket_type in PRINTABLE_TICKETS else None
+    # Nothing is cached or sent with cache headers for a ticket that does
+    # not exist, so made-up ids cannot fill the cache or its spill directory.
+    if not ticket: return "No ticket data available.", 404
+    qr_data = qr_payload(ticket_type, ticket)
+    etag = qr_cache.etag(qr_data)
+    if request.if_none_match.contains(etag): response = Response(status=304)
+    else: response = Response(qr_cache.get(ticket_type, ticket_id, qr_data), mimetype='image/png')
+    response.set_etag(etag); response.cache_control.private = True; response.cache_control.max_age = QR_MAX_AGE
+    return response
 
 if __name__ == '__main__':
     app.run(debug=True)
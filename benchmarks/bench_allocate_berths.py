@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+
+SEATS = 2000
+BUCKETS = 10
+
+
+def main():
+    system = RailwayReservationSystem(db_path=os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    system.trains['99999'] = {'details': ['BENCH EXPRESS', 'NDLS', 'HWH', '10:00', '22:00'], 'classes': {'3A': {'name': 'THIRD AC', 'seats': SEATS}}}
+    journey_date = system.default_journey_date()
+    preferences = ['LB', 'MB', 'UB', 'SLB', 'SUB', 'ANY']
+    inventory = system.seat_calendar.get('99999', '3A', journey_date)
+    timings, attempt = [], 0
+    while inventory.free_count():
+        attempt += 1
+        # Seniors only get lower berths, so once those run out their bookings fail.
+        age = 65 if attempt % 7 == 0 else 30
+        passenger = {'name': 'P', 'age': age, 'gender': 'M', 'preference': preferences[attempt % len(preferences)]}
+        start = time.perf_counter()
+        allocated = system.allocate_berths('99999', '3A', [passenger], journey_date)
+        elapsed = time.perf_counter() - start
+        if allocated: timings.append(elapsed)
+    print(f"allocated {len(timings)} berths one passenger at a time")
+    size = len(timings) // BUCKETS
+    for i in range(BUCKETS):
+        bucket = timings[i * size:(i + 1) * size]
+        print(f"  fill {i * 10:3d}-{(i + 1) * 10:3d}%: {sum(bucket) / len(bucket) * 1e6:7.2f} us/booking")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+
+import analytics
+from reservation_system import RailwayReservationSystem
+from seat_inventory import BERTH_TYPES, coach_layout
+from synthetic import write_timetable
+
+TICKETS = 10_000_000
+NAIVE_TICKETS = 500_000
+EXPORT_TICKETS = 200_000
+DATES = 60
+TRAINS = 2000
+STATIONS = 1000
+
+
+def dataset(system, tickets, seed=24):
+    # Arrays in the layout analytics.export writes: tickets of 1-6 passengers
+    # over every (train, class) of the timetable, 80% booked, 8% waitlisted and
+    # 12% cancelled, with random berths (not deduplicated) for booked and
+    # cancelled passengers and an allocation for each booked one.
+    rng = np.random.default_rng(seed)
+    pairs = [(train_no, class_code) for train_no, train in system.trains.items() for class_code in train['classes']]
+    trains, classes = sorted({t for t, _ in pairs}), sorted({c for _, c in pairs})
+    train_index, class_index = {t: i for i, t in enumerate(trains)}, {c: i for i, c in enumerate(classes)}
+    per_coach = np.array([system._seats_per_coach(c) for c in classes])
+    berth_type = np.zeros((len(classes), per_coach.max() + 1), dtype=np.int8)
+    for c, class_code in enumerate(classes):
+        codes = np.frombuffer(coach_layout(class_code, int(per_coach[c]))[0], dtype=np.uint8)
+        berth_type[c, 1:len(codes) + 1] = codes + 1
+    pair_train = np.array([train_index[t] for t, _ in pairs], dtype=np.int32)
+    pair_class = np.array([class_index[c] for _, c in pairs], dtype=np.int16)
+    pair_seats = np.array([system.trains[t]['classes'][c]['seats'] for t, c in pairs])
+    max_coaches = int(np.ceil(pair_seats / per_coach[pair_class]).max())
+    coaches = [f"{c.replace('A', '')}{k}" for c in classes for k in range(1, max_coaches + 1)]
+    coach_label = np.arange(len(coaches), dtype=np.int16).reshape(len(classes), max_coaches)
+
+    pick = rng.integers(0, len(pairs), tickets)
+    status = rng.choice(3, tickets, p=[0.8, 0.08, 0.12]).astype(np.int8)
+    passengers = rng.integers(1, 7, tickets).astype(np.int16)
+    ticket_date = rng.integers(0, DATES, tickets).astype(np.int16)
+    passenger_ticket = np.repeat(np.arange(tickets, dtype=np.int32), passengers)
+    p_pair = pick[passenger_ticket]; p_class = pair_class[p_pair]; p_per_coach = per_coach[p_class]
+    coach = (rng.random(len(passenger_ticket)) * np.ceil(pair_seats[p_pair] / p_per_coach)).astype(np.int64) + 1
+    in_coach = np.minimum(p_per_coach, pair_seats[p_pair] - p_per_coach * (coach - 1))
+    berth = (rng.random(len(passenger_ticket)) * in_coach).astype(np.int16) + 1
+    seated = status[passenger_ticket] != analytics.STATUSES.index('WAITLISTED')
+    allocated = status[passenger_ticket] == analytics.STATUSES.index('BOOKED')
+    return {
+        'trains': np.array(trains), 'classes': np.array(classes), 'statuses': np.array(analytics.STATUSES), 'coaches': np.array(coaches),
+        'dates': np.array([f"2026-01-{day:02d}" if day <= 31 else f"2026-02-{day - 31:02d}" for day in range(1, DATES + 1)]), 'berth_types': np.array([''] + BERTH_TYPES),
+        'ticket_train': pair_train[pick], 'ticket_class': pair_class[pick], 'ticket_status': status, 'ticket_passengers': passengers,
+        'passenger_ticket': passenger_ticket, 'passenger_age': rng.integers(1, 90, len(passenger_ticket)).astype(np.int16),
+        'passenger_berth': np.where(seated, berth_type[p_class, berth], 0).astype(np.int8), 'passenger_number': np.where(seated, berth, 0).astype(np.int16),
+        'passenger_coach': coach_label[p_class, coach - 1],
+        'alloc_train': pair_train[p_pair][allocated], 'alloc_class': p_class[allocated], 'alloc_date': ticket_date[passenger_ticket][allocated],
+        'alloc_coach': coach_label[p_class, coach - 1][allocated], 'alloc_berth': berth[allocated],
+        'ticket_date': ticket_date,
+    }
+
+
+def head(data, tickets):
+    # The first tickets, with their passengers and allocations, copied out of data.
+    passengers = int(np.searchsorted(data['passenger_ticket'], tickets))
+    allocations = int(np.count_nonzero(data['ticket_status'][data['passenger_ticket'][:passengers]] == analytics.STATUSES.index('BOOKED')))
+    return {name: (values[:tickets] if name.startswith('ticket_') else values[:passengers] if name.startswith('passenger_') else values[:allocations] if name.startswith('alloc_') else values).copy()
+            for name, values in data.items()}
+
+
+def rows(data):
+    # The tickets as the app stores them, and (train, class, date, coach, berth) allocations.
+    names = {name: data[name].tolist() for name in ('trains', 'classes', 'statuses', 'coaches', 'dates', 'berth_types')}
+    tickets = [{'train_no': names['trains'][t], 'travel_class_code': names['classes'][c], 'status': names['statuses'][s], 'journey_date': names['dates'][d], 'passengers': []}
+               for t, c, s, d in zip(data['ticket_train'].tolist(), data['ticket_class'].tolist(), data['ticket_status'].tolist(), data['ticket_date'].tolist())]
+    for t, age, berth_type, number, coach in zip(data['passenger_ticket'].tolist(), data['passenger_age'].tolist(), data['passenger_berth'].tolist(), data['passenger_number'].tolist(), data['passenger_coach'].tolist()):
+        tickets[t]['passengers'].append({'name': 'P', 'age': str(age), **({'coach': names['coaches'][coach], 'berth': f"{number}{names['berth_types'][berth_type]}"} if berth_type else {})})
+    allocations = list(zip(map(names['trains'].__getitem__, data['alloc_train'].tolist()), map(names['classes'].__getitem__, data['alloc_class'].tolist()),
+                           map(names['dates'].__getitem__, data['alloc_date'].tolist()), map(names['coaches'].__getitem__, data['alloc_coach'].tolist()), data['alloc_berth'].tolist()))
+    return tickets, allocations
+
+
+def naive_report(tickets, allocations, system):
+    # The same tables as analytics.report, one dict update per row.
+    layouts, allocated, dates = {}, {}, {}
+    for train_no, class_code, journey_date, coach, number in allocations:
+        if class_code not in layouts: layouts[class_code] = (system._seats_per_coach(class_code), coach_layout(class_code, system._seats_per_coach(class_code))[0])
+        key = (train_no, class_code, coach, BERTH_TYPES[layouts[class_code][1][number - 1]])
+        allocated[key] = allocated.get(key, 0) + 1
+        dates.setdefault((train_no, class_code), set()).add(journey_date)
+    occupancy, by_class = [], {}
+    for (train_no, class_code, coach, berth_type), n in allocated.items():
+        per_coach, codes = layouts[class_code]; seats = system.trains[train_no]['classes'][class_code]['seats']
+        in_coach = max(0, min(per_coach, seats - per_coach * (int(coach[len(class_code.replace('A', '')):]) - 1)))
+        capacity = sum(1 for code in codes[:in_coach] if BERTH_TYPES[code] == berth_type) * len(dates[(train_no, class_code)])
+        occupancy.append([train_no, class_code, coach, berth_type, n, capacity, round(n / capacity, 4) if capacity else None])
+        by_class[(train_no, class_code)] = by_class.get((train_no, class_code), 0) + n
+    class_occupancy = [[t, c, n, system.trains[t]['classes'][c]['seats'] * len(dates[(t, c)]), round(n / (system.trains[t]['classes'][c]['seats'] * len(dates[(t, c)])), 4)] for (t, c), n in by_class.items()]
+
+    routes, totals, seniors, total = {}, {}, {}, {'tickets': 0, 'cancelled': 0, 'passengers': 0, 'revenue': 0.0, 'berths_allocated': len(allocations)}
+    for ticket in tickets:
+        key = (ticket['train_no'], ticket['travel_class_code'])
+        counts = totals.setdefault(key, [0, 0]); counts[0] += 1; total['tickets'] += 1
+        if ticket['status'] == 'CANCELLED':
+            counts[1] += 1; total['cancelled'] += 1; continue
+        revenue = round(system.calculate_reserved_fare(*key, 1) * len(ticket['passengers']), 2)
+        route = routes.setdefault(tuple(system.trains[ticket['train_no']]['details'][1:3]), [0, 0, 0.0])
+        route[0] += 1; route[1] += len(ticket['passengers']); route[2] += revenue
+        total['passengers'] += len(ticket['passengers']); total['revenue'] += revenue
+        for passenger in ticket['passengers']:
+            if int(passenger['age']) >= analytics.SENIOR_AGE and passenger.get('berth'):
+                counts = seniors.setdefault(key, [0, 0]); counts[0] += 1; counts[1] += passenger['berth'].lstrip('0123456789') != 'LB'
+    total['revenue'] = round(total['revenue'], 2)
+    return {
+        'totals': total, 'occupancy': occupancy, 'occupancy_by_class': class_occupancy,
+        'revenue_by_route': [[*route, n, p, round(v, 2)] for route, (n, p, v) in routes.items()],
+        'cancellations': [[*key, n, x, round(x / n, 4)] for key, (n, x) in totals.items()],
+        'seniors_off_lower_berths': [[*key, n, u, round(u / n, 4)] for key, (n, u) in seniors.items()],
+    }
+
+
+def same(vectorized, naive):
+    assert vectorized['totals'] == naive['totals'] or all(math.isclose(vectorized['totals'][k], naive['totals'][k]) for k in naive['totals']), (vectorized['totals'], naive['totals'])
+    for table, expected in naive.items():
+        if table == 'totals': continue
+        got = sorted(vectorized[table]['rows'], key=str); expected = sorted(expected, key=str)
+        assert len(got) == len(expected), table
+        for a, b in zip(got, expected):
+            assert all(math.isclose(x, y) if isinstance(x, float) else x == y for x, y in zip(a, b)), (table, a, b)
+
+
+def export_rate(system, data):
+    # Writes the tickets into a new database and times analytics.export over
+    # it. Random berths can repeat, and berth_allocations keeps one of each.
+    db_path = os.path.join(tempfile.mkdtemp(), 'export.db')
+    export_system = RailwayReservationSystem(db_path=db_path, trains_path=system.trains_path, stations_path=system.stations_path, snapshot_path=None)
+    tickets, allocations = rows(data)
+    allocations = list(dict.fromkeys(allocations))
+    conn = export_system.pool.connection()
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO reserved_tickets (pnr, user_id, status, data) VALUES (?, 1, ?, ?)", ((f"X{i:09d}", ticket['status'], json.dumps(ticket)) for i, ticket in enumerate(tickets)))
+    conn.executemany("INSERT INTO berth_allocations (train_no, travel_class, journey_date, coach, berth_number, pnr) VALUES (?, ?, ?, ?, ?, 'X')", allocations)
+    conn.execute("COMMIT")
+    path = os.path.join(os.path.dirname(db_path), 'export.npz')
+    start = time.perf_counter()
+    analytics.export(db_path, path)
+    seconds = time.perf_counter() - start
+    exported = analytics.load(path)
+    same(analytics.report(exported, system, 10 ** 9), naive_report(tickets, allocations, system))
+    return len(tickets) / seconds
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    trains_path, stations_path = write_timetable(directory, TRAINS, STATIONS, seed=24)
+    system = RailwayReservationSystem(db_path=os.path.join(directory, 'bench.db'), trains_path=trains_path, stations_path=stations_path, snapshot_path=None)
+
+    start = time.perf_counter()
+    data = dataset(system, TICKETS)
+    print(f"{TICKETS:,} tickets, {len(data['passenger_ticket']):,} passengers, {len(data['alloc_train']):,} allocated berths over {TRAINS} trains and {DATES} dates (generated in {time.perf_counter() - start:.0f}s)")
+    start = time.perf_counter()
+    analytics.report(data, system)
+    vectorized = time.perf_counter() - start
+    print(f"  vectorized report                {vectorized:7.2f}s")
+
+    subset = head(data, NAIVE_TICKETS); del data
+    start = time.perf_counter()
+    expected = analytics.report(subset, system, 10 ** 9)
+    subset_vectorized = time.perf_counter() - start
+    tickets, allocations = rows(subset)
+    start = time.perf_counter()
+    naive = naive_report(tickets, allocations, system)
+    subset_naive = time.perf_counter() - start
+    same(expected, naive)
+    del tickets, allocations
+    print(f"  on the first {NAIVE_TICKETS:,}: vectorized {subset_vectorized:.2f}s, dict loop {subset_naive:.2f}s ({subset_naive / subset_vectorized:.0f}x), same tables")
+    print(f"  dict loop over all {TICKETS:,}, scaled from {NAIVE_TICKETS:,}  {subset_naive * TICKETS / NAIVE_TICKETS:7.2f}s ({subset_naive * TICKETS / NAIVE_TICKETS / vectorized:.0f}x the vectorized report)")
+
+    rate = export_rate(system, head(subset, EXPORT_TICKETS))
+    print(f"  export from SQLite               {rate:7.0f} tickets/s (~{TICKETS / rate:.0f}s for {TICKETS:,}), report on it matches the dict loop")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault('GOOGLE_CLIENT_ID', 'bench')
+os.environ.setdefault('GOOGLE_CLIENT_SECRET', 'bench')
+os.environ['RAILONE_DB'] = os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app, system
+
+REQUESTS = 3000
+
+
+def main():
+    client = app.test_client()
+    client.post('/signup', data={'name': 'bench', 'password': 'bench'})
+    client.post('/login', data={'name': 'bench', 'password': 'bench'})
+    for _ in range(50): client.get('/platform_ticket')
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        assert client.get('/platform_ticket').status_code == 200
+    elapsed = time.perf_counter() - start
+    print(f"GET /platform_ticket (@login_required): {REQUESTS / elapsed:.0f} req/s")
+
+    user_id = system.get_user_by_username('bench').id
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        system._user_cache.clear(); system.get_user_by_id(user_id)
+    elapsed = time.perf_counter() - start
+    print(f"get_user_by_id, uncached: {elapsed / REQUESTS * 1e6:.1f} us/call")
+
+
+if __name__ == '__main__':
+    main()
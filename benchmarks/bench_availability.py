@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault('GOOGLE_CLIENT_ID', 'bench')
+os.environ.setdefault('GOOGLE_CLIENT_SECRET', 'bench')
+
+from synthetic import write_timetable
+
+LISTING_TRAINS = 500
+
+# The app itself serves the synthetic timetable, so the listing is rendered
+# exactly as /trains renders it.
+DIRECTORY = tempfile.mkdtemp()
+os.environ['RAILONE_TRAINS'], os.environ['RAILONE_STATIONS'] = write_timetable(DIRECTORY, LISTING_TRAINS, 300, seed=3)
+os.environ['RAILONE_DB'] = os.path.join(DIRECTORY, 'bench.db')
+
+from flask import stream_template
+from app import app, buffered, listing_rows, system
+
+
+def listing():
+    train_nos = list(system.trains)
+    with app.test_request_context('/trains'):
+        start = time.perf_counter()
+        for _ in range(20):
+            system.get_availability(train_nos)
+        counts = (time.perf_counter() - start) / 20
+        start = time.perf_counter()
+        for _ in range(20):
+            size = len(''.join(buffered(stream_template('trains.html', trains=train_nos, rows=listing_rows(train_nos)))))
+        page = (time.perf_counter() - start) / 20
+    print(f"{LISTING_TRAINS}-train listing: availability {counts * 1000:.2f} ms, full render {page * 1000:.1f} ms ({size / 1e3:.0f} kB)")
+
+
+if __name__ == '__main__':
+    listing()
@@ -0,0 +1,72 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+
+PASSENGERS = 1000
+RUNS = 5
+# Four trains with a sleeper and a 3A class each, so a batch spans eight groups.
+TRAINS = {str(train_no): {'details': [f'GROUP EXPRESS {train_no}', 'NDLS', 'HWH', '10:00', '22:00'],
+                          'classes': {'SL': {'name': 'SLEEPER', 'seats': 1296}, '3A': {'name': 'THIRD AC', 'seats': 864}}}
+          for train_no in range(99990, 99994)}
+
+
+def bookings(rng, journey_date):
+    # Parties of 1-6 passengers, about one in eight a senior, PASSENGERS in all.
+    requests, remaining = [], PASSENGERS
+    while remaining:
+        size = min(rng.randint(1, 6), remaining); remaining -= size
+        passengers = [{'name': 'P', 'age': str(65 if rng.random() < 0.125 else 30), 'gender': 'F', 'preference': rng.choice(['LB', 'UB', 'ANY'])} for _ in range(size)]
+        requests.append({'train_no': rng.choice(list(TRAINS)), 'travel_class': rng.choice(['SL', '3A']), 'journey_date': journey_date, 'passengers': passengers})
+    return requests
+
+
+def new_system():
+    system = RailwayReservationSystem(db_path=os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    system.trains.update(TRAINS)
+    return system
+
+
+def one_coach(tickets):
+    return sum(len({p['coach'] for p in ticket['passengers']}) == 1 for ticket in tickets) / len(tickets)
+
+
+def main():
+    rng = random.Random(18)
+    single_times, batch_times = [], []
+    for _ in range(RUNS):
+        system = new_system()
+        journey_date = system.default_journey_date()
+        requests = bookings(rng, journey_date)
+        start = time.perf_counter()
+        singles = [system.book_ticket_logic(system._generate_pnr(), r['train_no'], r['travel_class'], r['passengers'], 1, journey_date) for r in requests]
+        single_times.append(time.perf_counter() - start)
+
+        system = new_system()
+        requests = bookings(rng, journey_date)
+        start = time.perf_counter()
+        batch = system.book_batch(requests, 1)
+        batch_times.append(time.perf_counter() - start)
+        assert all(ticket['status'] == 'BOOKED' for ticket in singles + batch)
+
+    print(f"{PASSENGERS} passengers in {len(requests)} bookings over {len(TRAINS) * 2} train/class groups:")
+    print(f"  single bookings  {min(single_times) * 1000:7.1f} ms, {one_coach(singles):.0%} of parties in one coach")
+    print(f"  one batch        {min(batch_times) * 1000:7.1f} ms, {one_coach(batch):.0%} of parties in one coach")
+
+    # A batch that cannot be seated in full books nothing.
+    free_before = sum(inventory.free_count() for inventory in system.seat_calendar._inventories.values())
+    too_many = requests + [{'train_no': '99990', 'travel_class': '3A', 'journey_date': journey_date, 'passengers': [{'name': 'P', 'age': '30', 'gender': 'M', 'preference': 'ANY'}] * 900}]
+    assert system.book_batch(too_many, 1) is None
+    assert sum(inventory.free_count() for inventory in system.seat_calendar._inventories.values()) == free_before
+    print("  an oversized batch was rejected without touching the inventory")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+
+ATTEMPTS = 50000
+# Request threads booking straight against the inventory, as without the queue.
+THREADS = 32
+TRAIN_NO, TRAVEL_CLASS = '99990', '3A'
+TRAIN = {'details': ['SURGE EXPRESS', 'NDLS', 'HWH', '10:00', '22:00'], 'classes': {TRAVEL_CLASS: {'name': 'THIRD AC', 'seats': 864}}}
+
+
+def parties(rng):
+    # Parties of 1-4 passengers, about one in eight a senior.
+    return [[{'name': 'P', 'age': str(65 if rng.random() < 0.125 else 30), 'gender': 'F', 'preference': rng.choice(['LB', 'UB', 'ANY'])}
+             for _ in range(rng.randint(1, 4))] for _ in range(ATTEMPTS)]
+
+
+def new_system():
+    system = RailwayReservationSystem(db_path=os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    system.trains[TRAIN_NO] = TRAIN
+    return system
+
+
+def direct(system, journey_date, requests):
+    # Every attempt runs its own transaction; (arrival, answered, status) each.
+    start, results = time.monotonic(), [None] * len(requests)
+    def book(i):
+        ticket = system.book_ticket_logic(system._generate_pnr(), TRAIN_NO, TRAVEL_CLASS, requests[i], i, journey_date)
+        results[i] = (start, time.monotonic(), ticket['status'] if ticket else 'FAILED')
+    with ThreadPoolExecutor(THREADS) as pool: list(pool.map(book, range(len(requests))))
+    return results
+
+
+def admitted(system, journey_date, requests):
+    # Attempts arrive in order as fast as they can be submitted; each is
+    # answered when refused on arrival or when its micro-batch is booked.
+    results, attempts = [None] * len(requests), []
+    for i, passengers in enumerate(requests):
+        attempts.append(system.request_booking(system._generate_pnr(), TRAIN_NO, TRAVEL_CLASS, passengers, i, journey_date))
+    for i, attempt in enumerate(attempts):
+        attempt.wait()
+        results[i] = (attempt.arrived, attempt.answered, attempt.status)
+    return results
+
+
+def inversions(order):
+    # Pairs out of order in a list of arrival indexes, by merge sort.
+    if len(order) < 2: return order, 0
+    left, a = inversions(order[:len(order) // 2])
+    right, b = inversions(order[len(order) // 2:])
+    merged, count, i, j = [], a + b, 0, 0
+    while i < len(left) and j < len(right):
+        if left[i] <= right[j]: merged.append(left[i]); i += 1
+        else: merged.append(right[j]); j += 1; count += len(left) - i
+    return merged + left[i:] + right[j:], count
+
+
+def p(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+
+
+def report(label, results, elapsed):
+    confirmed = [answered - arrival for arrival, answered, status in results if status in ('BOOKED', 'WAITLISTED')]
+    refused = [answered - arrival for arrival, answered, status in results if status not in ('BOOKED', 'WAITLISTED')]
+    confirmed.sort(); refused.sort()
+    # Fairness: of the attempts that were confirmed, the share of pairs whose
+    # confirmations came in a different order than their arrivals.
+    done = sorted((answered, i) for i, (_, answered, status) in enumerate(results) if status in ('BOOKED', 'WAITLISTED'))
+    _, swapped = inversions([i for _, i in done])
+    pairs = len(done) * (len(done) - 1) // 2
+    print(f"{label}: {len(results) / elapsed:,.0f} attempts/s answered, {len(confirmed)} confirmed, {len(refused)} refused; "
+          f"{swapped / max(pairs, 1):.1%} of confirmed pairs out of arrival order")
+    print(f"  confirmed p50 {p(confirmed, 0.5):8.1f} / p99 {p(confirmed, 0.99):8.1f} ms, "
+          f"refused p50 {p(refused, 0.5):8.2f} / p99 {p(refused, 0.99):8.2f} ms")
+
+
+def main():
+    requests = parties(random.Random(20))
+    print(f"{ATTEMPTS} attempts for {sum(map(len, requests))} passengers on one train's "
+          f"{TRAIN['classes'][TRAVEL_CLASS]['seats']} berths plus waitlist:")
+    for label, run in [(f'direct, {THREADS} threads', direct), ('admission queue', admitted)]:
+        system = new_system()
+        journey_date = system.default_journey_date()
+        start = time.monotonic()
+        results = run(system, journey_date, requests)
+        report(label, results, time.monotonic() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+
+WORKERS = 8
+BOOKINGS_PER_WORKER = 150
+TRAIN_NO, TRAVEL_CLASS = '12951', '3A'
+JOURNEY_DATE = (date.today() + timedelta(days=7)).isoformat()
+
+
+def worker(db_path, worker_id, barrier):
+    system = RailwayReservationSystem(db_path=db_path)
+    barrier.wait()
+    booked = 0
+    for i in range(BOOKINGS_PER_WORKER):
+        passengers = [{'name': f"W{worker_id}-{i}-{n}", 'age': 30, 'gender': 'M', 'preference': 'LB'} for n in range(2)]
+        if system.book_ticket_logic(system._generate_pnr(), TRAIN_NO, TRAVEL_CLASS, passengers, worker_id, JOURNEY_DATE): booked += 1
+    return booked
+
+
+def main():
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    RailwayReservationSystem(db_path=db_path)
+    barrier = multiprocessing.Manager().Barrier(WORKERS)
+    start = time.perf_counter()
+    with multiprocessing.Pool(WORKERS) as pool:
+        booked = sum(pool.starmap(worker, [(db_path, i, barrier) for i in range(WORKERS)]))
+    elapsed = time.perf_counter() - start
+
+    seats, waitlisted = [], 0
+    with sqlite3.connect(db_path) as conn:
+        for (data,) in conn.execute("SELECT data FROM reserved_tickets"):
+            ticket = json.loads(data)
+            if ticket['status'] == 'WAITLISTED': waitlisted += 1; continue
+            seats.extend((p['coach'], p['berth']) for p in ticket['passengers'])
+    print(f"{WORKERS} processes booked {booked} PNRs ({len(seats)} berths, {waitlisted} PNRs waitlisted) in {elapsed:.2f}s, {booked / elapsed:.0f} bookings/s")
+    duplicates = len(seats) - len(set(seats))
+    print(f"duplicate berths: {duplicates}")
+    if duplicates: sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+
+ROUNDS = 20
+
+
+def timed(label, calls):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for call in calls: call()
+    elapsed = time.perf_counter() - start
+    print(f"{label:32s} {len(calls):6d} calls x {ROUNDS}: {elapsed * 1e6 / (len(calls) * ROUNDS):6.2f} us/call")
+
+
+def main():
+    start = time.perf_counter()
+    system = RailwayReservationSystem(db_path=os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    system.get_distance('NDLS', 'HWH')
+    print(f"startup incl. distance table: {(time.perf_counter() - start) * 1000:.0f} ms")
+    codes = sorted(system._station_coordinates)
+    reserved = [(train_no, class_code, n) for train_no, train in system.trains.items() for class_code in train['classes'] for n in range(1, 7)]
+    pairs = [(a, b) for a in codes for b in codes if a != b]
+    timed('calculate_reserved_fare', [lambda t=t: system.calculate_reserved_fare(*t) for t in reserved])
+    timed('calculate_mst_fare', [lambda p=p: system.calculate_mst_fare(*p) for p in pairs])
+    timed('get_distance + unreserved fare', [lambda p=p: system.calculate_unreserved_fare('MAIL', system.get_distance(*p) or 0, 2, 1) for p in pairs])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+from station_index import train_stops
+from synthetic import write_timetable
+
+SIZES = [(1000, 500), (5000, 2500), (10000, 5000)]
+QUERIES = 2000
+
+
+def full_scan(system, source, destination):
+    # What find_trains used to cost: one pass over every train per search.
+    found = {}
+    for train_no, train_data in system.trains.items():
+        stops = train_stops(train_data)
+        if source in stops and destination in stops and stops.index(source) < stops.index(destination):
+            found[train_no] = train_data
+    return found
+
+
+def main():
+    rng = random.Random(1)
+    for num_trains, num_stations in SIZES:
+        directory = tempfile.mkdtemp()
+        trains_path, stations_path = write_timetable(directory, num_trains, num_stations, seed=num_trains)
+        system = RailwayReservationSystem(db_path=os.path.join(directory, 'bench.db'), trains_path=trains_path, stations_path=stations_path)
+        names = {code: data['name'] for code, data in system._station_coordinates.items()}
+        queries = []
+        for _ in range(QUERIES):
+            stops = train_stops(system.trains[rng.choice(list(system.trains))])
+            i, j = sorted(rng.sample(range(len(stops)), 2))
+            queries.append((stops[i], stops[j]))
+
+        start = time.perf_counter()
+        for source, destination in queries: system.find_trains(names[source], destination)
+        indexed = (time.perf_counter() - start) / QUERIES
+        start = time.perf_counter()
+        for source, destination in queries: full_scan(system, source, destination)
+        scanned = (time.perf_counter() - start) / QUERIES
+        print(f"{num_trains:6d} trains, {num_stations:5d} stations: index {indexed * 1e6:7.1f} us/search, full scan {scanned * 1e6:8.1f} us/search")
+
+
+if __name__ == '__main__':
+    main()
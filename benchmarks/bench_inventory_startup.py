@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+from seat_inventory import InventoryCalendar, BOOKING_WINDOW_DAYS
+
+
+def measure(system, copies):
+    # Touches every (train, class, date) in the booking window, the worst case
+    # for the lazily built calendar.
+    trains = {f"{train_no}-{i}": data for i in range(copies) for train_no, data in system.trains.items()}
+    seats = sum(c['seats'] for t in trains.values() for c in t['classes'].values())
+    dates = [(date.today() + timedelta(days=day)).isoformat() for day in range(BOOKING_WINDOW_DAYS + 1)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    calendar = InventoryCalendar(trains, system._build_seat_inventory, lambda *key: ())
+    for journey_date in dates:
+        for train_no, train_data in trains.items():
+            for class_code in train_data['classes']:
+                calendar.get(train_no, class_code, journey_date)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{len(trains):6d} trains, {seats:8d} seats x {len(dates)} days = {len(calendar):7d} inventories: "
+          f"{elapsed:6.2f} s, {current / 1024 / 1024:8.1f} MiB ({current / len(calendar):.0f} B each)")
+
+
+def main():
+    system = RailwayReservationSystem(db_path=os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    for copies in (1, 10):
+        measure(system, copies)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+
+BOOKINGS = 2000
+BATCH = 64
+EVENTS = 10_000_000
+CHUNK = 200_000
+# Journal trains: 50 sleeper classes over 40 dates, 2000 inventories.
+JOURNAL_TRAINS = {str(train_no): {'details': [f'JOURNAL EXPRESS {train_no}', 'NDLS', 'HWH', '10:00', '22:00'], 'classes': {'SL': {'name': 'SLEEPER', 'seats': 1296}}}
+                  for train_no in range(99000, 99050)}
+JOURNAL_DATES = [(date.today() + timedelta(days=day)).isoformat() for day in range(1, 41)]
+TRAINS = {str(train_no): {'details': [f'GROUP EXPRESS {train_no}', 'NDLS', 'HWH', '10:00', '22:00'],
+                          'classes': {'SL': {'name': 'SLEEPER', 'seats': 1296}, '3A': {'name': 'THIRD AC', 'seats': 864}}}
+          for train_no in range(99990, 99994)}
+
+
+def new_system(db_path, trains, synchronous='NORMAL'):
+    system = RailwayReservationSystem(db_path=db_path, synchronous=synchronous)
+    system.trains.update(trains)
+    return system
+
+
+def bookings(rng):
+    return [(rng.choice(list(TRAINS)), rng.choice(['SL', '3A']),
+             [{'name': 'P', 'age': '30', 'gender': 'F', 'preference': 'ANY'} for _ in range(rng.randint(1, 4))]) for _ in range(BOOKINGS)]
+
+
+def throughput(synchronous, batched):
+    # Bookings per second, one transaction each or in admission-sized micro-batches.
+    system = new_system(os.path.join(tempfile.mkdtemp(), 'bench.db'), TRAINS, synchronous)
+    journey_date, requests = system.default_journey_date(), bookings(random.Random(21))
+    start = time.perf_counter()
+    if batched:
+        groups = {}
+        for train_no, travel_class, passengers in requests: groups.setdefault((train_no, travel_class), []).append((system._generate_pnr(), passengers, 1))
+        for (train_no, travel_class), group in groups.items():
+            for i in range(0, len(group), BATCH): system.book_many(train_no, travel_class, journey_date, group[i:i + BATCH])
+    else:
+        for train_no, travel_class, passengers in requests: system.book_ticket_logic(system._generate_pnr(), train_no, travel_class, passengers, 1, journey_date)
+    return BOOKINGS / (time.perf_counter() - start)
+
+
+def write_journal(db_path):
+    # EVENTS berth events, about 70% allocations and 30% releases spread over
+    # every inventory, plus the berth_allocations they leave behind.
+    system = new_system(db_path, JOURNAL_TRAINS)
+    rng, keys = random.Random(21), [(train_no, 'SL', journey_date) for train_no in JOURNAL_TRAINS for journey_date in JOURNAL_DATES]
+    taken = {key: [] for key in keys}
+    free = {key: list(range(1296, 0, -1)) for key in keys}
+    conn = system.pool.connection()
+    for start in range(0, EVENTS, CHUNK):
+        rows = []
+        for _ in range(CHUNK):
+            key = rng.choice(keys)
+            if taken[key] and (not free[key] or rng.random() < 0.3):
+                i = rng.randrange(len(taken[key])); taken[key][i], taken[key][-1] = taken[key][-1], taken[key][i]
+                number = taken[key].pop(); free[key].append(number); action = 'RELEASE'
+            else:
+                number = free[key].pop(); taken[key].append(number); action = 'ALLOCATE'
+            rows.append(key + (f"SL{(number - 1) // 72 + 1}", (number - 1) % 72 + 1, action))
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO berth_events (train_no, travel_class, journey_date, coach, berth_number, action) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO berth_allocations (train_no, travel_class, journey_date, coach, berth_number, pnr) VALUES (?, ?, ?, ?, ?, 'JOURNAL')",
+                     (key + (f"SL{(number - 1) // 72 + 1}", (number - 1) % 72 + 1) for key, numbers in taken.items() for number in numbers))
+    conn.execute("COMMIT")
+    return keys
+
+
+def states(system, keys):
+    return {key: bytes(system.seat_calendar.get(*key)._free_bits) for key in keys}
+
+
+def main():
+    print(f"{BOOKINGS} bookings of 1-4 passengers:")
+    for synchronous in ('NORMAL', 'FULL'):
+        print(f"  synchronous={synchronous:6}  {throughput(synchronous, False):6.0f} bookings/s one transaction each, "
+              f"{throughput(synchronous, True):6.0f} bookings/s in micro-batches of {BATCH}")
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'journal.db')
+    start = time.perf_counter()
+    keys = write_journal(db_path)
+    print(f"wrote {EVENTS:,} berth events over {len(keys)} inventories in {time.perf_counter() - start:.0f}s")
+
+    # Event sourcing from scratch: every event replayed into empty inventories.
+    system = new_system(db_path, JOURNAL_TRAINS)
+    start = time.perf_counter()
+    replayed = {key: system._build_seat_inventory('SL', 1296) for key in keys}
+    for train_no, travel_class, journey_date, coach, number, action in system.pool.connection().execute(
+            "SELECT train_no, travel_class, journey_date, coach, berth_number, action FROM berth_events ORDER BY seq"):
+        inventory = replayed[(train_no, travel_class, journey_date)]
+        if action == 'ALLOCATE': inventory.claim(coach, number)
+        else: inventory.release(coach, number)
+    print(f"  full journal replay          {time.perf_counter() - start:6.2f}s")
+    replayed = {key: bytes(inventory._free_bits) for key, inventory in replayed.items()}
+
+    # Snapshot and tail: a new worker reads berth_allocations per inventory
+    # and follows the journal from its last JOURNAL_KEEP events.
+    start = time.perf_counter()
+    system = new_system(db_path, JOURNAL_TRAINS)
+    system._berth_event_seq -= system.JOURNAL_KEEP
+    with system.store.connect() as conn: system._sync_berth_inventory(conn)
+    recovered = states(system, keys)
+    print(f"  snapshot + {system.JOURNAL_KEEP:,}-event tail   {time.perf_counter() - start:6.2f}s")
+    assert recovered == replayed
+
+    # Compaction down to the tail, one COMPACT_BATCH at a time.
+    start, slowest, deleted = time.perf_counter(), 0, 0
+    while True:
+        step = time.perf_counter()
+        count = system.compact_journal()
+        slowest = max(slowest, time.perf_counter() - step)
+        if not count: break
+        deleted += count
+    print(f"  compaction of {deleted:,} events   {time.perf_counter() - start:6.2f}s, at most {slowest * 1000:.0f} ms per batch")
+
+    # A worker that fell behind the compacted journal reloads its inventories.
+    behind = new_system(db_path, JOURNAL_TRAINS)
+    states(behind, keys[:10])
+    behind._berth_event_seq = 0
+    with behind.store.connect() as conn: behind._sync_berth_inventory(conn)
+    assert states(behind, keys) == replayed
+    print("  a worker behind the compacted journal recovered the same inventories")
+
+
+if __name__ == '__main__':
+    main()
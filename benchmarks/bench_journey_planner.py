@@ -0,0 +1,43 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+from synthetic import write_timetable
+
+SIZES = [(10000, 1000), (10000, 5000)]
+QUERIES = 300
+
+
+def main():
+    rng = random.Random(7)
+    for num_trains, num_stations in SIZES:
+        directory = tempfile.mkdtemp()
+        trains_path, stations_path = write_timetable(directory, num_trains, num_stations, seed=num_stations)
+        system = RailwayReservationSystem(db_path=os.path.join(directory, 'bench.db'), trains_path=trains_path, stations_path=stations_path)
+        codes = list(system._station_coordinates)
+        start = time.perf_counter()
+        system.plan_journeys(codes[0], codes[1])
+        build = time.perf_counter() - start
+
+        timings, found = [], 0
+        for _ in range(QUERIES):
+            source, destination = rng.sample(codes, 2)
+            start = time.perf_counter()
+            journeys = system.plan_journeys(source, destination, depart_after=rng.randrange(24 * 60))
+            timings.append(time.perf_counter() - start)
+            found += bool(journeys)
+        timings.sort()
+        p50, p99 = timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+        print(f"{num_trains} trains, {num_stations} stations: build {build * 1000:.0f} ms, "
+              f"query p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms, {found}/{QUERIES} pairs connected")
+
+
+if __name__ == '__main__':
+    main()
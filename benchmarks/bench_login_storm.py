@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from loadtest import HttpClient, parse_args, prepare, start_server
+from synthetic import read_trips
+
+STORM_CLIENTS = 16
+STORM_USERS = 8
+SECONDS = 15
+# (label, RAILONE_CPU_WORKERS, RAILONE_CPU_QUEUE)
+CONFIGS = [('inline hashing', '0', '0'), ('pool, 1 worker, queue 4', '1', '4')]
+
+
+def p(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+
+
+def storm(url, users, stop, outcomes):
+    # Logs in over and over, as at Tatkal opening, counting answers by status
+    # and backing off for Retry-After when turned away.
+    client, i = HttpClient(url), 0
+    while not stop.is_set():
+        name = users[i % len(users)]; i += 1
+        client.cookies.clear()
+        status, headers, _ = client.request('POST', '/login', {'name': name, 'password': 'storm'})
+        outcomes[status] = outcomes.get(status, 0) + 1
+        if status == 503: stop.wait(int(headers['Retry-After']))
+
+
+def searches(client, source, destination, seconds):
+    timings, deadline = [], time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        status, _, _ = client.request('POST', '/reserved_booking', {'source': source, 'destination': destination})
+        timings.append(time.perf_counter() - start)
+        assert status == 200, status
+    return sorted(timings)
+
+
+def main():
+    prepare(vars(parse_args([])), tempfile.mkdtemp())
+    _, source, destination, _ = read_trips(os.environ['RAILONE_TRAINS'], os.environ['RAILONE_STATIONS'])[0]
+    for label, workers, queue in CONFIGS:
+        os.environ['RAILONE_DB'] = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        os.environ['RAILONE_CPU_WORKERS'], os.environ['RAILONE_CPU_QUEUE'] = workers, queue
+        server, url = start_server()
+        try:
+            users = [f"storm{i}" for i in range(STORM_USERS)]
+            for name in users: HttpClient(url).request('POST', '/signup', {'name': name, 'password': 'storm'})
+            searcher = HttpClient(url)
+            searcher.request('POST', '/signup', {'name': 'searcher', 'password': 'search'})
+            searcher.request('POST', '/login', {'name': 'searcher', 'password': 'search'})
+            quiet = searches(searcher, source, destination, 3)
+            stop, outcomes = threading.Event(), {}
+            threads = [threading.Thread(target=storm, args=(url, users, stop, outcomes)) for _ in range(STORM_CLIENTS)]
+            for thread in threads: thread.start()
+            try: loaded = searches(searcher, source, destination, SECONDS)
+            finally:
+                stop.set()
+                for thread in threads: thread.join()
+        finally:
+            server.terminate(); server.wait()
+        print(f"{label}: /reserved_booking p50 {p(quiet, 0.5):.1f} / p99 {p(quiet, 0.99):.1f} ms quiet, "
+              f"p50 {p(loaded, 0.5):.1f} / p99 {p(loaded, 0.99):.1f} ms during a {STORM_CLIENTS}-client login storm; "
+              f"logins {outcomes.get(302, 0) / SECONDS:.1f}/s, {outcomes.get(503, 0) / SECONDS:.1f}/s turned away with 503")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault('GOOGLE_CLIENT_ID', 'bench')
+os.environ.setdefault('GOOGLE_CLIENT_SECRET', 'bench')
+os.environ['RAILONE_DB'] = os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app, system, qr_cache
+
+TICKETS = 300
+ROUNDS = 5
+
+
+def throughput(label, client, urls, headers=None, status=200):
+    start = time.perf_counter()
+    for url in urls:
+        assert client.get(url, headers=headers or {}).status_code == status
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {len(urls) / elapsed:7.0f} req/s")
+
+
+def main():
+    client = app.test_client()
+    client.post('/signup', data={'name': 'bench', 'password': 'bench'})
+    client.post('/login', data={'name': 'bench', 'password': 'bench'})
+    passengers = [{'name': 'P', 'age': 30, 'gender': 'M', 'preference': 'ANY'}]
+    pnrs = [system._generate_pnr() for _ in range(TICKETS)]
+    for pnr in pnrs: system.book_ticket_logic(pnr, '12951', '3A', passengers, 1)
+    urls = [f"/qr_code/reserved/{pnr}" for pnr in pnrs]
+
+    throughput("cold cache (encode every QR)", client, urls)
+    throughput("warm cache                  ", client, urls * ROUNDS)
+    etag = client.get(urls[0]).headers['ETag']
+    throughput("conditional GET, 304        ", client, [urls[0]] * len(urls) * ROUNDS, {'If-None-Match': etag}, 304)
+    print(f"cache: {len(qr_cache)} images, {qr_cache.hits} hits, {qr_cache.misses} misses")
+
+    client.post('/cancel', data={'pnr': pnrs[0]})
+    if any(key[1] == pnrs[0] for key in qr_cache._images):
+        print("cancelled ticket still cached"); sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
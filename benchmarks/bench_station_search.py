@@ -0,0 +1,58 @@
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from station_index import StationSearch
+
+STATIONS = 8000
+TYPED_NAMES = 2000
+SYLLABLES = ['ra', 'ma', 'pur', 'ga', 'nag', 'bad', 'ka', 'li', 'shi', 'van', 'dha', 'gar', 'hal', 'ko', 'ta', 'bar', 'del', 'sa', 'tir', 'u']
+SUFFIXES = ['', '', '', ' Junction', ' Central', ' Road', ' Cantt', ' City', ' Nagar', ' Town']
+
+
+def station_master(rng):
+    # ~8,000 pronounceable station names with Zipf-like train counts.
+    stations, importance = {}, {}
+    for i in range(STATIONS):
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize() + rng.choice(SUFFIXES)
+        code = f"{name[:3].upper()}{i}"
+        stations[code] = {'name': name, 'lat': 0.0, 'lon': 0.0}
+        importance[code] = int(1000 / (i + 1) ** 0.8)
+    return stations, importance
+
+
+def typo(rng, word):
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice('abcdefghijklmnopqrstuvwxyz') + word[i + 1:]
+
+
+def main():
+    rng = random.Random(4)
+    stations, importance = station_master(rng)
+    start = time.perf_counter()
+    search = StationSearch(stations, importance)
+    print(f"index over {STATIONS} stations ({len(search.keys)} keys) built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    keystrokes = []
+    for code in rng.sample(list(stations), TYPED_NAMES):
+        name = stations[code]['name'].lower()
+        if rng.random() < 0.2: name = typo(rng, name)
+        keystrokes.extend(name[:length] for length in range(1, len(name) + 1))
+    timings, found = [], 0
+    for query in keystrokes:
+        t = time.perf_counter()
+        results = search.search(query)
+        timings.append(time.perf_counter() - t)
+        found += bool(results)
+    timings.sort()
+    print(f"{len(keystrokes)} keystrokes: p50 {timings[len(timings) // 2] * 1e6:.0f} us, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us, max {timings[-1] * 1e6:.0f} us, {found / len(keystrokes):.1%} with results")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from loadtest import parse_args, prepare
+
+TICKETS = 5000
+SMALL = 500
+
+
+def rss():
+    # (current, peak) resident set size in MB, from /proc.
+    with open('/proc/self/status') as status:
+        fields = dict(line.split(':', 1) for line in status)
+    return int(fields['VmRSS'].split()[0]) / 1024, int(fields['VmHWM'].split()[0]) / 1024
+
+
+def client():
+    import app as appmod
+    c = appmod.app.test_client()
+    c.post('/signup', data={'name': 'organiser', 'password': 'group'})
+    c.post('/login', data={'name': 'organiser', 'password': 'group'})
+    with c.session_transaction() as session: user_id = int(session['_user_id'])
+    return appmod, c, user_id
+
+
+def seed(tickets):
+    # One real booking for the organiser, copied to tickets PNRs.
+    appmod, _, user_id = client()
+    system = appmod.system
+    train_no = next(iter(system.trains)); class_code = next(iter(system.trains[train_no]['classes']))
+    passengers = [{'name': f'P{i}', 'age': str(25 + 10 * i), 'gender': 'F', 'preference': 'ANY'} for i in range(4)]
+    ticket = system.book_ticket_logic(system._generate_pnr(), train_no, class_code, passengers, user_id, system.default_journey_date())
+    with system.store.transaction() as conn:
+        for i in range(tickets - 1):
+            pnr = f"G{i:09d}"; system.booked_tickets.put(pnr, dict(ticket, pnr=pnr), conn=conn)
+
+
+def stream(limit):
+    # The export endpoint, read a chunk at a time as a client would.
+    _, c, _ = client()
+    ids = None if limit == TICKETS else {'id': [f"G{i:09d}" for i in range(limit)]}
+    before = rss()[0]
+    start = time.perf_counter()
+    response = c.post('/tickets/export/reserved.zip', data=ids, buffered=False) if ids else c.get('/tickets/export/reserved.zip', buffered=False)
+    size = sum(len(chunk) for chunk in response.response); response.close()
+    report('streamed', limit, time.perf_counter() - start, size, rss()[1] - before)
+
+
+def in_memory(limit):
+    # The same archive assembled in memory first: every page and QR code,
+    # one at a time, then the ZIP, then the response.
+    from qr_cache import render_png
+    appmod, c, user_id = client()
+    table, template = appmod.PRINTABLE_TICKETS['reserved']
+    before = rss()[0]
+    start = time.perf_counter()
+    with appmod.app.test_request_context():
+        tickets = list(table.iter_for_user(user_id))[:limit]
+        pages = [(ticket['pnr'], appmod.render_template(template, ticket=ticket, qr_src=f"{ticket['pnr']}.png"),
+                  appmod.cpu_pool.run(render_png, appmod.qr_payload('reserved', ticket))) for ticket in tickets]
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for pnr, page, png in pages: archive.writestr(f"{pnr}.html", page); archive.writestr(f"{pnr}.png", png, zipfile.ZIP_STORED)
+        size = len(buffer.getvalue())
+    report('in memory', limit, time.perf_counter() - start, size, rss()[1] - before)
+
+
+def report(label, tickets, seconds, size, peak):
+    print(f"  {label:9}  {tickets:5} tickets  {tickets / seconds:6.0f} tickets/s  {size / 1e6:5.1f} MB archive  peak RSS +{peak:6.1f} MB", flush=True)
+
+
+def main():
+    if len(sys.argv) > 1:
+        return {'seed': seed, 'stream': stream, 'memory': in_memory}[sys.argv[1]](int(sys.argv[2]))
+    prepare(vars(parse_args([])), tempfile.mkdtemp())
+    subprocess.run([sys.executable, os.path.abspath(__file__), 'seed', str(TICKETS)], check=True)
+    print(f"ZIP export of printable reserved tickets with QR codes ({os.getenv('RAILONE_CPU_WORKERS', 0)} CPU workers, {os.cpu_count()} cores):")
+    # Each run in a new process, so peaks are not carried over and the QR cache starts empty.
+    for mode in ('stream', 'memory'):
+        for tickets in (SMALL, TICKETS):
+            subprocess.run([sys.executable, os.path.abspath(__file__), mode, str(tickets)], check=True)
+
+
+if __name__ == '__main__':
+    main()
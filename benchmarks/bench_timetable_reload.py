@@ -0,0 +1,77 @@
+import csv
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+from synthetic import write_timetable
+
+TRAINS = 10000
+STATIONS = 2000
+RUNS = 5
+
+
+def rewrite(path, change):
+    # Rewrites a CSV with change(row) applied to every row.
+    with open(path, newline='', encoding='utf-8') as file:
+        reader = csv.DictReader(file); fields, rows = reader.fieldnames, list(reader)
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fields); writer.writeheader(); writer.writerows(map(change, rows))
+
+
+def passengers(count):
+    return [{'name': 'P', 'age': '30', 'gender': 'F', 'preference': 'ANY'} for _ in range(count)]
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    trains_path, stations_path = write_timetable(directory, TRAINS, STATIONS, seed=23)
+    system = RailwayReservationSystem(db_path=os.path.join(directory, 'bench.db'), trains_path=trains_path, stations_path=stations_path, snapshot_path=None)
+    journey_date = system.default_journey_date()
+    resized, kept = list(system.trains)[:2]
+    resized_class, kept_class = next(iter(system.trains[resized]['classes'])), next(iter(system.trains[kept]['classes']))
+    for train_no, class_code in ((resized, resized_class), (kept, kept_class)):
+        assert system.book_ticket_logic(system._generate_pnr(), train_no, class_code, passengers(4), 1, journey_date)['status'] == 'BOOKED'
+    kept_inventory = system.seat_calendar.get(kept, kept_class, journey_date)
+
+    one_train, full = [], []
+    for run in range(RUNS):
+        # Each run resizes one class of one train by a berth, alternately up and down.
+        delta = 1 if run % 2 == 0 else -1
+        rewrite(trains_path, lambda row: dict(row, seats=str(int(row['seats']) + delta)) if (row['train_no'], row['class_code']) == (resized, resized_class) else row)
+        start = time.perf_counter()
+        changes = system.reload_timetable()
+        one_train.append(time.perf_counter() - start)
+        assert changes == {'added': 0, 'removed': 0, 'changed': 1, 'stations_changed': False}, changes
+        start = time.perf_counter()
+        RailwayReservationSystem.build_timetable(trains_path, stations_path)
+        full.append(time.perf_counter() - start)
+
+    # Allocations survive: the untouched class keeps its inventory, the
+    # resized one is rebuilt at its new size with its booked berths.
+    assert system.seat_calendar.get(kept, kept_class, journey_date) is kept_inventory
+    inventory = system.seat_calendar.get(resized, resized_class, journey_date)
+    assert inventory.seats == system.trains[resized]['classes'][resized_class]['seats'] and inventory.free_count() == inventory.seats - 4
+    assert set(system.find_trains(system.trains[resized]['details'][1], system.trains[resized]['details'][2])) >= {resized}
+
+    rewrite(stations_path, lambda row: dict(row, latitude=str(float(row['latitude']) + 0.001)) if row is not None else row)
+    start = time.perf_counter()
+    changes = system.reload_timetable()
+    stations = time.perf_counter() - start
+    assert changes['stations_changed'] and not changes['changed']
+
+    print(f"{TRAINS} trains, {STATIONS} stations:")
+    print(f"  reload after one class is resized   {min(one_train) * 1000:7.1f} ms")
+    print(f"  full rebuild of the timetable       {min(full) * 1000:7.1f} ms")
+    print(f"  reload after a station file change  {stations * 1000:7.1f} ms (indexes rebuilt in full)")
+    print("  booked berths kept in both the resized and the untouched class")
+
+
+if __name__ == '__main__':
+    main()
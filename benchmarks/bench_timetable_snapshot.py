@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from synthetic import write_timetable
+from timetable_snapshot import main as compile_snapshot
+
+# 100x the shipped 79-train timetable.
+TRAINS, STATIONS = 7900, 8000
+RUNS = 3
+
+# Run in a fresh interpreter per sample: construct the system and serve the
+# first search, then report wall time (also without imports) and peak RSS.
+CHILD = '''
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from reservation_system import RailwayReservationSystem
+imported = time.perf_counter()
+system = RailwayReservationSystem(db_path={db!r}, trains_path={trains!r}, stations_path={stations!r}, snapshot_path={snapshot!r})
+system.find_trains('S00001', 'S00002'); system.station_search.search('stat')
+elapsed, loaded = time.perf_counter() - start, time.perf_counter() - imported
+# VmHWM, unlike ru_maxrss, is not inherited from the forking parent.
+print(elapsed, loaded, [line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM')][0])
+'''
+
+
+def sample(directory, trains_path, stations_path, snapshot_path):
+    code = CHILD.format(root=ROOT, db=os.path.join(directory, 'bench.db'), trains=trains_path, stations=stations_path, snapshot=snapshot_path)
+    runs = [subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split() for _ in range(RUNS)]
+    return min(float(total) for total, _, _ in runs), min(float(load) for _, load, _ in runs), min(int(rss) for _, _, rss in runs) / 1024
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    trains_path, stations_path = write_timetable(directory, TRAINS, STATIONS, seed=15)
+    snapshot_path = os.path.join(directory, 'timetable.snapshot')
+    compile_snapshot([trains_path, stations_path, snapshot_path])
+    for label, path in (('CSV parse', None), ('snapshot ', snapshot_path)):
+        total, load, rss = sample(directory, trains_path, stations_path, path)
+        print(f"{label}: time to first search {total * 1000:5.0f} ms (timetable load + search {load * 1000:5.0f} ms), peak RSS {rss:6.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
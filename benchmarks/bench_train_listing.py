@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from loadtest import parse_args, prepare
+
+TRAINS = 10000
+STATIONS = 2000
+
+
+def client():
+    import app as appmod
+    c = appmod.app.test_client()
+    c.post('/signup', data={'name': 'lister', 'password': 'list'})
+    c.post('/login', data={'name': 'lister', 'password': 'list'})
+    return c
+
+
+def fetch(c, path):
+    # (seconds to the first body chunk, seconds to the last, bytes).
+    start = time.perf_counter()
+    response = c.get(path, buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks, b''); ttfb = time.perf_counter() - start
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    response.close()
+    return ttfb, time.perf_counter() - start, size
+
+
+def timing():
+    c = client()
+    for label in ('cold', 'warm'):
+        ttfb, total, size = fetch(c, '/trains')
+        print(f"  /trains {label}: first byte {ttfb * 1000:7.1f} ms, whole page {total * 1000:7.1f} ms, {size / 1e6:.1f} MB")
+    if c.get('/api/trains').status_code == 200:
+        _, total, _ = fetch(c, '/api/trains?page=100&per_page=50')
+        _, filtered, _ = fetch(c, '/api/trains?class=1A&depart_after=06:00&depart_before=09:00&per_page=50')
+        print(f"  /api/trains: page 100 of 50 in {total * 1000:.1f} ms, first page of a class and window filter in {filtered * 1000:.1f} ms")
+
+
+def memory():
+    # Peak Python allocations over a cold request, from before it starts.
+    c = client()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fetch(c, '/trains')
+    print(f"  /trains cold: peak {(tracemalloc.get_traced_memory()[1] - before) / 1e6:.1f} MB allocated")
+
+
+def main():
+    if len(sys.argv) > 1:
+        return {'timing': timing, 'memory': memory}[sys.argv[1]]()
+    prepare(vars(parse_args(['--trains', str(TRAINS), '--stations', str(STATIONS)])), tempfile.mkdtemp())
+    print(f"full timetable listing of {TRAINS} trains:")
+    # Each in a new process, so neither sees the other's loaded timetable or inventories.
+    for mode in ('timing', 'memory'):
+        subprocess.run([sys.executable, os.path.abspath(__file__), mode], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from ticket_store import TicketStore
+
+TICKETS = 1_000_000
+USERS = 100_000
+LOOKUPS = 2000
+PAGE_SIZE = 20
+
+
+def fill(store, rng):
+    now = datetime.now()
+    start = time.perf_counter()
+    with store.transaction() as conn:
+        for i in range(TICKETS):
+            journey = now + timedelta(days=rng.randint(-60, 120))
+            booked = journey - timedelta(days=rng.randint(0, 60))
+            store.reserved.put(f"PNR{i:07d}", {
+                'pnr': f"PNR{i:07d}", 'user_id': rng.randrange(USERS), 'train_no': '12951', 'train_name': 'MUMBAI RAJDHANI',
+                'source': 'MMCT', 'destination': 'NDLS', 'departure': f"{rng.randrange(24):02d}:{rng.randrange(60):02d}", 'arrival': '08:32',
+                'travel_class': '3A - THIRD AC', 'passengers': [{'name': 'P', 'age': 30, 'gender': 'M', 'coach': 'B1', 'berth': '1LB'}],
+                'status': rng.choice(['BOOKED', 'BOOKED', 'BOOKED', 'CANCELLED']),
+                'booking_date': booked.strftime("%Y-%m-%d %H:%M:%S"), 'journey_date': journey.strftime("%Y-%m-%d"),
+            }, conn=conn)
+    print(f"inserted {TICKETS} tickets for {USERS} users in {time.perf_counter() - start:.1f}s")
+
+
+def timed(label, fn, users):
+    timings = []
+    for user_id in users:
+        start = time.perf_counter()
+        fn(user_id)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{label}: p50 {timings[len(timings) // 2] * 1e6:8.1f} us, p99 {timings[int(len(timings) * 0.99)] * 1e6:8.1f} us")
+
+
+def full_scan(store, user_id, now):
+    # What the landing page did before: parse and sort every booked ticket.
+    candidates = []
+    for _, ticket in store.reserved.items():
+        if ticket.get('user_id') == user_id and ticket.get('status') == 'BOOKED':
+            journey = datetime.strptime(f"{ticket['journey_date']} {ticket['departure']}", "%Y-%m-%d %H:%M")
+            if journey > now: candidates.append((journey, ticket['pnr']))
+    candidates.sort()
+    return candidates[0][1] if candidates else None
+
+
+def main():
+    rng = random.Random(1)
+    store = TicketStore(os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    fill(store, rng)
+    now = datetime.now()
+    after = now.strftime("%Y-%m-%d %H:%M")
+    users = [rng.randrange(USERS) for _ in range(LOOKUPS)]
+    timed("upcoming trip (index)", lambda user_id: store.reserved.next_journey(user_id, after), users)
+    timed("my bookings page 1  ", lambda user_id: store.reserved.for_user(user_id, PAGE_SIZE), users)
+    start = time.perf_counter()
+    expected = full_scan(store, users[0], now)
+    print(f"upcoming trip (full scan, old): {time.perf_counter() - start:.2f} s")
+    upcoming = store.reserved.next_journey(users[0], after)
+    if (upcoming and upcoming['pnr']) != expected:
+        print(f"mismatch for user {users[0]}: {upcoming and upcoming['pnr']} != {expected}"); sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+
+SEATS = 2000
+WAITLISTED_PNRS = 3000
+CANCELLATIONS = 1000
+TRAIN_NO, TRAVEL_CLASS = '99999', '3A'
+
+
+def passengers(rng):
+    return [{'name': 'P', 'age': 65 if rng.random() < 0.15 else 30, 'gender': 'M', 'preference': rng.choice(['LB', 'UB', 'ANY'])} for _ in range(rng.randint(1, 3))]
+
+
+def main():
+    rng = random.Random(11)
+    system = RailwayReservationSystem(db_path=os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    system.WAITLIST_SHARE = 10
+    system.trains[TRAIN_NO] = {'details': ['BENCH EXPRESS', 'NDLS', 'HWH', '10:00', '22:00'], 'classes': {TRAVEL_CLASS: {'name': 'THIRD AC', 'seats': SEATS}}}
+    journey_date = system.default_journey_date()
+
+    confirmed, waitlisted = [], []
+    while len(waitlisted) < WAITLISTED_PNRS:
+        pnr = system._generate_pnr()
+        ticket = system.book_ticket_logic(pnr, TRAIN_NO, TRAVEL_CLASS, passengers(rng), 1, journey_date)
+        (waitlisted if ticket['status'] == 'WAITLISTED' else confirmed).append(pnr)
+    queued = system.store.waitlisted_passengers(TRAIN_NO, TRAVEL_CLASS, journey_date)
+    print(f"{len(confirmed)} PNRs confirmed, {len(waitlisted)} PNRs ({queued} passengers) waitlisted")
+
+    timings = []
+    for pnr in rng.sample(confirmed, CANCELLATIONS):
+        start = time.perf_counter()
+        system.cancel_ticket(pnr)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{CANCELLATIONS} cancellations with promotion: total {sum(timings):.2f}s, "
+          f"p50 {timings[len(timings) // 2] * 1000:.2f} ms, p99 {timings[int(len(timings) * 0.99)] * 1000:.2f} ms")
+
+    tickets = [system.booked_tickets.get(pnr) for pnr in waitlisted]
+    promoted = sum(ticket['status'] == 'BOOKED' for ticket in tickets)
+    last = max((i for i, ticket in enumerate(tickets) if ticket['status'] == 'BOOKED'), default=-1)
+    # Parties passed over because the free berths could not seat them, e.g. seniors with no lower berth left.
+    skipped = sum(ticket['status'] == 'WAITLISTED' for ticket in tickets[:last])
+    print(f"promoted {promoted} PNRs, {skipped} passed over, "
+          f"free berths left: {system.seat_calendar.get(TRAIN_NO, TRAVEL_CLASS, journey_date).free_count()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+import argparse
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault('GOOGLE_CLIENT_ID', 'loadtest')
+os.environ.setdefault('GOOGLE_CLIENT_SECRET', 'loadtest')
+
+from synthetic import read_trips, synthetic_users, write_timetable
+
+# Load test for the booking flows. Every virtual user signs up and logs in
+# (or logs in through a local Google OAuth stub), searches, books a reserved
+# ticket through passenger details and payment, checks its PNR and QR code,
+# cancels some of them, buys unreserved, platform and MST tickets and opens
+# My Bookings. Prints throughput and p50/p95/p99 per route as JSON and fails
+# when they regress against loadtest_baseline.json.
+#
+#   python benchmarks/loadtest.py                        in process, through Flask's test client
+#   python benchmarks/loadtest.py --http --processes 4   over HTTP, against a local stubbed server
+#   python benchmarks/loadtest.py --serve 5000           run only that server, e.g. on another host
+#   python benchmarks/loadtest.py --url http://host:5000 against a running server; pass
+#                                                        --google-share 0 unless it is --serve
+#   python benchmarks/loadtest.py --save-baseline        record this machine's baseline
+#
+# The synthetic timetable and users depend only on the seed and sizes, so a
+# --serve and a --url run with the same options agree on trains and stations.
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'loadtest_baseline.json')
+PERCENTILES = (50, 95, 99)
+WARMUP_USERS = 3
+# A p95 must grow by the tolerance and by at least this much to count.
+MIN_REGRESSION_MS = 1.0
+TRAIN_TYPES = ['MAIL', 'ORDINARY', 'SUPERFAST']
+
+
+class StubFlow:
+    # Stands in for google_auth_oauthlib's Flow: authorization sends the
+    # browser straight back to /google-callback, and the code it comes back
+    # with is used as the Google account id.
+
+    def __init__(self):
+        self.redirect_uri = None
+        self.credentials = None
+
+    @classmethod
+    def from_client_config(cls, client_config, scopes):
+        return cls()
+
+    def authorization_url(self, **kwargs):
+        state = os.urandom(8).hex()
+        return f"{self.redirect_uri}?state={state}", state
+
+    def fetch_token(self, authorization_response):
+        self.credentials = SimpleNamespace(id_token=parse_qs(urlsplit(authorization_response).query)['code'][0])
+
+
+def install_google_stub(appmod):
+    appmod.Flow = StubFlow
+    appmod.GoogleRequest = lambda: None
+    appmod.id_token = SimpleNamespace(verify_oauth2_token=lambda token, request, client_id: {'sub': token, 'name': token, 'email': f"{token}@example.com"})
+
+
+class TestClient:
+    # The app in this process, through Flask's test client.
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, headers=None):
+        response = self.client.open(path, method=method, data=data, headers=headers)
+        return response.status_code, response.headers, response.data
+
+
+class HttpClient:
+    # One keep-alive connection and cookie jar per virtual user; redirects
+    # are not followed, so each hop is timed as its own route.
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = None
+        self.cookies = {}
+
+    def request(self, method, path, data=None, headers=None):
+        headers = dict(headers or {})
+        body = None if data is None else urlencode(data)
+        if body is not None: headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies: headers['Cookie'] = '; '.join(f"{name}={value}" for name, value in self.cookies.items())
+        reused = self.connection is not None
+        if not reused: self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse(); payload = response.read()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            self.connection.close(); self.connection = None
+            # Only a request on a connection the server had already closed is retried.
+            if reused: return self.request(method, path, data, headers)
+            raise
+        for cookie in response.headers.get_all('Set-Cookie') or []:
+            name, _, value = cookie.split(';', 1)[0].partition('=')
+            self.cookies[name.strip()] = value
+        if response.will_close: self.connection.close(); self.connection = None
+        return response.status, response.headers, payload
+
+
+class Failed(Exception):
+    pass
+
+
+class VirtualUser:
+
+    def __init__(self, client, user, trip, journey_date, google, cancel, rng, timings, errors):
+        self.client = client
+        self.user = user
+        self.trip = trip
+        self.journey_date = journey_date
+        self.google = google
+        self.cancel = cancel
+        self.rng = rng
+        self.timings = timings
+        self.errors = errors
+
+    def call(self, route, method, path, data=None, expect=(200,), headers=None):
+        start = time.perf_counter()
+        status, response_headers, _ = self.client.request(method, path, data, headers)
+        self.timings.setdefault(route, []).append(time.perf_counter() - start)
+        if status not in expect: self.errors[route] += 1; raise Failed(f"{route} answered {status}")
+        return response_headers
+
+    def follow(self, route, method, path, data, prefix):
+        # Redirect target of a form post, which must start with prefix.
+        parts = urlsplit(self.call(route, method, path, data, expect=(302,))['Location'])
+        location = parts.path + (f"?{parts.query}" if parts.query else '')
+        if not location.startswith(prefix): self.errors[route] += 1; raise Failed(f"{route} redirected to {location}")
+        return location
+
+    def run(self):
+        if self.google:
+            callback = self.follow('GET /google-login', 'GET', '/google-login', None, '/google-callback')
+            self.follow('GET /google-callback', 'GET', f"{callback}&code={self.user['google_sub']}", None, '/')
+        else:
+            credentials = {'name': self.user['name'], 'password': self.user['password']}
+            self.follow('POST /signup', 'POST', '/signup', credentials, '/login')
+            self.follow('POST /login', 'POST', '/login', credentials, '/')
+        self.call('GET /', 'GET', '/')
+        pnr = self.book_reserved()
+        self.follow('POST /check_pnr', 'POST', '/check_pnr', {'pnr': pnr}, '/ticket/')
+        etag = self.call('GET /qr_code/<ticket_type>/<ticket_id>', 'GET', f"/qr_code/reserved/{pnr}")['ETag']
+        self.call('GET /qr_code/<ticket_type>/<ticket_id> (304)', 'GET', f"/qr_code/reserved/{pnr}", headers={'If-None-Match': etag}, expect=(304,))
+        if self.cancel: self.follow('POST /cancel', 'POST', '/cancel', {'pnr': pnr}, '/ticket/')
+        self.buy_unreserved(); self.buy_platform(); self.buy_mst()
+        self.call('GET /my_bookings', 'GET', '/my_bookings')
+
+    def book_reserved(self):
+        train_no, source, destination, classes = self.trip
+        self.call('POST /reserved_booking', 'POST', '/reserved_booking', {'source': source, 'destination': destination})
+        self.call('GET /book/details/<train_no>', 'GET', f"/book/details/{train_no}?journey_date={self.journey_date}")
+        form = {'travel_class': self.rng.choice(classes), 'journey_date': self.journey_date}
+        for i, passenger in enumerate(self.user['passengers']): form.update({f"{field}_{i}": value for field, value in passenger.items()})
+        payment = self.follow('POST /book/details/<train_no>', 'POST', f"/book/details/{train_no}", form, '/payment/reserved/')
+        ticket = self.pay('reserved', payment, '/ticket/')
+        self.call('GET /ticket/<pnr>', 'GET', ticket)
+        return ticket.rsplit('/', 1)[1]
+
+    def buy_unreserved(self):
+        _, source, destination, _ = self.trip
+        booking = self.follow('POST /unreserved_ticket', 'POST', '/unreserved_ticket', {'source_station': source, 'dest_station': destination}, '/unreserved_ticket/book')
+        form = {'train_type': self.rng.choice(TRAIN_TYPES), 'num_adults': self.rng.randint(1, 4), 'num_children': self.rng.randint(0, 2)}
+        payment = self.follow('POST /unreserved_ticket/book', 'POST', booking, form, '/payment/unreserved/')
+        self.call('GET /unreserved_ticket/view/<ticket_id>', 'GET', self.pay('unreserved', payment, '/unreserved_ticket/view/'))
+
+    def buy_platform(self):
+        form = {'station_name': self.trip[1], 'num_persons': self.rng.randint(1, 5)}
+        payment = self.follow('POST /platform_ticket', 'POST', '/platform_ticket', form, '/payment/platform/')
+        self.call('GET /platform_ticket/view/<ticket_id>', 'GET', self.pay('platform', payment, '/platform_ticket/view/'))
+
+    def buy_mst(self):
+        passenger = self.user['passengers'][0]
+        form = {'source_station': self.trip[1], 'dest_station': self.trip[2], 'passenger_name': passenger['name'], 'passenger_age': passenger['age'], 'phone_number': f"9{self.rng.randrange(10 ** 9):09d}"}
+        payment = self.follow('POST /mst_booking', 'POST', '/mst_booking', form, '/payment/mst/')
+        self.call('GET /mst_ticket/view/<ticket_id>', 'GET', self.pay('mst', payment, '/mst_ticket/view/'))
+
+    def pay(self, ticket_type, payment, prefix):
+        self.call(f"GET /payment/{ticket_type}/<temp_id>", 'GET', payment)
+        return self.follow(f"POST /payment/{ticket_type}/<temp_id>", 'POST', payment, {}, prefix)
+
+
+def run_worker(options, warmup, users):
+    # Runs this worker's users one after another (after a few unrecorded
+    # warmup users) and returns (started, finished, timings, errors).
+    if options['url']:
+        new_client = lambda: HttpClient(options['url'])
+    else:
+        import app as appmod
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        install_google_stub(appmod)
+        new_client = lambda: TestClient(appmod.app)
+    timings, errors = {}, Counter()
+    for share, recorded in ((warmup, False), (users, True)):
+        if recorded: timings, errors, started = {}, Counter(), time.time()
+        for user, trip, journey_date, google, cancel, seed in share:
+            try: VirtualUser(new_client(), user, trip, journey_date, google, cancel, random.Random(seed), timings, errors).run()
+            except Failed: pass
+            except (OSError, http.client.HTTPException): errors['connection'] += 1
+    return started, time.time(), timings, errors
+
+
+def plan(options):
+    # (user, trip, journey date, Google login?, cancel?, seed) for every
+    # virtual user, warmups first; the same for the same options.
+    rng = random.Random(options['seed'])
+    trips = read_trips(os.environ['RAILONE_TRAINS'], os.environ['RAILONE_STATIONS'])
+    today = date.today()
+    return [(user, rng.choice(trips), (today + timedelta(days=rng.randint(1, 30))).isoformat(), rng.random() < options['google_share'], rng.random() < options['cancel_share'], rng.getrandbits(32))
+            for user in synthetic_users(options['users'] + WARMUP_USERS * options['processes'], options['seed'])]
+
+
+def prepare(options, directory):
+    # Points the app at a fresh database and the synthetic (or shipped) timetable.
+    os.environ['RAILONE_DB'] = os.path.join(directory, 'loadtest.db')
+    if options['trains']:
+        os.environ['RAILONE_TRAINS'], os.environ['RAILONE_STATIONS'] = write_timetable(directory, options['trains'], options['stations'], seed=options['seed'])
+    else:
+        os.environ['RAILONE_TRAINS'], os.environ['RAILONE_STATIONS'] = os.path.join(ROOT, 'trains.csv'), os.path.join(ROOT, 'station_coordinates.csv')
+
+
+def serve(port):
+    import app as appmod
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    install_google_stub(appmod)
+    appmod.app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+def start_server():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0)); port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port), '--no-prepare'])
+    while True:
+        if server.poll() is not None: raise RuntimeError(f"load-test server exited with {server.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server, f"http://127.0.0.1:{port}"
+        except OSError: time.sleep(0.1)
+
+
+def percentile(samples, p):
+    # Nearest-rank percentile of sorted samples.
+    return samples[max(0, -(-len(samples) * p // 100) - 1)]
+
+
+def summarize(options, started, finished, timings, errors):
+    elapsed = finished - started
+    routes = {}
+    for route, samples in sorted(timings.items()):
+        samples.sort()
+        routes[route] = {'requests': len(samples), 'errors': errors.get(route, 0), 'per_second': round(len(samples) / elapsed, 1),
+                         **{f"p{p}_ms": round(percentile(samples, p) * 1000, 3) for p in PERCENTILES}}
+    requests = sum(len(samples) for samples in timings.values())
+    config = {name: options[name] for name in ('mode', 'users', 'processes', 'seed', 'trains', 'stations', 'google_share', 'cancel_share')}
+    return {'config': config, 'python': platform.python_version(), 'elapsed_s': round(elapsed, 3), 'requests': requests,
+            'errors': sum(errors.values()), 'per_second': round(requests / elapsed, 1), 'routes': routes}
+
+
+def compare(result, baseline, tolerance):
+    # Regressions of result against baseline: a p95 or the overall
+    # throughput worse by more than tolerance, or more errors.
+    regressions = []
+    for route, now in result['routes'].items():
+        then = baseline['routes'].get(route)
+        if then and now['p95_ms'] > then['p95_ms'] * (1 + tolerance) and now['p95_ms'] - then['p95_ms'] >= MIN_REGRESSION_MS:
+            regressions.append(f"{route}: p95 {then['p95_ms']} -> {now['p95_ms']} ms")
+    if result['per_second'] < baseline['per_second'] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['per_second']} -> {result['per_second']} req/s")
+    if result['errors'] > baseline['errors']:
+        regressions.append(f"errors {baseline['errors']} -> {result['errors']}")
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Load test for the Rail One booking flows.')
+    parser.add_argument('--users', type=int, default=200, help='virtual users, each running the whole flow once')
+    parser.add_argument('--processes', type=int, default=1, help='load-generator processes, each running its users one at a time')
+    parser.add_argument('--seed', type=int, default=17)
+    parser.add_argument('--trains', type=int, default=200, help='synthetic trains; 0 uses the shipped timetable')
+    parser.add_argument('--stations', type=int, default=300, help='synthetic stations')
+    parser.add_argument('--google-share', type=float, default=0.2, help='share of users logging in through the Google stub')
+    parser.add_argument('--cancel-share', type=float, default=0.3, help='share of reserved tickets cancelled')
+    parser.add_argument('--http', action='store_true', help='start a local stubbed server and load it over HTTP')
+    parser.add_argument('--url', help='load a running server over HTTP')
+    parser.add_argument('--serve', type=int, metavar='PORT', help='only run the stubbed server')
+    parser.add_argument('--no-prepare', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='also write the JSON report here')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='write this run to --baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    options = vars(args)
+    directory = tempfile.mkdtemp(prefix='railone-loadtest-')
+    if not args.no_prepare: prepare(options, directory)
+    if args.serve: return serve(args.serve)
+    options['mode'] = 'http' if args.http or args.url else 'test_client'
+    server = None
+    if args.http: server, options['url'] = start_server()
+    try:
+        share = plan(options)
+        warmups, users = share[:WARMUP_USERS * args.processes], share[WARMUP_USERS * args.processes:]
+        work = [(options, warmups[i::args.processes], users[i::args.processes]) for i in range(args.processes)]
+        if args.processes == 1: outcomes = [run_worker(*work[0])]
+        else:
+            with multiprocessing.Pool(args.processes) as pool: outcomes = pool.starmap(run_worker, work)
+    finally:
+        if server: server.terminate(); server.wait()
+    timings, errors = {}, Counter()
+    for _, _, worker_timings, worker_errors in outcomes:
+        for route, samples in worker_timings.items(): timings.setdefault(route, []).extend(samples)
+        errors.update(worker_errors)
+    result = summarize(options, min(outcome[0] for outcome in outcomes), max(outcome[1] for outcome in outcomes), timings, errors)
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file: json.dump(result, file, indent=2); file.write('\n')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file: baseline = json.load(file)
+        if baseline['config'] == result['config']: result['regressions'] = regressions = compare(result, baseline, args.tolerance)
+        else: print(f"baseline {args.baseline} was recorded with {baseline['config']}, not compared", file=sys.stderr)
+    report = json.dumps(result, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as file: file.write(report + '\n')
+    for regression in regressions: print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,45 @@
+import os
+import resource
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from ticket_store import TicketStore
+
+CHECKOUTS = 1_000_000
+REPORT_EVERY = 100_000
+# Compressed time: holds live one second instead of fifteen minutes.
+TTL, REAP_INTERVAL = 1.0, 0.25
+
+
+def rss_mib():
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except FileNotFoundError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    store = TicketStore(os.path.join(tempfile.mkdtemp(), 'soak.db'), pending_ttl=TTL)
+    store.pending.reap_interval = REAP_INTERVAL
+    passengers = [{'name': 'P', 'age': 30, 'gender': 'M', 'preference': 'ANY'}] * 2
+    start = time.perf_counter()
+    print(f"{'checkouts':>10} {'live holds':>10} {'expired':>10} {'exp/s':>8} {'db MiB':>7} {'rss MiB':>8}")
+    for i in range(1, CHECKOUTS + 1):
+        # Abandoned: the payment POST that would pop the hold never comes.
+        store.pending.put(str(uuid.uuid4()), {'train_no': '12951', 'travel_class_code': '3A', 'journey_date': '2026-01-01', 'passengers': passengers})
+        if i % REPORT_EVERY == 0:
+            stats = store.pending.stats()
+            print(f"{i:10d} {stats['pending_holds']:10d} {stats['expired_total']:10d} {stats['expired_per_second']:8.0f} "
+                  f"{stats['db_bytes_used'] / 1024 / 1024:7.1f} {rss_mib():8.1f}")
+    print(f"{CHECKOUTS} abandoned checkouts in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import csv
+import os
+import random
+
+CLASSES = [('1A', 'FIRST AC', 24), ('2A', 'SECOND AC', 520), ('3A', 'THIRD AC', 864), ('SL', 'SLEEPER', 1296), ('CC', 'AC CHAIR CAR', 780)]
+
+
+def write_timetable(directory, num_trains, num_stations, seed=0, max_stops=12):
+    # Writes trains.csv and station_coordinates.csv in the shipped format, with
+    # '|'-separated intermediate stops, and returns their paths.
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    stations_path = os.path.join(directory, 'station_coordinates.csv')
+    trains_path = os.path.join(directory, 'trains.csv')
+    codes = [f"S{i:05d}" for i in range(num_stations)]
+    with open(stations_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['station_code', 'station_name', 'latitude', 'longitude'])
+        for i, code in enumerate(codes):
+            writer.writerow([code, f"Station {i}", round(rng.uniform(8.0, 32.0), 4), round(rng.uniform(68.0, 95.0), 4)])
+    with open(trains_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['train_no', 'train_name', 'source', 'destination', 'departure', 'arrival', 'class_code', 'class_name', 'seats', 'stops'])
+        for i in range(num_trains):
+            stops = rng.sample(codes, rng.randint(2, max_stops))
+            departure = rng.randrange(0, 24 * 60, 5)
+            arrival = (departure + rng.randint(60, 90) * (len(stops) - 1) + rng.randint(0, 240)) % (24 * 60)
+            for class_code, class_name, seats in rng.sample(CLASSES, rng.randint(1, 3)):
+                writer.writerow([str(20000 + i), f"SYNTHETIC EXPRESS {i}", stops[0], stops[-1],
+                                 f"{departure // 60:02d}:{departure % 60:02d}", f"{arrival // 60:02d}:{arrival % 60:02d}",
+                                 class_code, class_name, seats, '|'.join(stops[1:-1])])
+    return trains_path, stations_path
+
+
+NAMES = ['Aarav', 'Diya', 'Ishaan', 'Kavya', 'Rohan', 'Meera', 'Arjun', 'Ananya', 'Vikram', 'Priya', 'Kabir', 'Sneha']
+PREFERENCES = ['ANY', 'LB', 'MB', 'UB', 'SLB', 'SUB']
+
+
+def synthetic_users(count, seed=0):
+    # Accounts with 1-6 passengers each (about one in eight a senior), in the
+    # passenger-details form's fields, plus a Google identity for each.
+    rng = random.Random(seed)
+    users = []
+    for i in range(count):
+        passengers = [{'name': rng.choice(NAMES), 'age': str(rng.randint(60, 85) if rng.random() < 0.125 else rng.randint(5, 59)),
+                       'gender': rng.choice('MF'), 'preference': rng.choice(PREFERENCES)} for _ in range(rng.randint(1, 6))]
+        users.append({'name': f"user{seed}_{i}", 'password': f"pw{rng.getrandbits(32):08x}", 'google_sub': f"g{seed}_{i}", 'passengers': passengers})
+    return users
+
+
+def read_trips(trains_path, stations_path):
+    # (train_no, source, destination, class codes) for every train in a
+    # trains.csv whose end stations have coordinates, so fares can be priced.
+    with open(stations_path, newline='', encoding='utf-8') as file:
+        located = {row['station_code'] for row in csv.DictReader(file)}
+    trips = {}
+    with open(trains_path, newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            if row['source'] in located and row['destination'] in located: trips.setdefault(row['train_no'], (row['train_no'], row['source'], row['destination'], []))[3].append(row['class_code'])
+    return list(trips.values())
@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+
+class Overloaded(RuntimeError):
+    # The pool's queue is full, or a job did not finish within the timeout.
+    pass
+
+
+def _exit_with_parent(parent_pid):
+    # Pool workers must not outlive the server, even one killed by a signal.
+    def watch():
+        while os.getppid() == parent_pid: time.sleep(1)
+        os._exit(0)
+    threading.Thread(target=watch, daemon=True).start()
+
+
+class CPUPool:
+    # Runs CPU-bound jobs (password hashing, QR encoding) in a pool of worker
+    # processes, so request threads only wait for them and no more than workers
+    # cores are ever spent on them. At most max_pending jobs are queued or
+    # running; past that run() raises Overloaded at once instead of queueing,
+    # and a job not done within timeout seconds raises Overloaded too. With
+    # workers=0 jobs run inline in the calling thread.
+
+    def __init__(self, workers=0, max_pending=None, timeout=10.0):
+        self.workers = workers
+        self.max_pending = max_pending or 4 * max(workers, 1)
+        self.timeout = timeout
+        self.pending = self.rejected = self.timed_out = 0
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    @classmethod
+    def from_env(cls):
+        # RAILONE_CPU_WORKERS, RAILONE_CPU_QUEUE and RAILONE_CPU_TIMEOUT. Jobs
+        # run inline unless a deployment that can fork opts in with workers.
+        workers = int(os.getenv('RAILONE_CPU_WORKERS', 0))
+        return cls(workers, int(os.getenv('RAILONE_CPU_QUEUE', 0)) or None, float(os.getenv('RAILONE_CPU_TIMEOUT', 10)))
+
+    def start(self):
+        # Forks the workers now, e.g. at import time before the server starts
+        # its request threads; otherwise that happens on the first job. Where
+        # processes cannot be started (serverless sandboxes without /dev/shm
+        # or fork) jobs fall back to running inline.
+        if self.workers:
+            try: self._pool()
+            except (OSError, ValueError): self.workers = 0
+        return self
+
+    def run(self, fn, *args):
+        if not self.workers: return fn(*args)
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise Overloaded(f"{self.max_pending} CPU jobs already pending")
+            self.pending += 1
+        return self._result(*self._submit(fn, args))
+
+    def map(self, fn, iterable, window=None):
+        # fn(*args) for each args in iterable, in order, with at most window
+        # (default twice workers, so none idles while the caller consumes a
+        # result) of them queued or running. For bulk work: it waits
+        # for its own jobs rather than raising Overloaded, and its window
+        # leaves the rest of max_pending to interactive jobs.
+        if not self.workers:
+            for args in iterable: yield fn(*args)
+            return
+        jobs = deque()
+        try:
+            for args in iterable:
+                if len(jobs) >= (window or 2 * self.workers): yield self._result(*jobs.popleft())
+                with self._lock: self.pending += 1
+                jobs.append(self._submit(fn, args))
+            while jobs: yield self._result(*jobs.popleft())
+        finally:
+            for _, future in jobs: future.cancel()
+
+    def _submit(self, fn, args):
+        # Submits a job already counted in pending.
+        try:
+            pool = self._pool(); future = pool.submit(fn, *args)
+        except BaseException:
+            self._done(None); raise
+        future.add_done_callback(self._done)
+        return pool, future
+
+    def _result(self, pool, future):
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel(); self.timed_out += 1
+            raise Overloaded(f"CPU job took over {self.timeout}s") from None
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); the next job starts a new pool.
+            with self._start_lock:
+                if self._executor is pool: self._executor = None
+            raise
+
+    def _done(self, future):
+        with self._lock: self.pending -= 1
+
+    def _pool(self):
+        # One executor per process, recreated after a fork as gunicorn workers
+        # must not share the master's. Workers are forked, not spawned, so they
+        # never re-import the app module.
+        with self._start_lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'), initializer=_exit_with_parent, initargs=(os.getpid(),))
+                self._pid = os.getpid()
+                self._executor.submit(int).result()
+            return self._executor
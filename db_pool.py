@@ -0,0 +1,42 @@
+import os
+import sqlite3
+import threading
+
+# synchronous is set per pool: NORMAL only fsyncs the WAL at checkpoints, so
+# a power cut can lose the last commits; FULL fsyncs on every commit.
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+]
+
+
+class ConnectionPool:
+    # One long-lived connection per thread, reopened after a fork so gunicorn
+    # workers never share a handle. sqlite3 keeps each connection's prepared
+    # statements in its statement cache, so repeated queries skip re-parsing.
+
+    def __init__(self, db_path, cached_statements=256, synchronous='NORMAL'):
+        if synchronous.upper() not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"synchronous must be one of {', '.join(SYNCHRONOUS_LEVELS)}")
+        self.db_path = db_path
+        self.cached_statements = cached_statements
+        self.synchronous = synchronous.upper()
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False, cached_statements=self.cached_statements)
+            for pragma in PRAGMAS + [f"PRAGMA synchronous={self.synchronous}"]:
+                conn.execute(pragma)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
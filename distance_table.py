@@ -0,0 +1,52 @@
+import csv
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+BLOCK_ROWS = 512
+UNKNOWN = np.iinfo(np.uint16).max
+
+
+class DistanceTable:
+    # Station-pair distances in km, computed once: the real rail distance from
+    # distances.csv where one is known, the great-circle distance otherwise.
+    # Stored as uint16 to keep an 8,000-station table at ~128 MB.
+
+    def __init__(self, station_coordinates, rail_distances_path='distances.csv'):
+        rail_distances = self._load_rail_distances(rail_distances_path)
+        self.codes = list(station_coordinates)
+        self.codes += sorted({code for pair in rail_distances for code in pair} - set(self.codes))
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.matrix = self._great_circle_matrix(station_coordinates)
+        for (source, destination), distance in rail_distances.items():
+            i, j = self.index[source], self.index[destination]
+            self.matrix[i, j] = self.matrix[j, i] = distance
+
+    def get(self, source_code, dest_code):
+        i, j = self.index.get(source_code), self.index.get(dest_code)
+        if i is None or j is None: return None
+        distance = self.matrix.item(i, j)
+        return None if distance == UNKNOWN else distance
+
+    def _load_rail_distances(self, path):
+        distances = {}
+        try:
+            with open(path, mode='r', newline='', encoding='utf-8') as file:
+                for row in csv.DictReader(file):
+                    distances[(row['source_code'], row['destination_code'])] = int(row['distance'])
+        except FileNotFoundError: return {}
+        return distances
+
+    def _great_circle_matrix(self, station_coordinates):
+        size = len(self.codes)
+        matrix = np.full((size, size), UNKNOWN, dtype=np.uint16)
+        known = len(station_coordinates)
+        lat = np.radians([data['lat'] for data in station_coordinates.values()])
+        lon = np.radians([data['lon'] for data in station_coordinates.values()])
+        # Haversine in row blocks so the float64 temporaries stay small.
+        for start in range(0, known, BLOCK_ROWS):
+            block = slice(start, min(start + BLOCK_ROWS, known))
+            a = (np.sin((lat[None, :] - lat[block, None]) / 2) ** 2
+                 + np.cos(lat[block, None]) * np.cos(lat[None, :]) * np.sin((lon[None, :] - lon[block, None]) / 2) ** 2)
+            matrix[block, :known] = (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).astype(np.uint16)
+        return matrix
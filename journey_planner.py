@@ -0,0 +1,83 @@
+from bisect import bisect_left
+
+MIN_TRANSFER_MINUTES = 30
+MAX_LEGS = 3
+HORIZON_DAYS = 3
+DAY = 24 * 60
+
+
+def to_minutes(hhmm):
+    hours, minutes = hhmm.split(' ')[-1].split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def format_minutes(minutes):
+    day, minutes = divmod(minutes, DAY)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}" + (f" (+{day})" if day else "")
+
+
+class JourneyPlanner:
+    # Connection Scan over every train's origin -> terminus run, repeated daily
+    # for HORIZON_DAYS and sorted by departure. Each station keeps a Pareto bag
+    # of (arrival, fare, legs) labels, so one scan yields both the fastest and
+    # the cheapest itinerary with up to MAX_LEGS - 1 changes.
+
+    def __init__(self, trains, leg_fares):
+        self.trains = trains
+        connections = []
+        for train_no, train_data in trains.items():
+            name, source, destination, departure, arrival = train_data['details']
+            depart, run = to_minutes(departure), (to_minutes(arrival) - to_minutes(departure)) % DAY or DAY
+            for day in range(HORIZON_DAYS):
+                connections.append((depart + day * DAY, depart + day * DAY + run, source, destination, train_no))
+        connections.sort()
+        self.connections = connections
+        self.departures = [connection[0] for connection in connections]
+        self.origins = [connection[2] for connection in connections]
+        self.leg_fares = leg_fares
+
+    def plan(self, source, destination, depart_after=0):
+        if source == destination: return []
+        bags = {source: [(depart_after, 0, 0, None)]}
+        bags_get, origins = bags.get, self.origins
+        for i in range(bisect_left(self.departures, depart_after), len(self.connections)):
+            bag = bags_get(origins[i])
+            if not bag: continue
+            depart, arrive, origin, terminus, train_no = self.connections[i]
+            target = bags.get(destination, ())
+            fare = self.leg_fares.get(train_no, 0)
+            for label in list(bag):
+                arrival, total, legs, _ = label
+                ready = arrival if origin == source and legs == 0 else arrival + MIN_TRANSFER_MINUTES
+                if ready > depart or legs >= MAX_LEGS: continue
+                new_label = (arrive, total + fare, legs + 1, (label, self.connections[i]))
+                if any(a <= arrive and f <= total + fare for a, f, _, _ in target): continue
+                self._insert(bags.setdefault(terminus, []), new_label)
+        target = bags.get(destination)
+        if not target: return []
+        fastest = min(target, key=lambda label: (label[0], label[1]))
+        cheapest = min(target, key=lambda label: (label[1], label[0]))
+        journeys = [self._journey(fastest, 'Fastest')]
+        if cheapest is not fastest: journeys.append(self._journey(cheapest, 'Cheapest'))
+        return journeys
+
+    def _insert(self, bag, new_label):
+        arrive, fare, legs, _ = new_label
+        for a, f, n, _ in bag:
+            if a <= arrive and f <= fare and n <= legs: return
+        bag[:] = [label for label in bag if not (arrive <= label[0] and fare <= label[1] and legs <= label[2])]
+        bag.append(new_label)
+
+    def _journey(self, label, kind):
+        legs, fare, arrival = [], label[1], label[0]
+        while label[3]:
+            label, (depart, arrive, origin, terminus, train_no) = label[3]
+            legs.append({
+                'train_no': train_no, 'train_name': self.trains[train_no]['details'][0],
+                'source': origin, 'destination': terminus,
+                'departure': format_minutes(depart), 'arrival': format_minutes(arrive),
+                'fare': self.leg_fares.get(train_no, 0),
+            })
+        legs.reverse()
+        return {'kind': kind, 'legs': legs, 'changes': len(legs) - 1, 'fare': round(fare, 2),
+                'departure': legs[0]['departure'], 'arrival': legs[-1]['arrival']}
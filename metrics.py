@@ -0,0 +1,176 @@
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Latency bucket upper bounds in seconds; the last bucket is +Inf.
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Timing:
+    # Latency histogram plus call and error counts for one instrumented name.
+    __slots__ = ('counts', 'total', 'errors', 'lock')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        with self.lock:
+            self.counts[bisect_left(BUCKETS, seconds)] += 1
+            self.total += seconds
+            if error: self.errors += 1
+
+
+class Registry:
+    # Per-process metrics: one Timing per function or route, plus gauges read
+    # at scrape time from callbacks returning {name: value}.
+
+    def __init__(self):
+        self.timings = {}
+        self.gauge_callbacks = []
+
+    def timing(self, kind, name):
+        key = (kind, name)
+        if key not in self.timings: self.timings[key] = Timing()
+        return self.timings[key]
+
+    def gauges(self, callback):
+        self.gauge_callbacks.append(callback)
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4.
+        lines = [
+            '# HELP railone_duration_seconds Latency of instrumented functions and routes.',
+            '# TYPE railone_duration_seconds histogram',
+        ]
+        for (kind, name), timing in sorted(self.timings.items()):
+            labels = f'kind="{kind}",name="{name}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), timing.counts):
+                cumulative += count
+                lines.append(f'railone_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'railone_duration_seconds_sum{{{labels}}} {timing.total:.9f}')
+            lines.append(f'railone_duration_seconds_count{{{labels}}} {cumulative}')
+        lines += ['# HELP railone_errors_total Calls that raised, or routes that answered 5xx.', '# TYPE railone_errors_total counter']
+        lines += [f'railone_errors_total{{kind="{kind}",name="{name}"}} {timing.errors}' for (kind, name), timing in sorted(self.timings.items())]
+        for callback in self.gauge_callbacks:
+            for name, value in callback().items():
+                lines += [f'# TYPE railone_{name} gauge', f'railone_{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def timed(name):
+    # Decorator recording every call's latency, and whether it raised, under
+    # name. Timing.observe is inlined, as this wraps microsecond-scale calls.
+    timing = REGISTRY.timing('function', name)
+    counts, lock, perf_counter = timing.counts, timing.lock, time.perf_counter
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start, failed = perf_counter(), True
+            try:
+                result = fn(*args, **kwargs); failed = False
+                return result
+            finally:
+                elapsed = perf_counter() - start
+                with lock:
+                    counts[bisect_left(BUCKETS, elapsed)] += 1
+                    timing.total += elapsed
+                    timing.errors += failed
+        return wrapper
+    return decorate
+
+
+def timed_wsgi(wsgi_app):
+    # WSGI wrapper timing each request under the endpoint record_endpoint
+    # stored in its environ; 5xx answers count as errors.
+    perf_counter = time.perf_counter
+
+    def timed_wsgi_app(environ, start_response):
+        start, status = perf_counter(), []
+
+        def recording_start_response(code, headers, *args):
+            status.append(code)
+            return start_response(code, headers, *args)
+        try:
+            return wsgi_app(environ, recording_start_response)
+        finally:
+            failed = not status or status[0].startswith('5')
+            REGISTRY.timing('route', environ.get('railone.endpoint') or 'unmatched').observe(perf_counter() - start, error=failed)
+    return timed_wsgi_app
+
+
+def instrument_app(app):
+    # The only per-request Flask hook stores the matched endpoint, since
+    # context-local lookups are the costly part; timing happens in WSGI.
+    from flask import request
+
+    @app.before_request
+    def record_endpoint():
+        request.environ['railone.endpoint'] = request.endpoint
+
+    app.wsgi_app = timed_wsgi(app.wsgi_app)
+
+
+class SamplingProfiler:
+    # Samples every other thread's Python stack each interval and counts
+    # collapsed stacks ("file:function;file:function"), the input format of
+    # flamegraph.pl and speedscope. Written to path periodically and at exit.
+
+    def __init__(self, path, interval=0.01, flush_every=30):
+        self.path = path
+        self.interval = interval
+        self.flush_every = flush_every
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.dump()
+
+    def sample(self):
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own: continue
+            stack = []
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+        os.replace(temp_path, self.path)
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_every
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if time.monotonic() >= next_flush:
+                self.dump(); next_flush = time.monotonic() + self.flush_every
+
+
+def start_profiler_from_env():
+    # RAILONE_PROFILE=<path> turns the profiler on; RAILONE_PROFILE_INTERVAL_MS sets the sample period.
+    path = os.getenv('RAILONE_PROFILE')
+    if not path: return None
+    return SamplingProfiler(f"{path}.{os.getpid()}", int(os.getenv('RAILONE_PROFILE_INTERVAL_MS', 10)) / 1000).start()
@@ -0,0 +1,105 @@
+import hashlib
+import io
+import os
+import shutil
+import threading
+from collections import OrderedDict, deque
+
+import qrcode
+
+from metrics import timed
+
+
+def render_png(payload):
+    buf = io.BytesIO(); qrcode.make(payload).save(buf)
+    return buf.getvalue()
+
+
+class QRCodeCache:
+    # PNG bytes per (ticket_type, ticket_id, payload hash), most recently used
+    # last. Entries pushed out of memory are written to spill_dir, if given,
+    # and read back from there before re-encoding. Encoding runs on cpu_pool,
+    # if given.
+
+    def __init__(self, max_entries=2048, spill_dir=None, cpu_pool=None):
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        self.cpu_pool = cpu_pool
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        if spill_dir: os.makedirs(spill_dir, exist_ok=True)
+
+    @staticmethod
+    def etag(payload):
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+    @timed('qr_code')
+    def get(self, ticket_type, ticket_id, payload):
+        key = (ticket_type, ticket_id, self.etag(payload))
+        png = self._cached(key)
+        if png is None:
+            self.misses += 1
+            png = self.cpu_pool.run(render_png, payload) if self.cpu_pool else render_png(payload)
+        with self._lock:
+            self._images[key] = png
+            evicted = [self._images.popitem(last=False) for _ in range(len(self._images) - self.max_entries)]
+        for item in evicted: self._spill(*item)
+        return png
+
+    def get_many(self, items, window=None):
+        # PNGs for (ticket_type, ticket_id, payload) items, in order, for bulk
+        # exports. Cached images are reused; the rest are encoded across
+        # cpu_pool, window at a time, and not cached, so one export does not
+        # push every interactive QR code out of memory.
+        pending = deque()
+
+        def misses():
+            # Queues each item's cached image, or None for one sent to encode.
+            for ticket_type, ticket_id, payload in items:
+                png = self._cached((ticket_type, ticket_id, self.etag(payload)))
+                pending.append(png)
+                if png is None: self.misses += 1; yield (payload,)
+
+        for png in self.cpu_pool.map(render_png, misses(), window) if self.cpu_pool else (render_png(*args) for args in misses()):
+            while pending[0] is not None: yield pending.popleft()
+            pending.popleft(); yield png
+        while pending: yield pending.popleft()
+
+    def drop(self, ticket_type, ticket_id):
+        with self._lock:
+            for key in [key for key in self._images if key[:2] == (ticket_type, ticket_id)]:
+                del self._images[key]
+        if self.spill_dir:
+            shutil.rmtree(self._spill_path(ticket_type, ticket_id), ignore_errors=True)
+
+    def __len__(self):
+        return len(self._images)
+
+    def _spill_path(self, ticket_type, ticket_id, digest=None):
+        # One directory per ticket, so dropping a ticket never lists the whole cache.
+        directory = os.path.join(self.spill_dir, f"{ticket_type}-{hashlib.sha256(ticket_id.encode('utf-8')).hexdigest()[:16]}")
+        return directory if digest is None else os.path.join(directory, digest + '.png')
+
+    def _spill(self, key, png):
+        if not self.spill_dir: return
+        path = self._spill_path(*key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file: file.write(png)
+        os.replace(temp_path, path)
+
+    def _cached(self, key):
+        with self._lock:
+            png = self._images.get(key)
+            if png is not None:
+                self._images.move_to_end(key); self.hits += 1
+                return png
+        return self._read_spilled(key)
+
+    def _read_spilled(self, key):
+        if not self.spill_dir: return None
+        try:
+            with open(self._spill_path(*key), 'rb') as file:
+                return file.read()
+        except FileNotFoundError: return None
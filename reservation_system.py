@@ -1,11 +1,33 @@
+import math
+import os
+import threading
 import random
+import time
 import string
 from datetime import datetime, timedelta
 import csv
-import math
+from operator import itemgetter
 import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from seat_inventory import SeatInventory, InventoryCalendar
+from ticket_store import TicketStore
+from db_pool import ConnectionPool
+from station_index import StationIndex, StationSearch
+from journey_planner import JourneyPlanner
+from metrics import timed
+from cpu_pool import CPUPool
+from admission import AdmissionQueue
+from timetable_snapshot import DEFAULT_SNAPSHOT_PATH, source_checksum, load_snapshot
+
+RESERVED_FARE_RATES = {'1A': 4.5, '2A': 2.5, '3A': 1.8, 'SL': 0.8, 'EC': 2.2, 'CC': 1.5, '2S': 0.6}
+UNRESERVED_FARE_RATES = {'MAIL': {'adult': 0.36, 'child': 0.18}, 'ORDINARY': {'adult': 0.19, 'child': 0.10}, 'SUPERFAST': {'adult': 0.39, 'child': 0.22}}
+MST_JOURNEYS = 30
+
+def valid_passengers(passengers):
+    # A non-empty list of passengers, each with a name, a gender and a whole-number age.
+    return isinstance(passengers, list) and bool(passengers) and all(
+        isinstance(p, dict) and p.get('name') and p.get('gender') and str(p.get('age', '')).isdigit() for p in passengers)
 
 class User(UserMixin):
     def __init__(self, id, username):
@@ -13,19 +35,74 @@ class User(UserMixin):
         self.username = username
 
 class RailwayReservationSystem:
+    USER_CACHE_TTL = 30
+    USER_CACHE_SIZE = 10000
+    # Waitlisted passengers per coach shown as RAC, and the waitlist cap as a
+    # share of the class's seats.
+    RAC_PER_COACH = 4
+    WAITLIST_SHARE = 1.0
+    PROMOTION_BATCH = 50
+    # Seconds an unpaid checkout keeps its pending ticket.
+    PENDING_TTL = 15 * 60
+    # berth_events kept when compacting, and how often compaction runs and
+    # how many events it deletes at a time.
+    JOURNAL_KEEP = 100000
+    COMPACT_INTERVAL = 60
+    COMPACT_BATCH = 50000
 
-    def __init__(self, db_path='railway.db'):
+    def __init__(self, db_path='railone.db', trains_path='trains.csv', stations_path='station_coordinates.csv', distances_path='distances.csv', snapshot_path=DEFAULT_SNAPSHOT_PATH, cpu_pool=None, synchronous='NORMAL'):
         self.db_path = db_path
+        self.trains_path = trains_path
+        self.stations_path = stations_path
+        self.distances_path = distances_path
+        self.snapshot_path = snapshot_path
+        # Password hashing runs here; the default runs it inline.
+        self.cpu_pool = cpu_pool or CPUPool()
         self._init_db()
-        self.trains = self._load_trains_from_csv()
-        self.booked_tickets = {}
-        self.platform_tickets = {}
-        self.unreserved_tickets = {}
-        self.pending_tickets = {}
-        self._station_coordinates = self._load_station_coordinates()
-        self._station_codes = self._generate_station_codes()
-        self.berth_inventory = self._generate_berth_inventory()
-        self.mst_tickets = {}
+        self.pool = ConnectionPool(db_path, synchronous=synchronous)
+        self._user_cache = {}
+        self.store = TicketStore(db_path, self.pool, pending_ttl=self.PENDING_TTL)
+        self._timetable = self._load_timetable()
+        self._reload_lock = threading.Lock()
+        self._source_stats_seen, self._next_watch = self._source_stats(), 0
+        self.booked_tickets = self.store.reserved
+        self.platform_tickets = self.store.platform
+        self.unreserved_tickets = self.store.unreserved
+        self.pending_tickets = self.store.pending
+        self._journey_planner = None
+        self._distance_table = None
+        self._reserved_fares = {}
+        self._berth_event_seq = self.store.last_berth_event()
+        # Held around every journal replay and every change to the in-memory
+        # inventories, always taken before the database write lock, so no
+        # thread sees or replays another's half-done booking.
+        self._inventory_lock = threading.RLock()
+        self._next_compact = 0
+        self.seat_calendar = InventoryCalendar(self.trains, self._build_seat_inventory, self.store.allocations_for)
+        self.mst_tickets = self.store.mst
+        self.admission = AdmissionQueue(lambda key, requests: self.book_many(*key, requests), lambda key: self.remaining_capacity(*key))
+
+    # The timetable is one dict that reload_timetable replaces whole, so a
+    # reader holding it sees one version of the trains and their indexes.
+    @property
+    def trains(self):
+        return self._timetable['trains']
+
+    @property
+    def station_index(self):
+        return self._timetable['station_index']
+
+    @property
+    def station_search(self):
+        return self._timetable['station_search']
+
+    @property
+    def _station_coordinates(self):
+        return self._timetable['station_coordinates']
+
+    @property
+    def _station_codes(self):
+        return self._timetable['station_codes']
 
     def _init_db(self):
         with sqlite3.connect(self.db_path) as conn:
@@ -44,236 +121,590 @@ class RailwayReservationSystem:
                 pass
             conn.commit()
 
+    @timed('get_user_by_id')
     def get_user_by_id(self, user_id):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, username FROM users WHERE id = ?", (user_id,))
-            user_record = cursor.fetchone()
-            if user_record:
-                return User(id=user_record[0], username=user_record[1])
-        return None
+        cached = self._user_cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        user_record = self.pool.connection().execute("SELECT id, username FROM users WHERE id = ?", (user_id,)).fetchone()
+        user = User(id=user_record[0], username=user_record[1]) if user_record else None
+        if len(self._user_cache) >= self.USER_CACHE_SIZE:
+            self._user_cache.clear()
+        self._user_cache[user_id] = (time.monotonic() + self.USER_CACHE_TTL, user)
+        return user
 
+    def _invalidate_user_cache(self, user_id=None):
+        if user_id is None: self._user_cache.clear()
+        else: self._user_cache.pop(user_id, None)
+
+    @timed('get_or_create_google_user')
     def get_or_create_google_user(self, user_info):
         user_id = user_info['id']
         username = user_info['name']
         is_username_taken = self.get_user_by_username(username)
         if is_username_taken and not getattr(is_username_taken, 'google_id', None):
              username = f"{username}_{user_id[:4]}"
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, username FROM users WHERE google_id = ?", (user_id,))
-            user_record = cursor.fetchone()
-            if user_record:
-                return User(id=user_record[0], username=user_record[1])
-            else:
-                try:
-                    cursor.execute(
-                        "INSERT INTO users (username, google_id) VALUES (?, ?)",
-                        (username, user_id)
-                    )
-                    conn.commit()
-                    new_user_id = cursor.lastrowid
-                    return User(id=new_user_id, username=username)
-                except sqlite3.IntegrityError:
-                    return None
+        conn = self.pool.connection()
+        user_record = conn.execute("SELECT id, username FROM users WHERE google_id = ?", (user_id,)).fetchone()
+        if user_record:
+            return User(id=user_record[0], username=user_record[1])
+        else:
+            try:
+                cursor = conn.execute(
+                    "INSERT INTO users (username, google_id) VALUES (?, ?)",
+                    (username, user_id)
+                )
+                new_user_id = cursor.lastrowid
+                self._invalidate_user_cache(new_user_id)
+                return User(id=new_user_id, username=username)
+            except sqlite3.IntegrityError:
+                return None
 
+    @timed('get_user_by_username')
     def get_user_by_username(self, username):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, username, google_id FROM users WHERE username = ?", (username,))
-            user_record = cursor.fetchone()
-            if user_record:
-                user = User(id=user_record[0], username=user_record[1])
-                user.google_id = user_record[2]
-                return user
+        user_record = self.pool.connection().execute("SELECT id, username, google_id FROM users WHERE username = ?", (username,)).fetchone()
+        if user_record:
+            user = User(id=user_record[0], username=user_record[1])
+            user.google_id = user_record[2]
+            return user
         return None
 
+    @timed('create_user')
     def create_user(self, username, password):
-        password_hash = generate_password_hash(password)
+        password_hash = self.cpu_pool.run(generate_password_hash, password)
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (username, password_hash))
-                conn.commit()
+            cursor = self.pool.connection().execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (username, password_hash))
+            self._invalidate_user_cache(cursor.lastrowid)
             return True
         except sqlite3.IntegrityError:
             return False
 
+    @timed('check_user')
     def check_user(self, username, password):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, username, password_hash FROM users WHERE username = ? AND password_hash IS NOT NULL", (username,))
-            user_record = cursor.fetchone()
-            if user_record and check_password_hash(user_record[2], password):
-                return User(id=user_record[0], username=user_record[1])
+        user_record = self.pool.connection().execute("SELECT id, username, password_hash FROM users WHERE username = ? AND password_hash IS NOT NULL", (username,)).fetchone()
+        if user_record and self.cpu_pool.run(check_password_hash, user_record[2], password):
+            return User(id=user_record[0], username=user_record[1])
         return None
 
-    def book_ticket_logic(self, pnr, train_no, travel_class, passengers, user_id):
-        allocated_passengers = self.allocate_berths(train_no, travel_class, passengers)
+    def book_ticket_logic(self, pnr, train_no, travel_class, passengers, user_id, journey_date=None):
+        train = self.trains.get(train_no)
+        if not train or travel_class not in train['classes']:
+            return None
+        if journey_date is None:
+            journey_date = (datetime.now() + timedelta(days=random.randint(1, 10))).strftime("%Y-%m-%d")
+        journey_date = self.seat_calendar.normalize(journey_date)
+        if journey_date is None:
+            return None
+        with self._inventory_lock, self.store.transaction() as conn:
+            self._sync_berth_inventory(conn)
+            ticket_details = self._book(conn, pnr, train_no, travel_class, passengers, user_id, journey_date)
+        self.compact_journal()
+        return ticket_details
+
+    def _book(self, conn, pnr, train_no, travel_class, passengers, user_id, journey_date):
+        # Books one validated ticket in the caller's transaction: BOOKED,
+        # WAITLISTED, or None when the waitlist is full too. Freed berths are
+        # offered to the waitlist first (_promote_waitlist), so any berth still
+        # free is one no waitlisted party can use, and a new booking may take it.
+        allocated_passengers = self.allocate_berths(train_no, travel_class, passengers, journey_date)
+        status = "BOOKED"
         if not allocated_passengers:
+            waitlisted = self.store.waitlisted_passengers(train_no, travel_class, journey_date, conn=conn)
+            waitlist_cap = int(self.trains[train_no]['classes'][travel_class]['seats'] * self.WAITLIST_SHARE)
+            if waitlisted + len(passengers) > waitlist_cap:
+                return None
+            status = "WAITLISTED"
+
+        ticket_details = self._ticket_details(pnr, train_no, travel_class, allocated_passengers or passengers, user_id, status, journey_date)
+        try:
+            if allocated_passengers:
+                self.store.add_allocations(conn, pnr, train_no, travel_class, journey_date, self._allocated_berths(allocated_passengers))
+            else:
+                self.store.add_to_waitlist(conn, pnr, train_no, travel_class, journey_date, len(passengers))
+            self.booked_tickets.put(pnr, ticket_details, conn=conn)
+        except Exception:
+            if allocated_passengers: self._release_berths(train_no, travel_class, journey_date, allocated_passengers)
+            raise
+        return ticket_details
+
+    def request_booking(self, pnr, train_no, travel_class, passengers, user_id, journey_date):
+        # Queues a booking with the admission queue and returns its Attempt,
+        # or None when the train, class or date is invalid.
+        train, journey_date = self.trains.get(train_no), self.seat_calendar.normalize(journey_date)
+        if not train or travel_class not in train['classes'] or not valid_passengers(passengers) or journey_date is None:
             return None
-            
-        train = self.trains.get(train_no)
-        train_details = train['details']
-        class_details = train['classes'].get(travel_class)
-        
-        ticket_details = {
-            "pnr": pnr, 
+        return self.admission.submit((train_no, travel_class, journey_date), len(passengers), (pnr, passengers, user_id))
+
+    def book_many(self, train_no, travel_class, journey_date, requests):
+        # The admission queue's micro-batch: books each (pnr, passengers,
+        # user_id) on its own, as book_ticket_logic would, but all in one
+        # transaction. Returns a ticket or None per request; an invalid
+        # request gets None without failing the rest of the batch.
+        tickets = []
+        with self._inventory_lock:
+            try:
+                with self.store.transaction() as conn:
+                    self._sync_berth_inventory(conn)
+                    for pnr, passengers, user_id in requests:
+                        tickets.append(self._book(conn, pnr, train_no, travel_class, passengers, user_id, journey_date) if valid_passengers(passengers) else None)
+            except Exception:
+                # Rolled back: free the berths the batch's earlier tickets took.
+                for ticket in tickets:
+                    if ticket and ticket['status'] == 'BOOKED': self._release_berths(train_no, travel_class, journey_date, ticket['passengers'])
+                raise
+        self.compact_journal()
+        return tickets
+
+    def remaining_capacity(self, train_no, travel_class, journey_date):
+        # Passengers the class can still take: free berths plus waitlist room,
+        # with the journal replayed so berths other workers sold are counted.
+        waitlisted = self.store.waitlisted_passengers(train_no, travel_class, journey_date)
+        waitlist_cap = int(self.trains[train_no]['classes'][travel_class]['seats'] * self.WAITLIST_SHARE)
+        with self._inventory_lock:
+            self._refresh_inventory()
+            free = self.seat_calendar.get(train_no, travel_class, journey_date).free_count()
+        return free + max(waitlist_cap - waitlisted, 0)
+
+    def book_batch(self, bookings, user_id):
+        # Confirms every booking ({'train_no', 'travel_class', 'journey_date',
+        # 'passengers'}) or none, in one transaction, and returns their tickets
+        # in order; None when any is invalid or cannot be seated. Bookings are
+        # grouped by train, class and date so each inventory is loaded once,
+        # and each party sits in a single coach when one has room, starting
+        # from the coach the group's previous party went to.
+        groups = {}
+        for i, booking in enumerate(bookings):
+            train, journey_date = self.trains.get(booking['train_no']), self.seat_calendar.normalize(booking['journey_date'])
+            if not train or booking['travel_class'] not in train['classes'] or not booking['passengers'] or journey_date is None:
+                return None
+            groups.setdefault((booking['train_no'], booking['travel_class'], journey_date), []).append(i)
+        tickets = [None] * len(bookings)
+        with self._inventory_lock, self.store.transaction() as conn:
+            self._sync_berth_inventory(conn)
+            for (train_no, travel_class, journey_date), indexes in groups.items():
+                inventory, coach = self.seat_calendar.get(train_no, travel_class, journey_date), None
+                for i in indexes:
+                    allocated_passengers, coach = self._seat_party(inventory, bookings[i]['passengers'], coach)
+                    if not allocated_passengers:
+                        for ticket in filter(None, tickets):
+                            self._release_berths(ticket['train_no'], ticket['travel_class_code'], ticket['journey_date'], ticket['passengers'])
+                            for passenger in ticket['passengers']: passenger.pop('coach'); passenger.pop('berth')
+                        return None
+                    tickets[i] = self._ticket_details(self._generate_pnr(), train_no, travel_class, allocated_passengers, user_id, 'BOOKED', journey_date)
+            try:
+                for ticket in tickets:
+                    self.store.add_allocations(conn, ticket['pnr'], ticket['train_no'], ticket['travel_class_code'], ticket['journey_date'], self._allocated_berths(ticket['passengers']))
+                    self.booked_tickets.put(ticket['pnr'], ticket, conn=conn)
+            except sqlite3.Error:
+                for ticket in tickets: self._release_berths(ticket['train_no'], ticket['travel_class_code'], ticket['journey_date'], ticket['passengers'])
+                raise
+        self.compact_journal()
+        return tickets
+
+    def _seat_party(self, inventory, passengers, coach):
+        # (allocated passengers, coach they sit in): coach itself when it has
+        # room, else the first coach with room, else spread over the train.
+        for candidate in ([coach] if coach else []) + inventory.coaches:
+            if inventory.free_count(candidate) >= len(passengers):
+                allocated_passengers = self._seat_passengers(inventory, passengers, candidate)
+                if allocated_passengers: return allocated_passengers, candidate
+        return self._seat_passengers(inventory, passengers), coach
+
+    def _ticket_details(self, pnr, train_no, travel_class, passengers, user_id, status, journey_date):
+        train_details, class_details = self.trains[train_no]['details'], self.trains[train_no]['classes'][travel_class]
+        return {
+            "pnr": pnr,
             "user_id": user_id,
             "train_no": train_no, "train_name": train_details[0],
             "source": train_details[1], "destination": train_details[2],
             "departure": train_details[3], "arrival": train_details[4],
             "travel_class": f"{travel_class} - {class_details['name']}",
-            "passengers": allocated_passengers,
-            "status": "BOOKED",
+            "travel_class_code": travel_class,
+            "passengers": passengers,
+            "status": status,
             "booking_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "journey_date": (datetime.now() + timedelta(days=random.randint(1, 10))).strftime("%Y-%m-%d")
+            "journey_date": journey_date
         }
-        self.booked_tickets[pnr] = ticket_details
-        return ticket_details
 
-    def _load_trains_from_csv(self):
+    def cancel_ticket(self, pnr):
+        released, promoted = [], []
+        with self._inventory_lock:
+            try:
+                with self.store.transaction() as conn:
+                    ticket = self.booked_tickets.get(pnr, conn=conn)
+                    if not ticket or ticket['status'] == 'CANCELLED':
+                        return None
+                    self._sync_berth_inventory(conn)
+                    ticket['status'] = 'CANCELLED'
+                    self.booked_tickets.put(pnr, ticket, conn=conn)
+                    self.store.remove_from_waitlist(conn, pnr)
+                    for train_no, travel_class, journey_date, coach, number in self.store.release_allocations(conn, pnr):
+                        inventory = self.seat_calendar.peek(train_no, travel_class, journey_date)
+                        if inventory: inventory.release(coach, number); released.append((inventory, coach, number))
+                    travel_class = ticket.get('travel_class_code') or ticket['travel_class'].split(' - ')[0]
+                    self._promote_waitlist(conn, ticket['train_no'], travel_class, ticket['journey_date'], promoted)
+            except Exception:
+                # Rolled back: free the promoted tickets' berths and take back the cancelled one's.
+                for passengers in promoted: self._release_berths(ticket['train_no'], travel_class, ticket['journey_date'], passengers)
+                for inventory, coach, number in released: inventory.claim(coach, number)
+                raise
+        self.admission.invalidate((ticket['train_no'], travel_class, ticket['journey_date']))
+        self.compact_journal()
+        return ticket
+
+    def _promote_waitlist(self, conn, train_no, travel_class, journey_date, seated=None):
+        # Confirms waitlisted PNRs in FIFO order while berths are free. A party
+        # the free berths cannot seat (e.g. a senior with no lower berth left)
+        # keeps its place and is skipped, so it does not hold up the parties
+        # behind it. Each promoted party's passengers are appended to seated as
+        # soon as they hold berths, for the caller to undo on a rollback.
+        inventory = self.seat_calendar.get(train_no, travel_class, journey_date)
+        promoted, after_seq = [], 0
+        while inventory and inventory.free_count():
+            head = self.store.waitlist_head(conn, train_no, travel_class, journey_date, self.PROMOTION_BATCH, after_seq)
+            for after_seq, pnr in head:
+                if not inventory.free_count():
+                    break
+                ticket = self.booked_tickets.get(pnr, conn=conn)
+                allocated_passengers = self.allocate_berths(train_no, travel_class, ticket['passengers'], journey_date)
+                if not allocated_passengers:
+                    continue
+                if seated is not None: seated.append(allocated_passengers)
+                ticket['passengers'], ticket['status'] = allocated_passengers, 'BOOKED'
+                self.store.add_allocations(conn, pnr, train_no, travel_class, journey_date, self._allocated_berths(allocated_passengers))
+                self.store.remove_from_waitlist(conn, pnr)
+                self.booked_tickets.put(pnr, ticket, conn=conn)
+                promoted.append(pnr)
+            if len(head) < self.PROMOTION_BATCH:
+                break
+        return promoted
+
+    def get_waitlist_status(self, ticket):
+        # 'RAC n' / 'WL n' from the number of passengers queued ahead of this PNR.
+        if ticket.get('status') != 'WAITLISTED':
+            return ticket.get('status')
+        travel_class = ticket.get('travel_class_code') or ticket['travel_class'].split(' - ')[0]
+        ahead = self.store.waitlisted_passengers(ticket['train_no'], travel_class, ticket['journey_date'], before_pnr=ticket['pnr'])
+        seats = self.trains[ticket['train_no']]['classes'][travel_class]['seats']
+        rac_slots = math.ceil(seats / self._seats_per_coach(travel_class)) * self.RAC_PER_COACH
+        if ahead < rac_slots:
+            return f"RAC {ahead + 1}"
+        return f"WL {ahead - rac_slots + 1}"
+
+    def default_journey_date(self):
+        return (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    def _class_inventories(self, train_no, journey_date):
+        classes = self.trains.get(train_no, {}).get('classes', {})
+        inventories = ((class_code, self.seat_calendar.get(train_no, class_code, journey_date)) for class_code in classes)
+        return [(class_code, inventory) for class_code, inventory in inventories if inventory]
+
+    def get_availability(self, train_nos, journey_date=None):
+        # Free berths per class. Dates not loaded in memory are counted from
+        # berth_allocations rather than loaded, so listing thousands of trains
+        # does not build an inventory for each of their classes. Those counts
+        # include berths past the end of a class made smaller, hence the clamp.
+        journey_date, train_nos = self.seat_calendar.normalize(journey_date or self.default_journey_date()), list(train_nos)
+        if journey_date is None: return {train_no: {} for train_no in train_nos}
+        classes = {train_no: self.trains.get(train_no, {}).get('classes', {}) for train_no in train_nos}
+        with self._inventory_lock:
+            self._refresh_inventory()
+            loaded = {(train_no, class_code): inventory.free_count() for train_no in train_nos for class_code in classes[train_no]
+                      if (inventory := self.seat_calendar.peek(train_no, class_code, journey_date))}
+        unloaded = [train_no for train_no in train_nos if any((train_no, class_code) not in loaded for class_code in classes[train_no])]
+        allocated = self.store.allocated_counts(journey_date, unloaded) if unloaded else {}
+        availability = {}
+        for train_no in train_nos:
+            availability[train_no] = {}
+            for class_code, class_info in classes[train_no].items():
+                free = loaded.get((train_no, class_code))
+                availability[train_no][class_code] = free if free is not None else max(class_info['seats'] - allocated.get((train_no, class_code), 0), 0)
+        return availability
+
+    def list_trains(self, station=None, travel_class=None, depart_after=None, depart_before=None):
+        # Train numbers in timetable order that call at station, carry
+        # travel_class and leave between depart_after and depart_before
+        # ('HH:MM', inclusive; a window past midnight wraps around).
+        timetable = self._timetable
+        trains = timetable['trains']
+        if station:
+            code = timetable['station_index'].resolve(station)
+            train_nos = timetable['station_index'].trains_serving(code) if code else {}
+        else:
+            train_nos = trains
+        def departs_in_window(departure):
+            after, before = depart_after or '00:00', depart_before or '23:59'
+            return after <= departure <= before if after <= before else departure >= after or departure <= before
+        return [train_no for train_no in train_nos if train_no in trains
+                and (not travel_class or travel_class in trains[train_no]['classes'])
+                and departs_in_window(trains[train_no]['details'][3])]
+
+    def get_availability_by_type(self, train_no, journey_date=None):
+        journey_date = self.seat_calendar.normalize(journey_date or self.default_journey_date())
+        with self._inventory_lock:
+            self._refresh_inventory()
+            return {class_code: {'available': inventory.free_count(), 'seats': inventory.seats, 'berths': inventory.availability()}
+                    for class_code, inventory in self._class_inventories(train_no, journey_date)}
+
+    def _load_timetable(self):
+        # The compiled snapshot when it matches the CSVs, else parse them.
+        checksum = source_checksum(self.trains_path, self.stations_path)
+        timetable = load_snapshot(self.snapshot_path, checksum) if self.snapshot_path else None
+        return dict(timetable or self.build_timetable(self.trains_path, self.stations_path), checksum=checksum)
+
+    def _source_stats(self):
+        stats = []
+        for path in (self.trains_path, self.stations_path):
+            try: stat = os.stat(path); stats.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError: stats.append(None)
+        return stats
+
+    def watch_timetable(self, interval, now=None):
+        # Reloads the timetable once the CSVs' mtime or size changes, looking
+        # at most every interval seconds; piggybacked on requests.
+        now = now or time.time()
+        if now < self._next_watch: return None
+        self._next_watch = now + interval
+        stats = self._source_stats()
+        if stats == self._source_stats_seen: return None
+        self._source_stats_seen = stats
+        return self.reload_timetable()
+
+    def reload_timetable(self):
+        # Re-reads the trains and stations CSVs when their checksum changed
+        # and swaps the new timetable in at once. Unchanged trains keep their
+        # objects, the station index is only updated for trains that changed,
+        # and only inventories of resized or removed classes are dropped, to
+        # be rebuilt from berth_allocations when next touched. Returns counts
+        # of added, removed and changed trains, or None when nothing changed.
+        with self._reload_lock:
+            old = self._timetable
+            checksum = source_checksum(self.trains_path, self.stations_path)
+            if checksum == old['checksum']: return None
+            old_trains, trains = old['trains'], self._load_trains_from_csv(self.trains_path)
+            station_coordinates = self._load_station_coordinates(self.stations_path)
+            added = [train_no for train_no in trains if train_no not in old_trains]
+            removed = [train_no for train_no in old_trains if train_no not in trains]
+            changed = []
+            for train_no, train_data in trains.items():
+                if train_no not in old_trains: continue
+                if train_data == old_trains[train_no]: trains[train_no] = old_trains[train_no]
+                else: changed.append(train_no)
+            stations_changed = station_coordinates != old['station_coordinates']
+            if stations_changed:
+                timetable = self._index_timetable(trains, station_coordinates)
+            else:
+                station_index = old['station_index'].updated(old_trains, trains, added + removed + changed)
+                importance = {code: len(serving) for code, serving in station_index.postings.items()}
+                station_search = old['station_search']
+                if station_search.ranking(importance) != station_search.rank: station_search = StationSearch(station_coordinates, importance)
+                timetable = dict(old, trains=trains, station_index=station_index, station_search=station_search)
+            timetable['checksum'] = checksum
+            resized = {(train_no, class_code) for train_no in removed + changed for class_code, class_info in old_trains[train_no]['classes'].items()
+                       if trains.get(train_no, {}).get('classes', {}).get(class_code, {}).get('seats') != class_info['seats']}
+            with self._inventory_lock:
+                self.seat_calendar.trains = trains
+                self.seat_calendar.drop(resized)
+            self._timetable = timetable
+            self._journey_planner = None
+            if stations_changed: self._distance_table, self._reserved_fares = None, {}
+            for key in [key for key in list(self._reserved_fares) if key[0] in removed or key[0] in changed]: self._reserved_fares.pop(key, None)
+            self.admission.invalidate()
+        return {'added': len(added), 'removed': len(removed), 'changed': len(changed), 'stations_changed': stations_changed}
+
+    @classmethod
+    def build_timetable(cls, trains_path, stations_path):
+        return cls._index_timetable(cls._load_trains_from_csv(trains_path), cls._load_station_coordinates(stations_path))
+
+    @classmethod
+    def _index_timetable(cls, trains, station_coordinates):
+        station_index = StationIndex(trains, station_coordinates)
+        return {
+            'trains': trains,
+            'station_coordinates': station_coordinates,
+            'station_codes': cls._generate_station_codes(station_coordinates),
+            'station_index': station_index,
+            'station_search': StationSearch(station_coordinates, {code: len(serving) for code, serving in station_index.postings.items()}),
+        }
+
+    @staticmethod
+    def _load_trains_from_csv(trains_path):
         trains_data = {}
         try:
             # IMPORTANT: Make sure this points to the new trains_with_codes.csv or your updated trains.csv
-            with open('trains.csv', mode='r', newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
+            with open(trains_path, mode='r', newline='', encoding='utf-8') as file:
+                # Plain rows picked by the header's column positions: a dict per
+                # row was most of the time spent reloading a large timetable.
+                reader = csv.reader(file)
+                column = {name: i for i, name in enumerate(next(reader, []))}
+                fields = itemgetter(*(column[name] for name in ('train_no', 'train_name', 'source', 'destination', 'departure', 'arrival', 'class_code', 'class_name', 'seats')))
+                stops_column = column.get('stops')
                 for row in reader:
-                    train_no = row['train_no']
+                    if not row: continue
+                    train_no, train_name, source, destination, departure, arrival, class_code, class_name, seats = fields(row)
                     if train_no not in trains_data:
-                        trains_data[train_no] = {'details': [row['train_name'], row['source'], row['destination'], row['departure'], row['arrival']], 'classes': {}}
-                    trains_data[train_no]['classes'][row['class_code']] = {'name': row['class_name'], 'seats': int(row['seats'])}
+                        trains_data[train_no] = {'details': [train_name, source, destination, departure, arrival], 'classes': {}}
+                        # Optional '|'-separated intermediate stop codes.
+                        stops = row[stops_column] if stops_column is not None and stops_column < len(row) else ''
+                        if stops:
+                            trains_data[train_no]['stops'] = [source] + stops.split('|') + [destination]
+                    trains_data[train_no]['classes'][class_code] = {'name': class_name, 'seats': int(seats)}
         except FileNotFoundError: return {}
         return trains_data
 
-    def _load_station_coordinates(self):
+    @staticmethod
+    def _load_station_coordinates(stations_path):
         coordinates = {}
         try:
-            with open('station_coordinates.csv', mode='r', newline='', encoding='utf-8') as file:
+            with open(stations_path, mode='r', newline='', encoding='utf-8') as file:
                 reader = csv.DictReader(file)
                 for row in reader:
                     coordinates[row['station_code']] = {'name': row['station_name'], 'lat': float(row['latitude']), 'lon': float(row['longitude'])}
         except FileNotFoundError: return {}
         return coordinates
 
-    def _generate_station_codes(self):
+    @staticmethod
+    def _generate_station_codes(station_coordinates):
         codes = {}
-        for code, data in self._station_coordinates.items():
+        for code, data in station_coordinates.items():
             codes[data['name'].lower()] = code
             codes[code.lower()] = code
         return codes
     
-    def _generate_berth_inventory(self):
-        inventory = {}
-        berth_types = ['LB', 'MB', 'UB', 'SLB', 'SUB']
-        for train_no, train_data in self.trains.items():
-            inventory[train_no] = {}
-            for class_code, class_info in train_data['classes'].items():
-                inventory[train_no][class_code] = {}
-                seats_per_coach = 72 if class_code == 'SL' else 64
-                num_coaches = math.ceil(class_info['seats'] / seats_per_coach)
-                for i in range(1, num_coaches + 1):
-                    coach_name = f"{class_code.replace('A', '')}{i}"
-                    inventory[train_no][class_code][coach_name] = []
-                    for seat_num in range(1, seats_per_coach + 1):
-                        berth_info = {'number': seat_num, 'type': random.choice(berth_types)}
-                        inventory[train_no][class_code][coach_name].append(berth_info)
-        return inventory
-
-    def allocate_berths(self, train_no, travel_class, passengers):
-        if train_no not in self.berth_inventory or travel_class not in self.berth_inventory[train_no]:
+    def _seats_per_coach(self, class_code):
+        return 72 if class_code == 'SL' else 64
+
+    def _build_seat_inventory(self, class_code, seats):
+        return SeatInventory(class_code, seats, self._seats_per_coach(class_code))
+
+    def _sync_berth_inventory(self, conn):
+        # Replays berths booked or freed by other workers since this one last
+        # looked. Dates not loaded here yet are read from berth_allocations later.
+        # Callers hold _inventory_lock, which writers keep for their whole
+        # transaction, so a replay never races this worker's own uncommitted claims.
+        events = self.store.berth_events_since(self._berth_event_seq, conn)
+        if events and events[0][0] > self._berth_event_seq + 1:
+            # The journal was compacted past this worker's position: reload
+            # every date from berth_allocations and follow the journal from here.
+            self.seat_calendar.clear()
+            self._berth_event_seq = events[-1][0]
+            return
+        for seq, train_no, travel_class, journey_date, coach, number, action in events:
+            inventory = self.seat_calendar.peek(train_no, travel_class, journey_date)
+            if inventory and action == 'ALLOCATE': inventory.claim(coach, number)
+            elif inventory and action == 'RELEASE': inventory.release(coach, number)
+            self._berth_event_seq = seq
+
+    def _refresh_inventory(self):
+        # Replays the journal for readers, under _inventory_lock, so counters
+        # include what other workers booked and freed.
+        with self.store.connect() as conn:
+            self._sync_berth_inventory(conn)
+
+    def compact_journal(self, now=None):
+        # Trims berth_events to its last JOURNAL_KEEP events, at most every
+        # COMPACT_INTERVAL seconds unless a backlog is left; piggybacked on
+        # bookings and cancellations. Returns the events deleted.
+        now = now or time.time()
+        if now < self._next_compact: return 0
+        deleted = self.store.compact_berth_events(self.JOURNAL_KEEP, self.COMPACT_BATCH)
+        self._next_compact = now + (0 if deleted == self.COMPACT_BATCH else self.COMPACT_INTERVAL)
+        return deleted
+
+    def _allocated_berths(self, passengers):
+        berths = []
+        for passenger in passengers:
+            berth = passenger['berth']
+            number = berth.rstrip(string.ascii_uppercase)
+            berths.append((passenger['coach'], int(number), berth[len(number):]))
+        return berths
+
+    def _release_berths(self, train_no, travel_class, journey_date, passengers):
+        inventory = self.seat_calendar.get(train_no, travel_class, journey_date)
+        for coach, number, berth_type in self._allocated_berths(passengers):
+            inventory.release(coach, number, berth_type)
+
+    @timed('allocate_berths')
+    def allocate_berths(self, train_no, travel_class, passengers, journey_date):
+        inventory = self.seat_calendar.get(train_no, travel_class, journey_date)
+        if inventory is None:
             return None
-        available_berths = self.berth_inventory[train_no][travel_class]
-        updated_passengers = []
-        seniors = [p for p in passengers if int(p.get('age', 0)) >= 60]
-        others = [p for p in passengers if int(p.get('age', 0)) < 60]
-        for senior in seniors:
-            allocated = False
-            for coach, berths in available_berths.items():
-                for i, berth in enumerate(berths):
-                    if berth['type'] == 'LB':
-                        senior['coach'] = coach
-                        senior['berth'] = f"{berth['number']}{berth['type']}"
-                        updated_passengers.append(senior)
-                        del berths[i]
-                        allocated = True; break
-                if allocated: break
-            if not allocated: return None
-        for passenger in others:
-            allocated = False
-            preference = passenger.get('preference')
-            for coach, berths in available_berths.items():
-                for i, berth in enumerate(berths):
-                    if berth['type'] == preference:
-                        passenger['coach'] = coach
-                        passenger['berth'] = f"{berth['number']}{berth['type']}"
-                        updated_passengers.append(passenger)
-                        del berths[i]
-                        allocated = True; break
-                if allocated: break
-            if not allocated:
-                for coach, berths in available_berths.items():
-                    if berths:
-                        berth = berths.pop(0)
-                        passenger['coach'] = coach
-                        passenger['berth'] = f"{berth['number']}{berth['type']}"
-                        updated_passengers.append(passenger)
-                        allocated = True; break
-            if not allocated: return None
+        return self._seat_passengers(inventory, passengers)
+
+    def _seat_passengers(self, inventory, passengers, coach=None):
+        # Seniors get lower berths, everyone else their preference or the first
+        # free berth; all of them or none. With coach, only within that coach.
+        # An age that is not a number (from a ticket stored before ages were
+        # checked) counts as under 60 rather than failing every promotion.
+        updated_passengers, taken = [], []
+        seniors = [p for p in passengers if str(p.get('age', '')).isdigit() and int(p['age']) >= 60]
+        others = [p for p in passengers if p not in seniors]
+        for i, passenger in enumerate(seniors + others):
+            if i < len(seniors): berth = inventory.take('LB', coach)
+            else: berth = inventory.take(passenger.get('preference'), coach) or inventory.take_first(coach)
+            if not berth:
+                for berth in taken: inventory.release(*berth)
+                for allocated in updated_passengers: allocated.pop('coach', None); allocated.pop('berth', None)
+                return None
+            passenger['coach'], number, berth_type = berth
+            passenger['berth'] = f"{number}{berth_type}"
+            updated_passengers.append(passenger); taken.append(berth)
         return updated_passengers
 
+    @timed('calculate_reserved_fare')
     def calculate_reserved_fare(self, train_no, travel_class, num_passengers):
-        fare_rates = {'1A': 4.5, '2A': 2.5, '3A': 1.8, 'SL': 0.8, 'EC': 2.2, 'CC': 1.5, '2S': 0.6}
-        train = self.trains.get(train_no)
-        if not train: return 0
-        source_name = train['details'][1].split('(')[0].strip()
-        dest_name = train['details'][2].split('(')[0].strip()
-        distance = self.get_distance(source_name, dest_name)
-        rate = fare_rates.get(travel_class, 1.0)
-        if not distance: return 0
-        return round(distance * rate * num_passengers, 2)
+        key = (train_no, travel_class)
+        if key not in self._reserved_fares:
+            train = self.trains.get(train_no)
+            if not train: return 0
+            distance = self.get_distance(train['details'][1], train['details'][2])
+            self._reserved_fares[key] = distance * RESERVED_FARE_RATES.get(travel_class, 1.0) if distance else 0
+        return round(self._reserved_fares[key] * num_passengers, 2)
 
-    def get_station_list_for_autocomplete(self):
-        return sorted([f"{data['name']} ({code})" for code, data in self._station_coordinates.items()])
+    @property
+    def distance_table(self):
+        if self._distance_table is None:
+            # Imported here so numpy stays off the startup path.
+            from distance_table import DistanceTable
+            self._distance_table = DistanceTable(self._station_coordinates, self.distances_path)
+        return self._distance_table
 
     def get_distance(self, source_station, dest_station):
-        try:
-            source_code = self._station_codes.get(source_station.lower())
-            dest_code = self._station_codes.get(dest_station.lower())
-            if not source_code or not dest_code: return None
-            source_coords = self._station_coordinates[source_code]
-            dest_coords = self._station_coordinates[dest_code]
-            lat1, lon1 = source_coords['lat'], source_coords['lon']
-            lat2, lon2 = dest_coords['lat'], dest_coords['lon']
-            R = 6371; lat1_rad, lat2_rad = math.radians(lat1), math.radians(lat2)
-            delta_lat = math.radians(lat2 - lat1); delta_lon = math.radians(lon2 - lon1)
-            a = math.sin(delta_lat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2)**2
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-            return int(R * c)
-        except KeyError: return None
+        source_code = self.station_index.resolve(source_station)
+        dest_code = self.station_index.resolve(dest_station)
+        if not source_code or not dest_code: return None
+        return self.distance_table.get(source_code, dest_code)
 
     def calculate_unreserved_fare(self, train_type, distance, adults, children):
-        fares = {'MAIL': {'adult': 0.36, 'child': 0.18}, 'ORDINARY': {'adult': 0.19, 'child': 0.10}, 'SUPERFAST': {'adult': 0.39, 'child': 0.22}}
-        rate = fares.get(train_type)
+        rate = UNRESERVED_FARE_RATES.get(train_type)
         if not rate: return 0
         return round((adults * rate['adult'] * distance) + (children * rate['child'] * distance), 2)
 
     def calculate_mst_fare(self, source_station, dest_station):
         distance = self.get_distance(source_station, dest_station)
         if not distance: return None
-        return round(distance * 0.36 * 30, 2)
+        return round(distance * UNRESERVED_FARE_RATES['MAIL']['adult'] * MST_JOURNEYS, 2)
 
     def _generate_pnr(self):
         while True:
             pnr = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
             if pnr not in self.booked_tickets: return pnr
 
+    def plan_journeys(self, source, destination, depart_after=None):
+        source_code, destination_code = self.station_index.resolve(source), self.station_index.resolve(destination)
+        if not source_code or not destination_code: return []
+        if self._journey_planner is None:
+            leg_fares = {train_no: min(self.calculate_reserved_fare(train_no, class_code, 1) for class_code in train_data['classes'])
+                         for train_no, train_data in self.trains.items()}
+            self._journey_planner = JourneyPlanner(self.trains, leg_fares)
+        if depart_after is None:
+            now = datetime.now(); depart_after = now.hour * 60 + now.minute
+        return self._journey_planner.plan(source_code, destination_code, depart_after)
+
+    @timed('find_trains')
     def find_trains(self, source, destination):
-        found_trains = {}
+        found_trains, timetable = {}, self._timetable
         if not source or not destination: return found_trains
-        source_lower, destination_lower = source.lower(), destination.lower()
-        for train_no, train_data in self.trains.items():
-            train_source, train_destination = train_data['details'][1].lower(), train_data['details'][2].lower()
-            if source_lower in train_source and destination_lower in train_destination:
-                found_trains[train_no] = train_data
+        for train_no in timetable['station_index'].trains_between(source, destination):
+            found_trains[train_no] = timetable['trains'][train_no]
         return found_trains
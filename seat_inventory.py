@@ -0,0 +1,215 @@
+import heapq
+import math
+from datetime import date, timedelta
+
+BERTH_TYPES = ['LB', 'MB', 'UB', 'SLB', 'SUB']
+BOOKING_WINDOW_DAYS = 120
+
+# Berth order inside one bay, repeated down the coach.
+BAY_LAYOUTS = {
+    '1A': ['LB', 'UB', 'LB', 'UB'],
+    '2A': ['LB', 'UB', 'LB', 'UB', 'SLB', 'SUB'],
+}
+DEFAULT_BAY_LAYOUT = ['LB', 'MB', 'UB', 'LB', 'MB', 'UB', 'SLB', 'SUB']
+
+_coach_layouts = {}
+_empty_states = {}
+
+
+def coach_layout(class_code, seats_per_coach):
+    # One shared bytes object of berth-type codes per (class, coach size).
+    key = (class_code, seats_per_coach)
+    if key not in _coach_layouts:
+        bay = BAY_LAYOUTS.get(class_code, DEFAULT_BAY_LAYOUT)
+        codes = bytes(BERTH_TYPES.index(bay[seat % len(bay)]) for seat in range(seats_per_coach))
+        offsets = [[seat for seat in range(seats_per_coach) if codes[seat] == code] for code in range(len(BERTH_TYPES))]
+        _coach_layouts[key] = (codes, offsets)
+    return _coach_layouts[key]
+
+
+def empty_state(class_code, seats, seats_per_coach):
+    # Free-seat bitmap and per-type free counts of an empty train, shared by
+    # every date's inventory of the same class and size.
+    key = (class_code, seats, seats_per_coach)
+    if key not in _empty_states:
+        _, offsets_by_type = coach_layout(class_code, seats_per_coach)
+        num_coaches = math.ceil(seats / seats_per_coach)
+        # Seats past the declared count in the last coach are never free.
+        bits = bytearray(b'\xff' * (seats // 8) + (bytes([(1 << (seats % 8)) - 1]) if seats % 8 else b''))
+        bits.extend(bytes(math.ceil(num_coaches * seats_per_coach / 8) - len(bits)))
+        full_coaches, last_coach = divmod(seats, seats_per_coach)
+        counts = [len(offsets) * full_coaches + sum(1 for offset in offsets if offset < last_coach) for offsets in offsets_by_type]
+        _empty_states[key] = (bytes(bits), counts)
+    return _empty_states[key]
+
+
+class SeatInventory:
+    # Free berths of one train/class. Berth types come from the coach layout, a
+    # bitmap marks free seats and each berth type hands out seats in (coach,
+    # seat number) order from a cursor, with released seats kept in a small heap.
+    __slots__ = ('coach_prefix', 'seats', 'num_coaches', 'seats_per_coach', '_types', '_offsets',
+                 '_free_bits', '_free_counts', '_cursors', '_released')
+
+    def __init__(self, class_code, seats, seats_per_coach):
+        self.coach_prefix = class_code.replace('A', '')
+        self.seats = seats
+        self.num_coaches = math.ceil(seats / seats_per_coach)
+        self.seats_per_coach = seats_per_coach
+        self._types, self._offsets = coach_layout(class_code, seats_per_coach)
+        free_bits, free_counts = empty_state(class_code, seats, seats_per_coach)
+        self._free_bits = bytearray(free_bits)
+        self._free_counts = free_counts[:]
+        self._cursors = [0] * len(BERTH_TYPES)
+        # Per-type heaps, created on the first release.
+        self._released = None
+
+    @property
+    def coaches(self):
+        return [f"{self.coach_prefix}{i}" for i in range(1, self.num_coaches + 1)]
+
+    def berth_type(self, number):
+        return BERTH_TYPES[self._types[number - 1]]
+
+    def is_free(self, coach, number):
+        return self._is_free(self._index(coach, number))
+
+    def take(self, berth_type, coach=None):
+        # With coach, only that coach's berths are considered.
+        if berth_type not in BERTH_TYPES: return None
+        code = BERTH_TYPES.index(berth_type)
+        index = self._next_free(code) if coach is None else self._next_free_in(coach, self._offsets[code])
+        if index is None: return None
+        return self._claim(index)
+
+    def take_first(self, coach=None):
+        if coach is not None:
+            index = self._next_free_in(coach, range(self.seats_per_coach))
+            return None if index is None else self._claim(index)
+        candidates = [index for index in map(self._next_free, range(len(BERTH_TYPES))) if index is not None]
+        if not candidates: return None
+        return self._claim(min(candidates))
+
+    def claim(self, coach, number):
+        # Marks one specific seat as taken, e.g. a berth booked by another worker.
+        index = self._index(coach, number)
+        # Past the end of a train whose class was made smaller.
+        if index >= self.seats or not self._is_free(index): return False
+        self._claim(index)
+        return True
+
+    def release(self, coach, number, berth_type=None):
+        index = self._index(coach, number)
+        if index >= self.seats or self._is_free(index): return
+        self._free_bits[index >> 3] |= 1 << (index & 7)
+        self._free_counts[self._types[number - 1]] += 1
+        if self._released is None: self._released = [[] for _ in BERTH_TYPES]
+        heapq.heappush(self._released[self._types[number - 1]], index)
+
+    def free_count(self, coach=None):
+        if coach is None: return sum(self._free_counts)
+        start = self._index(coach, 1)
+        coach_bits = int.from_bytes(self._free_bits[start >> 3:(start + self.seats_per_coach + 7) >> 3], 'little') >> (start & 7)
+        return (coach_bits & ((1 << self.seats_per_coach) - 1)).bit_count()
+
+    def availability(self):
+        return dict(zip(BERTH_TYPES, self._free_counts))
+
+    def _index(self, coach, number):
+        return (int(coach[len(self.coach_prefix):]) - 1) * self.seats_per_coach + number - 1
+
+    def _is_free(self, index):
+        return bool(self._free_bits[index >> 3] & (1 << (index & 7)))
+
+    def _next_free(self, code):
+        # Seats claimed out of order are skipped lazily, so both the cursor and
+        # the released heap may point at taken seats until they are looked at.
+        if not self._free_counts[code]: return None
+        released, offsets = self._released[code] if self._released else (), self._offsets[code]
+        while released and not self._is_free(released[0]): heapq.heappop(released)
+        index, limit = None, len(offsets) * self.num_coaches
+        while self._cursors[code] < limit:
+            cursor = self._cursors[code]
+            index = (cursor // len(offsets)) * self.seats_per_coach + offsets[cursor % len(offsets)]
+            if self._is_free(index): break
+            self._cursors[code] += 1; index = None
+        if released and (index is None or released[0] < index): return released[0]
+        return index
+
+    def _next_free_in(self, coach, offsets):
+        # First free seat among offsets (ascending) of one coach, by scanning it.
+        start = self._index(coach, 1)
+        return next((start + offset for offset in offsets if self._is_free(start + offset)), None)
+
+    def _claim(self, index):
+        self._free_bits[index >> 3] &= ~(1 << (index & 7))
+        coach, seat = divmod(index, self.seats_per_coach)
+        self._free_counts[self._types[seat]] -= 1
+        return f"{self.coach_prefix}{coach + 1}", seat + 1, BERTH_TYPES[self._types[seat]]
+
+
+class InventoryCalendar:
+    # One SeatInventory per (train, class, journey date). A date's inventory is
+    # built the first time it is touched, from the allocations already stored
+    # for it, and dropped once the date has passed.
+
+    def __init__(self, trains, build, load_allocations, window_days=BOOKING_WINDOW_DAYS):
+        self.trains = trains
+        self.build = build
+        self.load_allocations = load_allocations
+        self.window_days = window_days
+        self._inventories = {}
+        self._today = None
+
+    def window(self):
+        today = date.today()
+        if today != self._today:
+            self._evict_before(today)
+        return today.isoformat(), (today + timedelta(days=self.window_days)).isoformat()
+
+    def normalize(self, journey_date):
+        # journey_date as 'YYYY-MM-DD' when it is an ISO date inside the
+        # window, else None. Inventories and allocations are keyed by this
+        # string, so one day must never be spelt two ways.
+        try: day = date.fromisoformat(journey_date).isoformat()
+        except (TypeError, ValueError): return None
+        first, last = self.window()
+        return day if first <= day <= last else None
+
+    def in_window(self, journey_date):
+        return journey_date is not None and self.normalize(journey_date) == journey_date
+
+    def get(self, train_no, travel_class, journey_date):
+        if not self.in_window(journey_date):
+            return None
+        key = (train_no, travel_class, journey_date)
+        inventory = self._inventories.get(key)
+        if inventory is None:
+            class_info = self.trains.get(train_no, {}).get('classes', {}).get(travel_class)
+            if class_info is None:
+                return None
+            inventory = self.build(travel_class, class_info['seats'])
+            for coach, number in self.load_allocations(train_no, travel_class, journey_date):
+                inventory.claim(coach, number)
+            self._inventories[key] = inventory
+        return inventory
+
+    def drop(self, classes):
+        # Drops every date's inventory of the (train_no, travel_class) pairs in classes.
+        for key in list(self._inventories):
+            if key[:2] in classes: self._inventories.pop(key, None)
+
+    def clear(self):
+        # Drops every loaded inventory; each is rebuilt from storage when next touched.
+        self._inventories.clear()
+
+    def peek(self, train_no, travel_class, journey_date):
+        return self._inventories.get((train_no, travel_class, journey_date))
+
+    def _evict_before(self, today):
+        cutoff = today.isoformat()
+        for key in [key for key in self._inventories if key[2] < cutoff]:
+            del self._inventories[key]
+        self._today = today
+
+    def __len__(self):
+        return len(self._inventories)
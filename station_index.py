@@ -0,0 +1,159 @@
+import copy
+import heapq
+import re
+from bisect import bisect_left
+
+CODE_IN_PARENS = re.compile(r'\(([A-Za-z0-9]+)\)\s*$')
+
+
+def normalize_station(text):
+    text = re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip()
+    return re.sub(r'\bjunction\b', 'jn', text)
+
+
+def train_stops(train_data):
+    return train_data.get('stops') or [train_data['details'][1], train_data['details'][2]]
+
+
+class StationIndex:
+    # Posting lists of station code -> {train_no: stop position}, plus every
+    # normalized name/code alias -> station code, built once at load time.
+
+    def __init__(self, trains, station_coordinates):
+        self.aliases = {}
+        self.exact = {}
+        self.postings = {}
+        for code, data in station_coordinates.items():
+            self._add_alias(code, code)
+            self._add_alias(data['name'], code)
+        for train_no, train_data in trains.items():
+            for position, code in enumerate(train_stops(train_data)):
+                self.postings.setdefault(code, {}).setdefault(train_no, position)
+                self._add_alias(code, code)
+
+    def _add_alias(self, alias, code):
+        self.exact.setdefault(alias, code)
+        normalized = normalize_station(alias)
+        self.aliases.setdefault(normalized, code)
+        if normalized.endswith(' jn'):
+            self.aliases.setdefault(normalized[:-3], code)
+
+    def updated(self, old_trains, trains, train_nos):
+        # A copy with the postings of train_nos re-read from trains (dropped
+        # when gone from it); postings they do not touch are shared with this index.
+        index = copy.copy(self)
+        index.aliases, index.exact, index.postings = dict(self.aliases), dict(self.exact), dict(self.postings)
+        copied = set()
+        def serving(code):
+            if code not in copied: index.postings[code] = dict(index.postings.get(code, {})); copied.add(code)
+            return index.postings[code]
+        for train_no in train_nos:
+            if train_no in old_trains:
+                for code in train_stops(old_trains[train_no]): serving(code).pop(train_no, None)
+            if train_no in trains:
+                for position, code in enumerate(train_stops(trains[train_no])):
+                    serving(code).setdefault(train_no, position)
+                    index._add_alias(code, code)
+        for code in copied:
+            if not index.postings[code]: del index.postings[code]
+        return index
+
+    def resolve(self, query):
+        if not query: return None
+        if query in self.exact: return self.exact[query]
+        match = CODE_IN_PARENS.search(query)
+        if match and normalize_station(match.group(1)) in self.aliases:
+            return self.aliases[normalize_station(match.group(1))]
+        return self.aliases.get(normalize_station(query))
+
+    def trains_serving(self, code):
+        return self.postings.get(code, {})
+
+    def trains_between(self, source, destination):
+        source_code, destination_code = self.resolve(source), self.resolve(destination)
+        if not source_code or not destination_code or source_code == destination_code: return []
+        from_stops, to_stops = self.trains_serving(source_code), self.trains_serving(destination_code)
+        if len(from_stops) <= len(to_stops):
+            return [train_no for train_no, position in from_stops.items() if to_stops.get(train_no, -1) > position]
+        return [train_no for train_no, position in to_stops.items() if from_stops.get(train_no, position) < position]
+
+
+class StationSearch:
+    # Autocomplete over a sorted array of (key, station code), where keys are
+    # normalized names, every name suffix starting at a word, and codes. A
+    # prefix is a bisect; short prefixes, which match too many keys to rank on
+    # the fly, have their top results precomputed. A query matching nothing is
+    # retried as its one-edit variants, so one typo is tolerated.
+
+    SHORT_PREFIX = 3
+    MAX_RESULTS = 10
+
+    def __init__(self, station_coordinates, importance):
+        self.names = {code: data['name'] for code, data in station_coordinates.items()}
+        self.rank = self.ranking(importance)
+        entries = set()
+        for code, name in self.names.items():
+            entries.add((code.lower(), code))
+            for key in {normalize_station(name), re.sub(r'[^a-z0-9]+', ' ', name.lower()).strip()}:
+                words = key.split()
+                entries.update((' '.join(words[i:]), code) for i in range(len(words)))
+        entries = sorted(entries)
+        self.keys = [key for key, _ in entries]
+        self.codes = [code for _, code in entries]
+        short = {}
+        for key, code in entries:
+            for length in range(1, min(len(key), self.SHORT_PREFIX) + 1):
+                short.setdefault(key[:length], set()).add(code)
+        self._top = {prefix: heapq.nsmallest(self.MAX_RESULTS, codes, key=self.rank.__getitem__) for prefix, codes in short.items()}
+
+    def ranking(self, importance):
+        # Busiest stations first, then by name.
+        return {code: i for i, code in enumerate(sorted(self.names, key=lambda code: (-importance.get(code, 0), self.names[code])))}
+
+    def search(self, query, limit=8):
+        query = normalize_station(query or '')
+        limit = min(limit, self.MAX_RESULTS)
+        if not query: return []
+        codes = self._prefix(query, limit)
+        if not codes and len(query) >= self.SHORT_PREFIX:
+            fuzzy = {code for variant in self._edits(query) for code in self._prefix(variant, limit)}
+            codes = heapq.nsmallest(limit, fuzzy, key=self.rank.__getitem__)
+        return [{'code': code, 'name': self.names[code], 'label': f"{self.names[code]} ({code})"} for code in codes]
+
+    def _prefix(self, prefix, limit):
+        if len(prefix) <= self.SHORT_PREFIX:
+            return self._top.get(prefix, [])[:limit]
+        start = bisect_left(self.keys, prefix)
+        if start == len(self.keys) or not self.keys[start].startswith(prefix): return []
+        end = bisect_left(self.keys, prefix + '\uffff', start)
+        return heapq.nsmallest(limit, set(self.codes[start:end]), key=self.rank.__getitem__)
+
+    def _has_prefix(self, prefix):
+        start = bisect_left(self.keys, prefix)
+        return start < len(self.keys) and self.keys[start].startswith(prefix)
+
+    def _next_chars(self, prefix):
+        # Distinct characters that follow prefix in some key, one bisect each.
+        chars, start, size = [], bisect_left(self.keys, prefix), len(prefix)
+        while start < len(self.keys) and self.keys[start].startswith(prefix):
+            if len(self.keys[start]) == size: start += 1; continue
+            char = self.keys[start][size]; chars.append(char)
+            start = bisect_left(self.keys, prefix + chr(ord(char) + 1), start)
+        return chars
+
+    def _edits(self, word):
+        # The typo sits at or before the first position where word stops
+        # matching any key, and inserted/substituted characters must continue
+        # a known prefix, which keeps the variants to a few dozen.
+        low, high = 0, len(word)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._has_prefix(word[:middle]): low = middle
+            else: high = middle - 1
+        for i in range(low + 1):
+            left, right = word[:i], word[i:]
+            if right: yield left + right[1:]
+            if len(right) > 1: yield left + right[1] + right[0] + right[2:]
+            for char in self._next_chars(left):
+                if right: yield left + char + right[1:]
+                yield left + char + right
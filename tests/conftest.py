@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from reservation_system import RailwayReservationSystem
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'railway.db')
+
+
+@pytest.fixture
+def system(db_path):
+    return RailwayReservationSystem(db_path=db_path, snapshot_path=None)
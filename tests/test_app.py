@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    os.environ.setdefault('GOOGLE_CLIENT_ID', 'test')
+    os.environ.setdefault('GOOGLE_CLIENT_SECRET', 'test')
+    os.environ['RAILONE_DB'] = str(tmp_path_factory.mktemp('app') / 'railone.db')
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    client.post('/signup', data={'name': 'tester', 'password': 'secret'})
+    client.post('/login', data={'name': 'tester', 'password': 'secret'})
+    return client
+
+
+def test_passenger_details_reject_an_age_that_is_not_a_number(app_module, client):
+    pending = len(app_module.system.pending_tickets)
+    response = client.post('/book/details/12951', data={'travel_class': '3A', 'name_0': 'A', 'age_0': 'x', 'gender_0': 'M'})
+    assert response.status_code == 200
+    assert b'Age must be a whole number.' in response.data
+    assert len(app_module.system.pending_tickets) == pending
@@ -0,0 +1,161 @@
+import random
+
+import pytest
+
+from reservation_system import RailwayReservationSystem
+from seat_inventory import BERTH_TYPES
+
+
+def party(size, age=30, preference='ANY'):
+    return [{'name': f'P{i}', 'age': str(age), 'gender': 'F', 'preference': preference} for i in range(size)]
+
+
+def recount(inventory):
+    counts = dict.fromkeys(BERTH_TYPES, 0)
+    for index in range(inventory.num_coaches * inventory.seats_per_coach):
+        coach, seat = divmod(index, inventory.seats_per_coach)
+        if inventory.is_free(f"{inventory.coach_prefix}{coach + 1}", seat + 1):
+            counts[inventory.berth_type(seat + 1)] += 1
+    return counts
+
+
+def test_random_book_cancel_keeps_counters_consistent(system):
+    rng = random.Random(5)
+    targets = [('12951', '1A'), ('12951', '3A'), ('12301', '2A')]
+    journey_date = system.default_journey_date()
+    booked = []
+    for step in range(1500):
+        if booked and rng.random() < 0.4:
+            system.cancel_ticket(booked.pop(rng.randrange(len(booked))))
+        else:
+            train_no, travel_class = rng.choice(targets)
+            passengers = party(rng.randint(1, 4), rng.choice([25, 40, 65]), rng.choice(BERTH_TYPES + ['ANY']))
+            pnr = system._generate_pnr()
+            if system.book_ticket_logic(pnr, train_no, travel_class, passengers, 1, journey_date): booked.append(pnr)
+        if step % 100 == 0:
+            for train_no, travel_class in targets:
+                inventory = system.seat_calendar.get(train_no, travel_class, journey_date)
+                allocated = len(system.store.allocations_for(train_no, travel_class, journey_date))
+                assert inventory.availability() == recount(inventory), (train_no, travel_class, step)
+                assert inventory.free_count() == inventory.seats - allocated, (train_no, travel_class, step)
+
+
+def test_availability_includes_other_workers_bookings(system, db_path):
+    other = RailwayReservationSystem(db_path=db_path, snapshot_path=None)
+    journey_date = system.default_journey_date()
+    seats = system.trains['12951']['classes']['3A']['seats']
+    # other holds the class in memory once it has booked on it.
+    assert other.book_ticket_logic(other._generate_pnr(), '12951', '3A', party(1), 1, journey_date)['status'] == 'BOOKED'
+    for _ in range(5):
+        assert system.book_ticket_logic(system._generate_pnr(), '12951', '3A', party(2), 1, journey_date)['status'] == 'BOOKED'
+    assert other.get_availability(['12951'], journey_date)['12951']['3A'] == seats - 11
+    assert other.get_availability_by_type('12951', journey_date)['3A']['available'] == seats - 11
+
+
+def sell_lower_berths(system, journey_date, train_no='12951', travel_class='3A'):
+    # Books parties of four seniors until every lower berth is taken.
+    inventory = system.seat_calendar.get(train_no, travel_class, journey_date)
+    while inventory.availability()['LB'] >= 4:
+        assert system.book_ticket_logic(system._generate_pnr(), train_no, travel_class, party(4, 65), 1, journey_date)['status'] == 'BOOKED'
+    while inventory.availability()['LB']:
+        assert system.book_ticket_logic(system._generate_pnr(), train_no, travel_class, party(1, 65), 1, journey_date)['status'] == 'BOOKED'
+    return inventory
+
+
+def test_waitlisted_senior_does_not_block_other_bookings(system):
+    journey_date = system.default_journey_date()
+    inventory = sell_lower_berths(system, journey_date)
+    free = inventory.free_count()
+    assert free
+    senior = system.book_ticket_logic(system._generate_pnr(), '12951', '3A', party(1, 65), 1, journey_date)
+    assert senior['status'] == 'WAITLISTED'
+    ticket = system.book_ticket_logic(system._generate_pnr(), '12951', '3A', party(2), 1, journey_date)
+    assert ticket['status'] == 'BOOKED'
+    assert system.get_availability(['12951'], journey_date)['12951']['3A'] == free - 2
+    assert system.remaining_capacity('12951', '3A', journey_date) > free - 2
+
+
+def test_promotion_skips_a_party_the_free_berths_cannot_seat(system):
+    journey_date = system.default_journey_date()
+    inventory = sell_lower_berths(system, journey_date)
+    senior = system.book_ticket_logic(system._generate_pnr(), '12951', '3A', party(1, 65), 1, journey_date)
+    booked = []
+    while inventory.free_count():
+        booked.append(system.book_ticket_logic(system._generate_pnr(), '12951', '3A', party(1), 1, journey_date))
+        assert booked[-1]['status'] == 'BOOKED'
+    behind = system.book_ticket_logic(system._generate_pnr(), '12951', '3A', party(1), 1, journey_date)
+    assert (senior['status'], behind['status']) == ('WAITLISTED', 'WAITLISTED')
+    system.cancel_ticket(booked[-1]['pnr'])
+    assert system.booked_tickets.get(senior['pnr'])['status'] == 'WAITLISTED'
+    assert system.booked_tickets.get(behind['pnr'])['status'] == 'BOOKED'
+
+
+def test_failed_cancel_leaves_inventory_and_tickets_unchanged(system, monkeypatch):
+    journey_date = system.default_journey_date()
+    inventory = system.seat_calendar.get('12951', '1A', journey_date)
+    booked = []
+    while inventory.free_count():
+        booked.append(system.book_ticket_logic(system._generate_pnr(), '12951', '1A', party(1), 1, journey_date))
+        assert booked[-1]['status'] == 'BOOKED'
+    waitlisted = system.book_ticket_logic(system._generate_pnr(), '12951', '1A', party(1), 1, journey_date)
+    assert waitlisted['status'] == 'WAITLISTED'
+
+    def fail(*args, **kwargs): raise RuntimeError('disk on fire')
+    monkeypatch.setattr(system.store, 'waitlist_head', fail)
+    with pytest.raises(RuntimeError):
+        system.cancel_ticket(booked[0]['pnr'])
+    monkeypatch.undo()
+    assert inventory.free_count() == 0
+    assert system.booked_tickets.get(booked[0]['pnr'])['status'] == 'BOOKED'
+    assert system.booked_tickets.get(waitlisted['pnr'])['status'] == 'WAITLISTED'
+    assert system.cancel_ticket(booked[0]['pnr'])
+    assert system.booked_tickets.get(waitlisted['pnr'])['status'] == 'BOOKED'
+    assert inventory.free_count() == 0
+
+
+def test_promotion_survives_a_stored_age_that_is_not_a_number(system):
+    journey_date = system.default_journey_date()
+    inventory = system.seat_calendar.get('12951', '1A', journey_date)
+    booked = []
+    while inventory.free_count():
+        booked.append(system.book_ticket_logic(system._generate_pnr(), '12951', '1A', party(1), 1, journey_date))
+        assert booked[-1]['status'] == 'BOOKED'
+    waitlisted = system.book_ticket_logic(system._generate_pnr(), '12951', '1A', party(1, 'x'), 1, journey_date)
+    assert waitlisted['status'] == 'WAITLISTED'
+    assert system.cancel_ticket(booked[0]['pnr'])
+    assert system.booked_tickets.get(waitlisted['pnr'])['status'] == 'BOOKED'
+
+
+def test_book_many_fails_only_the_invalid_request(system):
+    journey_date = system.default_journey_date()
+    requests = [(system._generate_pnr(), party(2), 1), (system._generate_pnr(), party(1, 'x'), 1), (system._generate_pnr(), party(3), 1)]
+    tickets = system.book_many('12951', '3A', journey_date, requests)
+    assert [ticket and ticket['status'] for ticket in tickets] == ['BOOKED', None, 'BOOKED']
+    inventory = system.seat_calendar.get('12951', '3A', journey_date)
+    assert inventory.free_count() == inventory.seats - len(system.store.allocations_for('12951', '3A', journey_date)) == inventory.seats - 5
+
+
+def test_failed_book_many_releases_the_batch_berths(system, monkeypatch):
+    journey_date = system.default_journey_date()
+    inventory = system.seat_calendar.get('12951', '3A', journey_date)
+    put, calls = system.booked_tickets.put, []
+
+    def put_then_fail(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 3: raise RuntimeError('disk on fire')
+        return put(*args, **kwargs)
+    monkeypatch.setattr(system.booked_tickets, 'put', put_then_fail)
+    with pytest.raises(RuntimeError):
+        system.book_many('12951', '3A', journey_date, [(system._generate_pnr(), party(2), 1) for _ in range(4)])
+    assert system.store.allocations_for('12951', '3A', journey_date) == []
+    assert inventory.free_count() == inventory.seats
+    assert inventory.availability() == recount(inventory)
+
+
+def test_remaining_capacity_includes_other_workers_bookings(system, db_path):
+    other = RailwayReservationSystem(db_path=db_path, snapshot_path=None)
+    journey_date = system.default_journey_date()
+    before = other.remaining_capacity('12951', '3A', journey_date)
+    for _ in range(5):
+        system.book_ticket_logic(system._generate_pnr(), '12951', '3A', party(2), 1, journey_date)
+    assert other.remaining_capacity('12951', '3A', journey_date) == before - 10
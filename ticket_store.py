@@ -0,0 +1,377 @@
+import json
+import sqlite3
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from db_pool import ConnectionPool
+
+TICKET_TABLES = {
+    'reserved_tickets': 'pnr',
+    'unreserved_tickets': 'ticket_id',
+    'platform_tickets': 'ticket_id',
+    'mst_tickets': 'ticket_id',
+    'pending_tickets': 'temp_id',
+}
+
+
+def ticket_times(ticket):
+    # (booked_at, journey_at) sort keys; journey_at only for tickets with a train departure.
+    booked_at = ticket.get('booking_date') or ticket.get('valid_from')
+    journey_at = None
+    if ticket.get('journey_date') and ticket.get('departure'):
+        journey_at = f"{ticket['journey_date']} {ticket['departure'].split(' ')[-1]}"
+    return booked_at, journey_at
+
+
+class TicketTable:
+    # Dict-like view of one ticket table; every read and write goes to SQLite so
+    # all worker processes see the same tickets.
+
+    def __init__(self, store, table):
+        self.store = store
+        self.table = table
+        self.key = TICKET_TABLES[table]
+
+    def get(self, key, default=None, conn=None):
+        with self.store.connect(conn) as c:
+            row = c.execute(f"SELECT data FROM {self.table} WHERE {self.key} = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put(self, key, ticket, conn=None):
+        with self.store.connect(conn) as c:
+            c.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({self.key}, user_id, status, booked_at, journey_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, ticket.get('user_id'), ticket.get('status'), *ticket_times(ticket), json.dumps(ticket))
+            )
+
+    def pop(self, key, default=None):
+        with self.store.transaction() as conn:
+            ticket = self.get(key, conn=conn)
+            if ticket is None: return default
+            conn.execute(f"DELETE FROM {self.table} WHERE {self.key} = ?", (key,))
+        return ticket
+
+    def for_user(self, user_id, limit, offset=0):
+        # Newest bookings first, one page at a time, via the (user_id, booked_at) index.
+        with self.store.connect() as c:
+            rows = c.execute(
+                f"SELECT data FROM {self.table} WHERE user_id = ? ORDER BY booked_at DESC LIMIT ? OFFSET ?", (user_id, limit, offset)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def iter_for_user(self, user_id, keys=None, chunk=500):
+        # The user's tickets oldest first, or those of keys that are the
+        # user's, read chunk rows at a time so any number of them streams.
+        if keys is not None:
+            for start in range(0, len(keys), chunk):
+                part = keys[start:start + chunk]
+                with self.store.connect() as c:
+                    rows = c.execute(
+                        f"SELECT data FROM {self.table} WHERE user_id = ? AND {self.key} IN ({', '.join('?' * len(part))}) ORDER BY rowid", (user_id, *part)
+                    ).fetchall()
+                yield from (json.loads(data) for (data,) in rows)
+            return
+        last = 0
+        while True:
+            with self.store.connect() as c:
+                rows = c.execute(f"SELECT rowid, data FROM {self.table} WHERE user_id = ? AND rowid > ? ORDER BY rowid LIMIT ?", (user_id, last, chunk)).fetchall()
+            if not rows: return
+            last = rows[-1][0]
+            yield from (json.loads(data) for _, data in rows)
+
+    def count_for_user(self, user_id):
+        with self.store.connect() as c:
+            return c.execute(f"SELECT COUNT(*) FROM {self.table} WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def next_journey(self, user_id, after):
+        # The user's earliest BOOKED journey departing after `after` ('YYYY-MM-DD HH:MM').
+        with self.store.connect() as c:
+            row = c.execute(
+                f"SELECT data FROM {self.table} WHERE user_id = ? AND status = 'BOOKED' AND journey_at > ? ORDER BY journey_at LIMIT 1", (user_id, after)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def items(self):
+        with self.store.connect() as c:
+            rows = c.execute(f"SELECT {self.key}, data FROM {self.table}").fetchall()
+        return [(key, json.loads(data)) for key, data in rows]
+
+    def values(self):
+        return [ticket for _, ticket in self.items()]
+
+    def __getitem__(self, key):
+        ticket = self.get(key)
+        if ticket is None: raise KeyError(key)
+        return ticket
+
+    def __setitem__(self, key, ticket):
+        self.put(key, ticket)
+
+    def __delitem__(self, key):
+        with self.store.connect() as c:
+            c.execute(f"DELETE FROM {self.table} WHERE {self.key} = ?", (key,))
+
+    def __contains__(self, key):
+        with self.store.connect() as c:
+            return c.execute(f"SELECT 1 FROM {self.table} WHERE {self.key} = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        with self.store.connect() as c:
+            return c.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def __bool__(self):
+        with self.store.connect() as c:
+            return c.execute(f"SELECT 1 FROM {self.table} LIMIT 1").fetchone() is not None
+
+
+class PendingTable(TicketTable):
+    # Checkout holds that expire ttl seconds after they are written. Expired
+    # rows are invisible to reads at once and deleted in expiry order through
+    # the expires_at index, piggybacked on writes at most every reap_interval.
+
+    RATE_WINDOW = 300
+
+    def __init__(self, store, table, ttl, reap_interval=30):
+        super().__init__(store, table)
+        self.ttl = ttl
+        self.reap_interval = reap_interval
+        self.expired_total = 0
+        self._next_reap = 0
+        self._reaped = deque()
+
+    def get(self, key, default=None, conn=None):
+        with self.store.connect(conn) as c:
+            row = c.execute(f"SELECT data FROM {self.table} WHERE {self.key} = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put(self, key, ticket, conn=None):
+        now = time.time()
+        with self.store.connect(conn) as c:
+            c.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({self.key}, user_id, status, expires_at, data) VALUES (?, ?, ?, ?, ?)",
+                (key, ticket.get('user_id'), ticket.get('status'), now + self.ttl, json.dumps(ticket))
+            )
+        if now >= self._next_reap: self.reap(now)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def reap(self, now=None):
+        now = now or time.time()
+        self._next_reap = now + self.reap_interval
+        with self.store.connect() as c:
+            expired = c.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,)).rowcount
+        self.expired_total += expired
+        self._reaped.append((now, expired))
+        while self._reaped and self._reaped[0][0] < now - self.RATE_WINDOW: self._reaped.popleft()
+        return expired
+
+    def _expiry_rate(self):
+        # Rows reaped per second over the reaps kept from the last RATE_WINDOW seconds.
+        if len(self._reaped) < 2: return 0.0
+        span = self._reaped[-1][0] - self._reaped[0][0]
+        return round(sum(count for _, count in list(self._reaped)[1:]) / span, 3) if span else 0.0
+
+    def stats(self):
+        with self.store.connect() as c:
+            live = c.execute(f"SELECT COUNT(*) FROM {self.table} WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+            page_size, page_count, free_pages = (c.execute(f"PRAGMA {pragma}").fetchone()[0] for pragma in ('page_size', 'page_count', 'freelist_count'))
+        return {
+            'pending_holds': live,
+            'expired_total': self.expired_total,
+            'expired_per_second': self._expiry_rate(),
+            'db_bytes_used': (page_count - free_pages) * page_size,
+        }
+
+
+class TicketStore:
+
+    def __init__(self, db_path, pool=None, pending_ttl=900):
+        self.db_path = db_path
+        self.pool = pool or ConnectionPool(db_path)
+        self._init_db()
+        self.reserved = TicketTable(self, 'reserved_tickets')
+        self.unreserved = TicketTable(self, 'unreserved_tickets')
+        self.platform = TicketTable(self, 'platform_tickets')
+        self.mst = TicketTable(self, 'mst_tickets')
+        self.pending = PendingTable(self, 'pending_tickets', pending_ttl)
+
+    def _init_db(self):
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            for table, key in TICKET_TABLES.items():
+                cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        {key} TEXT PRIMARY KEY,
+                        user_id INTEGER,
+                        status TEXT,
+                        booked_at TEXT,
+                        journey_at TEXT,
+                        expires_at REAL,
+                        data TEXT NOT NULL
+                    )
+                ''')
+                try:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN booked_at TEXT")
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN journey_at TEXT")
+                    cursor.execute(f'''
+                        UPDATE {table} SET
+                            booked_at = COALESCE(json_extract(data, '$.booking_date'), json_extract(data, '$.valid_from')),
+                            journey_at = json_extract(data, '$.journey_date') || ' ' || substr(json_extract(data, '$.departure'), -5)
+                    ''')
+                except sqlite3.OperationalError:
+                    pass
+                try:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN expires_at REAL")
+                except sqlite3.OperationalError:
+                    pass
+                cursor.execute(f"DROP INDEX IF EXISTS idx_{table}_user")
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_booked ON {table} (user_id, booked_at)")
+            # Holds written before they had a TTL expire on the next reap.
+            cursor.execute("UPDATE pending_tickets SET expires_at = 0 WHERE expires_at IS NULL")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_pending_tickets_expiry ON pending_tickets (expires_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_reserved_tickets_user_journey ON reserved_tickets (user_id, status, journey_at)")
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS berth_allocations (
+                    train_no TEXT NOT NULL,
+                    travel_class TEXT NOT NULL,
+                    journey_date TEXT NOT NULL DEFAULT '',
+                    coach TEXT NOT NULL,
+                    berth_number INTEGER NOT NULL,
+                    pnr TEXT NOT NULL
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_berth_allocations_pnr ON berth_allocations (pnr)")
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS berth_events (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    train_no TEXT NOT NULL,
+                    travel_class TEXT NOT NULL,
+                    journey_date TEXT NOT NULL DEFAULT '',
+                    coach TEXT NOT NULL,
+                    berth_number INTEGER NOT NULL,
+                    action TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS waitlist (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    train_no TEXT NOT NULL,
+                    travel_class TEXT NOT NULL,
+                    journey_date TEXT NOT NULL DEFAULT '',
+                    pnr TEXT UNIQUE NOT NULL,
+                    passengers INTEGER NOT NULL
+                )
+            ''')
+            for table in ('berth_allocations', 'berth_events', 'waitlist'):
+                try:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN journey_date TEXT NOT NULL DEFAULT ''")
+                except sqlite3.OperationalError:
+                    pass
+            # Seats and the waitlist queue are per journey date.
+            cursor.execute("DROP INDEX IF EXISTS idx_berth_allocations_seat")
+            cursor.execute("DROP INDEX IF EXISTS idx_waitlist_queue")
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_berth_allocations_date_seat ON berth_allocations (train_no, travel_class, journey_date, coach, berth_number)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_waitlist_date_queue ON waitlist (train_no, travel_class, journey_date, seq)")
+            conn.commit()
+
+    @contextmanager
+    def connect(self, conn=None):
+        # Reuses the caller's transaction when one is passed in; pooled
+        # connections are in autocommit mode otherwise.
+        yield conn if conn is not None else self.pool.connection()
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so allocations from
+        # different workers are serialized.
+        conn = self.pool.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK"); raise
+        conn.execute("COMMIT")
+
+    def berth_events_since(self, seq, conn=None):
+        with self.connect(conn) as c:
+            return c.execute(
+                "SELECT seq, train_no, travel_class, journey_date, coach, berth_number, action FROM berth_events WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+
+    def last_berth_event(self, conn=None):
+        with self.connect(conn) as c:
+            return c.execute("SELECT COALESCE(MAX(seq), 0) FROM berth_events").fetchone()[0]
+
+    def compact_berth_events(self, keep, limit, conn=None):
+        # Deletes up to limit of the oldest events, never the last keep; the
+        # seats they describe are already in berth_allocations.
+        with self.connect(conn) as c:
+            return c.execute(
+                "DELETE FROM berth_events WHERE seq <= MIN((SELECT MAX(seq) FROM berth_events) - ?, (SELECT MIN(seq) FROM berth_events) + ? - 1)", (keep, limit)
+            ).rowcount
+
+    def allocations_for(self, train_no, travel_class, journey_date, conn=None):
+        with self.connect(conn) as c:
+            return c.execute(
+                "SELECT coach, berth_number FROM berth_allocations WHERE train_no = ? AND travel_class = ? AND journey_date = ?",
+                (train_no, travel_class, journey_date)
+            ).fetchall()
+
+    def allocated_counts(self, journey_date, train_nos, conn=None):
+        # {(train_no, travel_class): berths allocated} on one date.
+        counts = {}
+        with self.connect(conn) as c:
+            for start in range(0, len(train_nos), 500):
+                chunk = train_nos[start:start + 500]
+                counts.update(((train_no, travel_class), count) for train_no, travel_class, count in c.execute(
+                    f"SELECT train_no, travel_class, COUNT(*) FROM berth_allocations WHERE train_no IN ({', '.join('?' * len(chunk))}) AND journey_date = ? GROUP BY train_no, travel_class",
+                    (*chunk, journey_date)
+                ))
+        return counts
+
+    def add_allocations(self, conn, pnr, train_no, travel_class, journey_date, berths):
+        conn.executemany(
+            "INSERT INTO berth_allocations (train_no, travel_class, journey_date, coach, berth_number, pnr) VALUES (?, ?, ?, ?, ?, ?)",
+            [(train_no, travel_class, journey_date, coach, number, pnr) for coach, number, _ in berths]
+        )
+        conn.executemany(
+            "INSERT INTO berth_events (train_no, travel_class, journey_date, coach, berth_number, action) VALUES (?, ?, ?, ?, ?, 'ALLOCATE')",
+            [(train_no, travel_class, journey_date, coach, number) for coach, number, _ in berths]
+        )
+
+    def release_allocations(self, conn, pnr):
+        berths = conn.execute("SELECT train_no, travel_class, journey_date, coach, berth_number FROM berth_allocations WHERE pnr = ?", (pnr,)).fetchall()
+        conn.execute("DELETE FROM berth_allocations WHERE pnr = ?", (pnr,))
+        conn.executemany(
+            "INSERT INTO berth_events (train_no, travel_class, journey_date, coach, berth_number, action) VALUES (?, ?, ?, ?, ?, 'RELEASE')", berths
+        )
+        return berths
+
+    def add_to_waitlist(self, conn, pnr, train_no, travel_class, journey_date, passengers):
+        conn.execute(
+            "INSERT INTO waitlist (train_no, travel_class, journey_date, pnr, passengers) VALUES (?, ?, ?, ?, ?)",
+            (train_no, travel_class, journey_date, pnr, passengers)
+        )
+
+    def remove_from_waitlist(self, conn, pnr):
+        conn.execute("DELETE FROM waitlist WHERE pnr = ?", (pnr,))
+
+    def waitlist_head(self, conn, train_no, travel_class, journey_date, limit, after_seq=0):
+        # (seq, pnr) of the first limit PNRs queued after after_seq, in order.
+        return conn.execute(
+            "SELECT seq, pnr FROM waitlist WHERE train_no = ? AND travel_class = ? AND journey_date = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (train_no, travel_class, journey_date, after_seq, limit)
+        ).fetchall()
+
+    def waitlisted_passengers(self, train_no, travel_class, journey_date, before_pnr=None, conn=None):
+        # Passengers queued on a train/class/date, or only those ahead of before_pnr.
+        query = "SELECT COALESCE(SUM(passengers), 0) FROM waitlist WHERE train_no = ? AND travel_class = ? AND journey_date = ?"
+        params = (train_no, travel_class, journey_date)
+        if before_pnr is not None:
+            query += " AND seq < (SELECT seq FROM waitlist WHERE pnr = ?)"
+            params += (before_pnr,)
+        with self.connect(conn) as c:
+            return c.execute(query, params).fetchone()[0]
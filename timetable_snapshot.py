@@ -0,0 +1,61 @@
+import hashlib
+import mmap
+import os
+import pickle
+import sys
+
+SNAPSHOT_VERSION = 2
+SNAPSHOT_MAGIC = b'RAILONE-TIMETABLE'
+DEFAULT_SNAPSHOT_PATH = 'timetable.snapshot'
+# The station index classes are pickled into the snapshot and the CSVs are
+# parsed in reservation_system, so both sources are hashed too: a change to
+# either rebuilds the snapshot.
+SNAPSHOT_CODE = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name) for name in ('station_index.py', 'reservation_system.py')]
+
+
+def source_checksum(*paths):
+    # Hash of the snapshot format version, every source CSV's bytes and SNAPSHOT_CODE.
+    digest = hashlib.blake2b(f"v{SNAPSHOT_VERSION}".encode(), digest_size=16)
+    for path in [*paths, *SNAPSHOT_CODE]:
+        try:
+            with open(path, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''): digest.update(chunk)
+        except FileNotFoundError: digest.update(b'missing')
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def write_snapshot(path, checksum, timetable):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(b'%s %d %s\n' % (SNAPSHOT_MAGIC, SNAPSHOT_VERSION, checksum.encode()))
+        pickle.dump(timetable, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path, checksum):
+    # The timetable stored at path, or None when it is missing, from another
+    # format version or built from different CSVs. The file is memory-mapped,
+    # so workers on one host read it from the same page-cache pages.
+    try:
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            header_end = mapped.find(b'\n')
+            if mapped[:header_end] != b'%s %d %s' % (SNAPSHOT_MAGIC, SNAPSHOT_VERSION, checksum.encode()): return None
+            with memoryview(mapped)[header_end + 1:] as view:
+                return pickle.loads(view)
+    except (FileNotFoundError, ValueError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def main(argv):
+    # python timetable_snapshot.py [trains.csv] [station_coordinates.csv] [timetable.snapshot]
+    from reservation_system import RailwayReservationSystem
+    defaults = ['trains.csv', 'station_coordinates.csv', DEFAULT_SNAPSHOT_PATH]
+    trains_path, stations_path, snapshot_path = argv[:3] + defaults[len(argv[:3]):]
+    checksum = source_checksum(trains_path, stations_path)
+    write_snapshot(snapshot_path, checksum, RailwayReservationSystem.build_timetable(trains_path, stations_path))
+    print(f"wrote {snapshot_path} ({os.path.getsize(snapshot_path) / 1024:.0f} KiB, checksum {checksum})")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,35 @@
+import itertools
+
+
+class TrainRowCache:
+    # Rendered listing rows, one per train, kept with their availability
+    # counts cut out, so listing a train again only fills in the counts.
+    # render(train_no, train_data, availability) renders a row. A row is
+    # reused while its train's data is the same object, which a timetable
+    # reload keeps for every train it did not change.
+
+    HOLE = '\x00'
+
+    def __init__(self, render):
+        self.render = render
+        self.hits = self.misses = 0
+        self._trains = None
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def row(self, trains, train_no, availability):
+        if trains is not self._trains:
+            # A reloaded timetable: drop the rows of trains it changed or removed.
+            self._trains, self._rows = trains, {no: entry for no, entry in self._rows.items() if trains.get(no) is entry[0]}
+        train_data = trains[train_no]
+        entry = self._rows.get(train_no)
+        if entry is None or entry[0] is not train_data:
+            self.misses += 1
+            entry = self._rows[train_no] = (train_data, str(self.render(train_no, train_data, dict.fromkeys(train_data['classes'], self.HOLE))).split(self.HOLE))
+        else:
+            self.hits += 1
+        pieces = entry[1]
+        counts = [str(availability.get(class_code, '')) for class_code in train_data['classes']]
+        return ''.join(itertools.chain.from_iterable(zip(pieces, counts + [''])))
@@ -0,0 +1,42 @@
+import time
+import zipfile
+
+
+class _Sink:
+    # The file ZipFile writes to. It has no seek(), so ZipFile writes each
+    # entry's sizes and CRC after its data instead of going back for them.
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data)); self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks); self.chunks.clear()
+        return data
+
+
+def stream_zip(entries):
+    # Yields a ZIP archive of (name, data, compress) entries a piece at a
+    # time, as each entry is written: only the central directory (under a
+    # kilobyte per entry) is kept until the end. compress deflates the entry;
+    # already compressed data such as PNGs is better stored.
+    sink = _Sink()
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for name, data, compress in entries:
+            info = zipfile.ZipInfo(name, date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            info.external_attr = 0o644 << 16
+            archive.writestr(info, data)
+            yield sink.drain()
+    yield sink.drain()